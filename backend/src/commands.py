@@ -0,0 +1,188 @@
+import click
+from datetime import datetime
+from flask.cli import AppGroup, with_appcontext
+from src.seed import init_database
+from src.services.customers import import_customers
+from src.services.exports import EXPORTACIONES, FORMATOS, exportar
+from src.services.archive import ARCHIVE_AFTER_MONTHS, archivar, validar_meses
+from src.services.expiration import EXPIRATION_BATCH_SIZE, POINTS_EXPIRE_MONTHS, vencer_puntos
+from src.services.reconciliation import reconcile_balances
+from src.services.rollups import backfill
+from src.services.fulfillment import (
+    FULFILLMENT_BATCH_SIZE, FULFILLMENT_POLL_INTERVAL, notifier_from_config, run_worker
+)
+from src.services.code_generator import (
+    CodeGenerationError, DEFAULT_ALPHABET, DEFAULT_LENGTH,
+    generate_codes, iter_campaign_codes, iter_csv
+)
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Crea tablas e índices y carga los datos iniciales (idempotente)."""
+    try:
+        init_database()
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo('Base de datos inicializada')
+
+
+@click.command('export')
+@click.argument('tipo', type=click.Choice(list(EXPORTACIONES)))
+@click.option('--formato', type=click.Choice(FORMATOS), default='csv', show_default=True)
+@click.option('--gzip', 'comprimir', is_flag=True, help='Comprimir la salida con gzip.')
+@click.option('--desde', type=click.DateTime(['%Y-%m-%d']), default=None, help='Primer día (inclusive).')
+@click.option('--hasta', type=click.DateTime(['%Y-%m-%d']), default=None, help='Último día (inclusive).')
+@click.option('--usuario', 'usuario_id', type=int, default=None, help='Sólo los movimientos de este usuario.')
+@click.option('--codigo', default=None, help='Código promocional (historial) o tipo de canje (canjes).')
+@click.option('--output', type=click.File('wb'), default='-', help='Archivo de salida (por defecto stdout).')
+@with_appcontext
+def export_command(tipo, formato, comprimir, desde, hasta, usuario_id, codigo, output):
+    """Exporta historial_puntos o canjes_realizados en CSV o NDJSON."""
+    try:
+        partes = exportar(
+            tipo, formato, comprimir,
+            desde=desde.date() if desde else None,
+            hasta=hasta.date() if hasta else None,
+            usuario_id=usuario_id,
+            codigo=codigo
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for parte in partes:
+        output.write(parte if comprimir else parte.encode('utf-8'))
+
+
+codes_cli = AppGroup('codes', help='Gestión de códigos promocionales.')
+points_cli = AppGroup('points', help='Mantenimiento del saldo de puntos.')
+customers_cli = AppGroup('customers', help='Gestión de clientes.')
+stats_cli = AppGroup('stats', help='Resúmenes diarios del panel de administración.')
+rewards_cli = AppGroup('rewards', help='Entrega de canjes.')
+
+
+@codes_cli.command('generate')
+@click.option('--cantidad', type=int, required=True, help='Cantidad de códigos a generar.')
+@click.option('--prefijo', required=True, help='Prefijo de la campaña.')
+@click.option('--puntos', 'puntos_valor', type=int, required=True, help='Puntos que otorga cada código.')
+@click.option('--longitud', type=int, default=DEFAULT_LENGTH, show_default=True)
+@click.option('--alfabeto', default=DEFAULT_ALPHABET, show_default=True)
+@click.option('--descripcion', default=None)
+@click.option('--expira', 'fecha_expiracion', type=click.DateTime(), default=None)
+@click.option('--usos-maximos', type=int, default=1, show_default=True)
+@click.option('--output', type=click.File('w'), default='-', help='Archivo CSV de salida (por defecto stdout).')
+def generate_codes_command(cantidad, prefijo, puntos_valor, longitud, alfabeto,
+                           descripcion, fecha_expiracion, usos_maximos, output):
+    """Genera una campaña de códigos únicos y la exporta como CSV."""
+    inicio = datetime.utcnow()
+    try:
+        generate_codes(cantidad, prefijo, puntos_valor, longitud, alfabeto,
+                       descripcion, fecha_expiracion, usos_maximos)
+    except CodeGenerationError as e:
+        raise click.ClickException(str(e))
+
+    for parte in iter_csv(iter_campaign_codes(prefijo, longitud), ['codigo', 'puntos_valor']):
+        output.write(parte)
+
+    segundos = (datetime.utcnow() - inicio).total_seconds()
+    click.echo(f'{cantidad} códigos generados en {segundos:.1f}s', err=True)
+
+
+@points_cli.command('reconcile')
+@click.option('--reparar', is_flag=True, help='Corregir puntos_actuales según el historial.')
+@click.option('--incremental', is_flag=True, help='Revisar sólo usuarios con movimientos desde el último checkpoint.')
+@click.option('--chunk-size', type=int, default=5000, show_default=True)
+def reconcile_command(reparar, incremental, chunk_size):
+    """Concilia puntos_actuales con la suma de historial_puntos."""
+    total = 0
+    click.echo('usuario_id,puntos_actuales,suma_historial,diferencia')
+    for usuario_id, puntos_actuales, suma in reconcile_balances(reparar, incremental, chunk_size):
+        total += 1
+        click.echo(f'{usuario_id},{puntos_actuales},{suma},{(puntos_actuales or 0) - suma}')
+    accion = 'corregidas' if reparar else 'encontradas'
+    click.echo(f'{total} diferencias {accion}', err=True)
+
+
+@points_cli.command('archive')
+@click.option('--meses', type=int, default=ARCHIVE_AFTER_MONTHS, show_default=True,
+              help='Meses de historial que quedan en la tabla (además del mes en curso).')
+def archive_history_command(meses):
+    """Mueve el historial viejo a segmentos comprimidos, un archivo por mes."""
+    if meses < 1:
+        raise click.ClickException('--meses debe ser al menos 1')
+    try:
+        validar_meses(meses)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    total = 0
+    for mes, filas in archivar(meses):
+        total += filas
+        click.echo(f'{mes:%Y-%m}: {filas} movimientos archivados')
+    click.echo(f'{total} movimientos archivados en total', err=True)
+
+
+@points_cli.command('expire')
+@click.option('--meses', type=int, default=POINTS_EXPIRE_MONTHS, show_default=True,
+              help='Antigüedad a partir de la cual vencen los puntos no usados.')
+@click.option('--batch-size', type=int, default=EXPIRATION_BATCH_SIZE, show_default=True)
+def expire_points_command(meses, batch_size):
+    """Vence los puntos no usados (FIFO) con un ajuste por usuario.
+
+    Retoma desde el último lote confirmado si una corrida anterior se cortó.
+    """
+    inicio = datetime.utcnow()
+    total = 0
+    for ultimo_id, vencidos in vencer_puntos(meses=meses, batch_size=batch_size):
+        total += vencidos
+        if vencidos:
+            click.echo(f'usuarios hasta {ultimo_id}: {vencidos} con vencimiento', err=True)
+    segundos = (datetime.utcnow() - inicio).total_seconds()
+    click.echo(f'{total} usuarios con puntos vencidos en {segundos:.1f}s')
+
+
+@customers_cli.command('import')
+@click.argument('archivo', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--batch-size', type=int, default=500, show_default=True)
+def import_customers_command(archivo, batch_size):
+    """Importa clientes desde un CSV con sus puntos de bienvenida.
+
+    Columnas: email, dni, nombre_completo, domicilio, fecha_nacimiento
+    (AAAA-MM-DD) y opcionalmente username, nombre, apellido, password y
+    puntos_iniciales.
+    """
+    errores = 0
+
+    def on_error(fila, mensaje):
+        nonlocal errores
+        errores += 1
+        click.echo(f'fila {fila}: {mensaje}', err=True)
+
+    importados = import_customers(archivo, on_error, batch_size)
+    click.echo(f'{importados} clientes importados, {errores} filas con errores')
+
+
+@stats_cli.command('backfill')
+@click.option('--desde', type=click.DateTime(['%Y-%m-%d']), default=None, help='Primer día (por defecto, el primer movimiento).')
+@click.option('--hasta', type=click.DateTime(['%Y-%m-%d']), default=None, help='Último día (por defecto, hoy).')
+def backfill_stats_command(desde, hasta):
+    """Recalcula los resúmenes diarios desde historial_puntos y canjes_realizados."""
+    filas_codigos, filas_canjes = backfill(
+        desde.date() if desde else None,
+        hasta.date() if hasta else None
+    )
+    click.echo(f'{filas_codigos} filas por código y {filas_canjes} filas por tipo de canje')
+
+
+@rewards_cli.command('worker')
+@click.option('--batch-size', type=int, default=FULFILLMENT_BATCH_SIZE, show_default=True)
+@click.option('--interval', type=float, default=FULFILLMENT_POLL_INTERVAL, show_default=True,
+              help='Segundos de espera cuando no hay tareas.')
+@click.option('--once', is_flag=True, help='Terminar cuando la cola quede vacía.')
+def rewards_worker_command(batch_size, interval, once):
+    """Procesa la outbox de canjes: avisa cada canje y lo pasa a "procesado"."""
+    try:
+        notifier = notifier_from_config()
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    completadas, reintentos, fallidas = run_worker(notifier, batch_size, interval, once)
+    click.echo(f'{completadas} completadas, {reintentos} reintentos, {fallidas} fallidas')
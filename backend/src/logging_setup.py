@@ -0,0 +1,129 @@
+import atexit
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+# Nivel de log y salida asíncrona. Los requests sólo encolan el registro; un
+# hilo aparte lo formatea y lo escribe, así el I/O nunca bloquea la respuesta.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s"
+
+# Muestreo de payloads: fracción de requests cuyo cuerpo se registra y tope
+# de registros por segundo (por proceso).
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+LOG_PAYLOAD_MAX_PER_SEC = float(os.environ.get("LOG_PAYLOAD_MAX_PER_SEC", "5"))
+
+
+class AsyncQueueHandler(QueueHandler):
+    # QueueHandler con cola acotada. El listener se arranca en el proceso que
+    # emite el primer registro: con gunicorn --preload la app se crea en el
+    # master y los hilos no sobreviven al fork, así que cada worker levanta
+    # el suyo. Si la cola se llena el registro se descarta en lugar de
+    # bloquear el request.
+
+    def __init__(self, target, maxsize=LOG_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize))
+        self.target = target
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._start_lock:
+            if self._pid == pid:
+                return
+            # La cola heredada del master puede tener registros a medio
+            # consumir; cada proceso arranca con una propia.
+            self.queue = queue.Queue(self.queue.maxsize)
+            self._listener = QueueListener(
+                self.queue, self.target, respect_handler_level=True
+            )
+            self._listener.start()
+            self._pid = pid
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+
+class PayloadSampler:
+    # Decide si se registra el payload de un request: primero por muestreo
+    # aleatorio y después con un token bucket que limita la tasa aunque el
+    # tráfico crezca.
+
+    def __init__(self, rate=LOG_PAYLOAD_SAMPLE_RATE, max_per_sec=LOG_PAYLOAD_MAX_PER_SEC):
+        self.rate = rate
+        self.max_per_sec = max_per_sec
+        self._tokens = max_per_sec
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def should_log(self):
+        if self.rate <= 0 or self.max_per_sec <= 0:
+            return False
+        if self.rate < 1 and random.random() >= self.rate:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.max_per_sec, self._tokens + (now - self._last) * self.max_per_sec
+            )
+            self._last = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+payload_sampler = PayloadSampler()
+_handler = None
+
+
+def log_payload(logger, message, payload):
+    # Registra el payload en DEBUG sólo si el nivel lo permite y el request
+    # quedó en la muestra. El payload no se formatea si se descarta.
+    if logger.isEnabledFor(logging.DEBUG) and payload_sampler.should_log():
+        logger.debug(message, payload)
+
+
+def configure_logging(app):
+    # Reemplaza los handlers del logger raíz por el handler asíncrono. Es
+    # idempotente: llamar a create_app más de una vez no duplica la salida.
+    global _handler
+    level = app.config.setdefault("LOG_LEVEL", LOG_LEVEL)
+    root = logging.getLogger()
+    root.setLevel(level)
+
+    if _handler is None:
+        stream = logging.StreamHandler(sys.stderr)
+        stream.setFormatter(logging.Formatter(LOG_FORMAT))
+        _handler = AsyncQueueHandler(stream)
+        atexit.register(_handler.stop)
+
+    for handler in list(root.handlers):
+        if handler is not _handler:
+            root.removeHandler(handler)
+    if _handler not in root.handlers:
+        root.addHandler(_handler)
+    # Flask agrega su propio handler a app.logger sólo si el raíz no tiene
+    # uno; se deja propagar al raíz para que también pase por la cola.
+    app.logger.setLevel(level)
@@ -6,81 +6,97 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
-from src.routes.user import user_bp
-from src.routes.auth import auth_bp
-from src.routes.points import points_bp
-
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-
-# Configurar CORS para permitir requests desde el frontend
-CORS(app, origins="*")
-
-# Registrar blueprints
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(points_bp, url_prefix='/api')
-
-# Configurar base de datos
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
-with app.app_context():
-    db.create_all()
-    
-    # Crear códigos promocionales iniciales si no existen
-    from src.models.user import CodigoPromocional
-    codigos_iniciales = [
-        {'codigo': 'NORTEGAS2024', 'puntos_valor': 200, 'descripcion': 'Código promocional NorteGAS 2024'},
-        {'codigo': 'GASNATURAL', 'puntos_valor': 300, 'descripcion': 'Código Gas Natural'},
-        {'codigo': 'PROMO2024', 'puntos_valor': 250, 'descripcion': 'Promoción especial 2024'},
-        {'codigo': 'BIENVENIDO', 'puntos_valor': 100, 'descripcion': 'Código de bienvenida'},
-        {'codigo': 'ESPECIAL', 'puntos_valor': 150, 'descripcion': 'Código especial'},
-        {'codigo': 'BONUS', 'puntos_valor': 75, 'descripcion': 'Código bonus'},
-        {'codigo': 'REGALO', 'puntos_valor': 200, 'descripcion': 'Código regalo'},
-        {'codigo': 'DEMO123', 'puntos_valor': 50, 'descripcion': 'Código demo'},
-    ]
-    
-    for codigo_data in codigos_iniciales:
-        codigo_existente = CodigoPromocional.query.filter_by(codigo=codigo_data['codigo']).first()
-        if not codigo_existente:
-            nuevo_codigo = CodigoPromocional(**codigo_data)
-            db.session.add(nuevo_codigo)
-    
-    # Crear administrador inicial si no existe
-    from src.models.user import Administrador
-    admin_existente = Administrador.query.filter_by(email='admin@nortegas.com').first()
-    if not admin_existente:
-        admin = Administrador(
-            email='admin@nortegas.com',
-            nombre='Administrador NorteGAS',
-            rol='admin'
-        )
-        admin.set_password('admin123')
-        db.session.add(admin)
-    
-    db.session.commit()
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
+from src.storage import configure_storage, init_storage
+from src.logging_setup import configure_logging
+
+
+def create_app():
+    # Fábrica de la aplicación. No toca la base de datos: las tablas y los
+    # datos iniciales se crean con "flask --app src.main init-db", así cada
+    # worker (gunicorn --preload) arranca sin consultas.
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+
+    # Logging asíncrono (cola + hilo de escritura); nivel desde LOG_LEVEL
+    configure_logging(app)
+
+    # JSON de las respuestas con orjson si está instalado
+    from src.services.serialization import init_json
+    init_json(app)
+
+    # Configurar CORS para permitir requests desde el frontend
+    CORS(app, origins="*")
+
+    # Configurar base de datos (SQLite con WAL o un servidor vía DATABASE_URL)
+    # El archivo del historial no puede alcanzar al vencimiento de puntos
+    from src.services.archive import validar_meses
+    validar_meses()
+
+    configure_storage(app)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    init_storage(app, db)
+
+    # Latencia, códigos de estado y consultas SQL por request (/api/metrics)
+    from src.services.metrics import init_metrics
+    init_metrics(app, db)
+
+    # Registrar blueprints
+    from src.routes.user import user_bp
+    from src.routes.auth import auth_bp
+    from src.routes.points import points_bp
+    from src.routes.admin import admin_bp
+    from src.routes.events import events_bp
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(points_bp, url_prefix='/api')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(events_bp, url_prefix='/api')
+
+    # Comandos CLI (flask --app src.main ...)
+    from src.commands import codes_cli, points_cli, customers_cli, stats_cli, rewards_cli, init_db_command, export_command
+    app.cli.add_command(codes_cli)
+    app.cli.add_command(points_cli)
+    app.cli.add_command(customers_cli)
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(rewards_cli)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(export_command)
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
+                return "Static folder not configured", 404
+
+        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+            return send_from_directory(static_folder_path, path)
         else:
-            return "index.html not found", 404
+            index_path = os.path.join(static_folder_path, 'index.html')
+            if os.path.exists(index_path):
+                return send_from_directory(static_folder_path, 'index.html')
+            else:
+                return "index.html not found", 404
+
+    @app.route('/api/health', methods=['GET'])
+    def health_check():
+        from src.services.code_cache import code_cache
+        return {
+            'status': 'ok',
+            'message': 'NorteGAS Backend API funcionando correctamente',
+            'cache_codigos': code_cache.stats()
+        }, 200
+
+    return app
 
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    return {'status': 'ok', 'message': 'NorteGAS Backend API funcionando correctamente'}, 200
 
 if __name__ == '__main__':
+    app = create_app()
+
+    # En desarrollo se inicializa la base en cada arranque
+    from src.seed import init_database
+    with app.app_context():
+        init_database()
+
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -1,6 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
+from src.services.hashing import PASSWORD_HASH_METHOD
+from src.services.serialization import serializer_for
 
 db = SQLAlchemy()
 
@@ -21,33 +25,34 @@ class User(db.Model):
     email_verificado = db.Column(db.Boolean, default=False)
     activo = db.Column(db.Boolean, default=True)
     ultimo_login = db.Column(db.DateTime)
+    # Versión de los datos del usuario (saldo, historial, canjes, perfil).
+    # Se incrementa en cada escritura y alimenta los ETag de /api/user/*.
+    version_datos = db.Column(db.Integer, nullable=False, default=1, server_default="1")
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=PASSWORD_HASH_METHOD)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "username": self.username,
-            "email": self.email,
-            "nombre": self.nombre,
-            "apellido": self.apellido,
-            "nombre_completo": self.nombre_completo,
-            "dni": self.dni,
-            "domicilio": self.domicilio,
-            "fecha_nacimiento": (
-                self.fecha_nacimiento.isoformat() if self.fecha_nacimiento else None
-            ),
-            "puntos_actuales": self.puntos_actuales,
-            "email_verificado": self.email_verificado,
-            "activo": self.activo,
-            "ultimo_login": (
-                self.ultimo_login.isoformat() if self.ultimo_login else None
-            ),
-        }
+    # Claves de to_dict, en orden (el serializador se genera una vez)
+    SERIALIZE_FIELDS = (
+        "id", "username", "email", "nombre", "apellido", "nombre_completo",
+        "dni", "domicilio", "fecha_nacimiento", "puntos_actuales",
+        "email_verificado", "activo", "ultimo_login",
+    )
+
+    def to_dict(self, fields=None):
+        return serializer_for(type(self), fields)(self)
+
+
+@event.listens_for(User, "before_update")
+def _bump_version_datos(mapper, connection, target):
+    # Cambios por ORM (login, perfil, canjes): el incremento va en el mismo
+    # UPDATE. Las sentencias Core que tocan el saldo lo hacen explícitamente.
+    session = object_session(target)
+    if session is not None and session.is_modified(target, include_collections=False):
+        target.version_datos = User.version_datos + 1
 
 
 class CodigoPromocional(db.Model):
@@ -63,22 +68,13 @@ class CodigoPromocional(db.Model):
     usos_maximos = db.Column(db.Integer)
     usos_actuales = db.Column(db.Integer, default=0)
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "codigo": self.codigo,
-            "puntos_valor": self.puntos_valor,
-            "descripcion": self.descripcion,
-            "activo": self.activo,
-            "fecha_creacion": (
-                self.fecha_creacion.isoformat() if self.fecha_creacion else None
-            ),
-            "fecha_expiracion": (
-                self.fecha_expiracion.isoformat() if self.fecha_expiracion else None
-            ),
-            "usos_maximos": self.usos_maximos,
-            "usos_actuales": self.usos_actuales,
-        }
+    SERIALIZE_FIELDS = (
+        "id", "codigo", "puntos_valor", "descripcion", "activo",
+        "fecha_creacion", "fecha_expiracion", "usos_maximos", "usos_actuales",
+    )
+
+    def to_dict(self, fields=None):
+        return serializer_for(type(self), fields)(self)
 
 
 class Administrador(db.Model):
@@ -94,26 +90,29 @@ class Administrador(db.Model):
     # ultimo_login eliminado para coincidir con la BD existente
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=PASSWORD_HASH_METHOD)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "email": self.email,
-            "nombre": self.nombre,
-            "rol": self.rol,
-            "activo": self.activo,
-            "fecha_creacion": (
-                self.fecha_creacion.isoformat() if self.fecha_creacion else None
-            ),
-        }
+    SERIALIZE_FIELDS = ("id", "email", "nombre", "rol", "activo", "fecha_creacion")
+
+    def to_dict(self, fields=None):
+        return serializer_for(type(self), fields)(self)
 
 
 class HistorialPuntos(db.Model):
     __tablename__ = "historial_puntos"
+    __table_args__ = (
+        db.Index("ix_historial_usuario_fecha", "usuario_id", "fecha"),
+        # Un usuario puede usar cada código una sola vez
+        db.Index(
+            "uq_historial_usuario_codigo",
+            "usuario_id",
+            "codigo_promocional",
+            unique=True,
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, nullable=False)
@@ -126,21 +125,20 @@ class HistorialPuntos(db.Model):
     codigo_promocional = db.Column(db.String(50))
     referencia_externa = db.Column(db.String(100))
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "usuario_id": self.usuario_id,
-            "tipo_operacion": self.tipo_operacion,
-            "puntos": self.puntos,
-            "descripcion": self.descripcion,
-            "fecha": self.fecha.isoformat() if self.fecha else None,
-            "codigo_promocional": self.codigo_promocional,
-            "referencia_externa": self.referencia_externa,
-        }
+    SERIALIZE_FIELDS = (
+        "id", "usuario_id", "tipo_operacion", ("puntos", "puntos_cantidad"),
+        "descripcion", "fecha", "codigo_promocional", "referencia_externa",
+    )
+
+    def to_dict(self, fields=None):
+        return serializer_for(type(self), fields)(self)
 
 
 class CanjeRealizado(db.Model):
     __tablename__ = "canjes_realizados"
+    __table_args__ = (
+        db.Index("ix_canjes_usuario_fecha", "usuario_id", "fecha_canje"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, nullable=False)
@@ -155,18 +153,225 @@ class CanjeRealizado(db.Model):
     datos_entrega = db.Column(db.Text)  # JSON con datos de entrega
     notas = db.Column(db.Text)
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "usuario_id": self.usuario_id,
-            "tipo_canje": self.tipo_canje,
-            "puntos_utilizados": self.puntos_utilizados,
-            "descripcion": self.descripcion,
-            "estado": self.estado,
-            "fecha_canje": self.fecha_canje.isoformat() if self.fecha_canje else None,
-            "fecha_entrega": (
-                self.fecha_entrega.isoformat() if self.fecha_entrega else None
-            ),
-            "datos_entrega": self.datos_entrega,
-            "notas": self.notas,
-        }
+    SERIALIZE_FIELDS = (
+        "id", "usuario_id", "tipo_canje", "puntos_utilizados", "descripcion",
+        "estado", "fecha_canje", "fecha_entrega", "datos_entrega", "notas",
+    )
+
+    def to_dict(self, fields=None):
+        return serializer_for(type(self), fields)(self)
+
+
+# Catálogo de premios. El precio y el stock salen siempre de acá, no del
+# cliente; stock NULL significa ilimitado.
+class Premio(db.Model):
+    __tablename__ = "premios"
+
+    id = db.Column(db.String(50), primary_key=True)  # p. ej. "envio_gratis"
+    nombre = db.Column(db.String(100), nullable=False)
+    descripcion = db.Column(db.Text)
+    puntos = db.Column(db.Integer, nullable=False)
+    stock = db.Column(db.Integer)
+    requiere_entrega = db.Column(db.Boolean, nullable=False, default=False)
+    activo = db.Column(db.Boolean, nullable=False, default=True)
+    orden = db.Column(db.Integer, nullable=False, default=0)
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    SERIALIZE_FIELDS = (
+        "id", "nombre", "descripcion", "puntos", "stock", "requiere_entrega",
+        "activo", "orden",
+    )
+
+    def to_dict(self, fields=None):
+        return serializer_for(type(self), fields)(self)
+
+
+# Outbox de canjes: cada canje agrega su tarea en la misma transacción y el
+# worker de entregas (services/fulfillment.py) las reclama por lotes.
+class OutboxCanje(db.Model):
+    __tablename__ = "outbox_canjes"
+    __table_args__ = (
+        db.Index("ix_outbox_estado_proximo", "estado", "proximo_intento"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    canje_id = db.Column(db.Integer, unique=True, nullable=False)
+    estado = db.Column(
+        db.String(20), nullable=False, default="pendiente"
+    )  # 'pendiente', 'procesando', 'completada', 'fallida'
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    proximo_intento = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    lote = db.Column(db.String(32))  # lote del worker que la reclamó
+    bloqueada_hasta = db.Column(db.DateTime)
+    ultimo_error = db.Column(db.Text)
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    fecha_completada = db.Column(db.DateTime)
+
+
+# Resúmenes diarios para el panel de administración. Se actualizan en la
+# misma transacción que cada canje (ver services/rollups.py), así las
+# consultas del panel no recorren el historial.
+class ResumenCodigoDiario(db.Model):
+    __tablename__ = "resumen_codigos_diario"
+
+    dia = db.Column(db.Date, primary_key=True)
+    codigo = db.Column(db.String(50), primary_key=True)
+    puntos = db.Column(db.BigInteger, nullable=False, default=0)
+    usos = db.Column(db.Integer, nullable=False, default=0)
+
+    SERIALIZE_FIELDS = ("dia", "codigo", "puntos", "usos")
+
+    def to_dict(self, fields=None):
+        return serializer_for(type(self), fields)(self)
+
+
+class ResumenCanjeDiario(db.Model):
+    __tablename__ = "resumen_canjes_diario"
+
+    dia = db.Column(db.Date, primary_key=True)
+    tipo_canje = db.Column(db.String(100), primary_key=True)
+    puntos = db.Column(db.BigInteger, nullable=False, default=0)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+
+    SERIALIZE_FIELDS = ("dia", "tipo_canje", "puntos", "cantidad")
+
+    def to_dict(self, fields=None):
+        return serializer_for(type(self), fields)(self)
+
+
+# Historial archivado (services/archive.py). Cada segmento es un archivo
+# gzip con las filas de historial_puntos de un mes; el bloque de cada
+# usuario es un miembro gzip propio, así se lee sin descomprimir el resto.
+class SegmentoHistorial(db.Model):
+    __tablename__ = "segmentos_historial"
+
+    id = db.Column(db.Integer, primary_key=True)
+    archivo = db.Column(db.String(255), unique=True, nullable=False)
+    mes = db.Column(db.Date, nullable=False)
+    filas = db.Column(db.Integer, nullable=False)
+    primer_id = db.Column(db.Integer, nullable=False)
+    ultimo_id = db.Column(db.Integer, nullable=False)
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Índice de usuarios por segmento: dónde empieza su bloque (inicio, en
+# bytes), cuánto mide, el rango de fechas que cubre y la suma de sus
+# créditos y de sus débitos (para el vencimiento de puntos).
+class SegmentoUsuario(db.Model):
+    __tablename__ = "segmentos_historial_usuarios"
+    __table_args__ = (
+        db.Index("ix_segmentos_usuario_fecha", "usuario_id", "fecha_max"),
+    )
+
+    segmento_id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, primary_key=True)
+    inicio = db.Column(db.BigInteger, nullable=False)
+    longitud = db.Column(db.Integer, nullable=False)
+    filas = db.Column(db.Integer, nullable=False)
+    fecha_min = db.Column(db.DateTime, nullable=False)
+    fecha_max = db.Column(db.DateTime, nullable=False)
+    creditos = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    debitos = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+
+# Suma de los movimientos archivados de cada usuario: la conciliación la
+# agrega a la del historial vivo.
+class SaldoArchivado(db.Model):
+    __tablename__ = "saldos_archivados"
+
+    usuario_id = db.Column(db.Integer, primary_key=True)
+    puntos = db.Column(db.Integer, nullable=False, default=0)
+    filas = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Códigos usados en movimientos archivados; reemplazan a
+# uq_historial_usuario_codigo para esas filas (un código por usuario).
+class CodigoUsadoArchivado(db.Model):
+    __tablename__ = "codigos_usados_archivados"
+
+    usuario_id = db.Column(db.Integer, primary_key=True)
+    codigo = db.Column(db.String(50), primary_key=True)
+
+
+class CheckpointProceso(db.Model):
+    __tablename__ = "checkpoints_procesos"
+
+    # Último id procesado por cada tarea batch (conciliación, vencimientos...)
+    nombre = db.Column(db.String(50), primary_key=True)
+    valor = db.Column(db.Integer, nullable=False, default=0)
+    actualizado = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @classmethod
+    def leer(cls, nombre):
+        checkpoint = db.session.get(cls, nombre)
+        return checkpoint.valor if checkpoint else 0
+
+    @classmethod
+    def guardar(cls, nombre, valor):
+        checkpoint = db.session.get(cls, nombre) or cls(nombre=nombre)
+        checkpoint.valor = valor
+        db.session.add(checkpoint)
+
+
+def ensure_columns():
+    # Igual que con los índices: create_all() no agrega columnas nuevas a
+    # tablas existentes.
+    columnas = {c["name"] for c in inspect(db.engine).get_columns(User.__tablename__)}
+    if "version_datos" not in columnas:
+        with db.engine.begin() as conn:
+            conn.execute(db.text(
+                'ALTER TABLE "user" ADD COLUMN version_datos INTEGER NOT NULL DEFAULT 1'
+            ))
+    # Los segmentos archivados antes de estas columnas quedan en 0: el
+    # vencimiento no los cuenta (nunca vence de más por ellos)
+    columnas = {c["name"] for c in inspect(db.engine).get_columns(SegmentoUsuario.__tablename__)}
+    for columna in ("creditos", "debitos"):
+        if columna not in columnas:
+            with db.engine.begin() as conn:
+                conn.execute(db.text(
+                    f"ALTER TABLE {SegmentoUsuario.__tablename__} "
+                    f"ADD COLUMN {columna} INTEGER NOT NULL DEFAULT 0"
+                ))
+
+
+def _duplicados(index, limite=5):
+    # Combinaciones repetidas que impiden crear un índice único (los NULL no
+    # cuentan: el índice los admite repetidos)
+    columnas = list(index.columns)
+    with db.engine.connect() as conn:
+        return conn.execute(
+            db.select(*columnas, db.func.count())
+            .where(*(c.is_not(None) for c in columnas))
+            .group_by(*columnas)
+            .having(db.func.count() > 1)
+            .limit(limite)
+        ).all()
+
+
+def ensure_indexes():
+    # db.create_all() no agrega índices a tablas que ya existen, así que las
+    # bases creadas antes de declararlos (app.db previas) los reciben acá.
+    # Un índice único no se puede crear si la tabla ya tiene filas repetidas
+    # (p. ej. usos dobles de un código de antes de uq_historial_usuario_codigo):
+    # se aborta antes de tocar nada, con la consulta para revisarlas.
+    for model in (HistorialPuntos, CanjeRealizado, OutboxCanje):
+        existentes = {i["name"] for i in inspect(db.engine).get_indexes(model.__tablename__)}
+        for index in model.__table__.indexes:
+            if index.name in existentes:
+                continue
+            if index.unique and _duplicados(index):
+                columnas = ", ".join(c.name for c in index.columns)
+                ejemplos = "; ".join(str(tuple(fila)) for fila in _duplicados(index))
+                raise RuntimeError(
+                    f"No se puede crear {index.name}: {model.__tablename__} tiene filas "
+                    f"repetidas en ({columnas}), por ejemplo {ejemplos} (valores y cantidad). "
+                    f"Para listarlas: SELECT {columnas}, COUNT(*) FROM {model.__tablename__} "
+                    f"WHERE {' AND '.join(c.name + ' IS NOT NULL' for c in index.columns)} "
+                    f"GROUP BY {columnas} HAVING COUNT(*) > 1; hay que resolverlas "
+                    f"(y conciliar los saldos) antes de volver a correr init-db."
+                )
+            index.create(bind=db.engine)
+    # El índice no único previo sobre (usuario_id, codigo_promocional) se
+    # borra recién cuando uq_historial_usuario_codigo ya existe
+    with db.engine.begin() as conn:
+        conn.execute(db.text("DROP INDEX IF EXISTS ix_historial_usuario_codigo"))
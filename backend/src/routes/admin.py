@@ -0,0 +1,356 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from datetime import date, datetime, timedelta
+from sqlalchemy import update
+from src.models.user import db, User, Administrador, CanjeRealizado, Premio, ResumenCodigoDiario, ResumenCanjeDiario
+from src.routes.auth import generate_admin_token, verify_admin_token
+from src.services.code_generator import (
+    CodeGenerationError, DEFAULT_ALPHABET, DEFAULT_LENGTH,
+    generate_codes, iter_campaign_codes, iter_csv
+)
+from src.services.customers import import_customers
+from src.services.exports import EXPORTACIONES, exportar
+from src.services.hashing import password_hasher, HashingUnavailable
+from src.services.rollups import resumen_canjes, resumen_codigos
+from src.services.serialization import serialize_many
+from src.storage import write_queue, StorageBusy
+import io
+
+admin_bp = Blueprint('admin', __name__)
+
+def require_admin(f):
+    def decorated_function(*args, **kwargs):
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({'error': 'Token de autorización requerido'}), 401
+        
+        admin_id = verify_admin_token(auth_header.split(' ')[1])
+        if not admin_id:
+            return jsonify({'error': 'Token inválido o expirado'}), 401
+        
+        admin = Administrador.query.get(admin_id)
+        if not admin or not admin.activo:
+            return jsonify({'error': 'Administrador no encontrado o desactivado'}), 401
+        
+        request.current_admin = admin
+        return f(*args, **kwargs)
+    
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+@admin_bp.route('/login', methods=['POST'])
+def admin_login():
+    try:
+        data = request.get_json()
+        
+        if not data.get('email') or not data.get('password'):
+            return jsonify({'error': 'Email y contraseña son requeridos'}), 400
+        
+        admin = Administrador.query.filter_by(email=data['email']).first()
+        if not admin or not password_hasher.verify_password(admin.password_hash, data['password']):
+            return jsonify({'error': 'Credenciales inválidas'}), 401
+        
+        if not admin.activo:
+            return jsonify({'error': 'Administrador desactivado'}), 401
+        
+        return jsonify({
+            'message': 'Login exitoso',
+            'token': generate_admin_token(admin.id),
+            'admin': admin.to_dict()
+        }), 200
+        
+    except HashingUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/codes/generate', methods=['POST'])
+@require_admin
+def generate_codes_batch():
+    try:
+        data = request.get_json()
+        prefijo = (data.get('prefijo') or '').strip().upper()
+        longitud = data.get('longitud', DEFAULT_LENGTH)
+        
+        fecha_expiracion = None
+        if data.get('fecha_expiracion'):
+            if not isinstance(data['fecha_expiracion'], str):
+                return jsonify({'error': 'fecha_expiracion inválida'}), 400
+            fecha_expiracion = datetime.fromisoformat(data['fecha_expiracion'])
+        
+        # La inserción masiva es una escritura más: pasa por la cola, que
+        # valida los parámetros antes de tocar la base
+        write_queue.run(
+            generate_codes,
+            data.get('cantidad'),
+            prefijo,
+            data.get('puntos_valor'),
+            longitud,
+            data.get('alfabeto', DEFAULT_ALPHABET),
+            data.get('descripcion'),
+            fecha_expiracion,
+            data.get('usos_maximos', 1)
+        )
+        
+        # Los códigos ya confirmados se devuelven como CSV en streaming
+        csv_stream = iter_csv(iter_campaign_codes(prefijo, longitud), ['codigo', 'puntos_valor'])
+        return Response(
+            stream_with_context(csv_stream),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename=codigos_{prefijo}.csv'}
+        ), 201
+        
+    except (CodeGenerationError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except StorageBusy as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+MAX_ERRORES_INFORMADOS = 1000
+
+@admin_bp.route('/customers/import', methods=['POST'])
+@require_admin
+def import_customers_csv():
+    try:
+        # CSV como archivo (multipart, campo "archivo") o como cuerpo text/csv;
+        # en ambos casos se lee en streaming
+        if 'archivo' in request.files:
+            stream = request.files['archivo'].stream
+        else:
+            stream = request.stream
+        lineas = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        
+        errores = []
+        total_errores = 0
+        
+        def on_error(fila, mensaje):
+            nonlocal total_errores
+            total_errores += 1
+            if len(errores) < MAX_ERRORES_INFORMADOS:
+                errores.append({'fila': fila, 'error': mensaje})
+        
+        importados = import_customers(lineas, on_error)
+        
+        return jsonify({
+            'importados': importados,
+            'total_errores': total_errores,
+            'errores': errores
+        }), 200
+        
+    except HashingUnavailable as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+# Rango por defecto y máximo de los resúmenes (días)
+DIAS_RESUMEN = 30
+MAX_DIAS_RESUMEN = 366
+
+def _parse_rango():
+    try:
+        hasta = date.fromisoformat(request.args['hasta']) if request.args.get('hasta') else datetime.utcnow().date()
+        desde = date.fromisoformat(request.args['desde']) if request.args.get('desde') else hasta - timedelta(days=DIAS_RESUMEN - 1)
+    except ValueError:
+        raise ValueError('Fecha inválida, usar AAAA-MM-DD')
+    if desde > hasta:
+        raise ValueError('El rango de fechas es inválido')
+    if (hasta - desde).days >= MAX_DIAS_RESUMEN:
+        raise ValueError(f'El rango no puede superar {MAX_DIAS_RESUMEN} días')
+    return desde, hasta
+
+@admin_bp.route('/stats/codes', methods=['GET'])
+@require_admin
+def stats_codes():
+    try:
+        # Sólo se leen los resúmenes diarios, nunca el historial
+        desde, hasta = _parse_rango()
+        filas, totales = resumen_codigos(desde, hasta, request.args.get('codigo'))
+        return jsonify({
+            'desde': desde.isoformat(),
+            'hasta': hasta.isoformat(),
+            'dias': serialize_many(ResumenCodigoDiario, filas),
+            'totales': totales
+        }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/stats/rewards', methods=['GET'])
+@require_admin
+def stats_rewards():
+    try:
+        desde, hasta = _parse_rango()
+        filas, totales = resumen_canjes(desde, hasta, request.args.get('tipo_canje'))
+        return jsonify({
+            'desde': desde.isoformat(),
+            'hasta': hasta.isoformat(),
+            'dias': serialize_many(ResumenCanjeDiario, filas),
+            'totales': totales
+        }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/canjes/<int:canje_id>/entregado', methods=['POST'])
+@require_admin
+def mark_reward_delivered(canje_id):
+    try:
+        # Última transición del canje (la anterior la hace el worker)
+        canje = CanjeRealizado.query.get(canje_id)
+        if not canje:
+            return jsonify({'error': 'Canje no encontrado'}), 404
+        if canje.estado == 'entregado':
+            return jsonify({'error': 'El canje ya fue entregado'}), 400
+        
+        data = request.get_json(silent=True) or {}
+        canje.estado = 'entregado'
+        canje.fecha_entrega = datetime.utcnow()
+        if data.get('notas'):
+            canje.notas = data['notas']
+        # El estado forma parte de /rewards/history: cambia el ETag del usuario
+        db.session.execute(
+            update(User)
+            .where(User.id == canje.usuario_id)
+            .values(version_datos=User.version_datos + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        
+        return jsonify({'canje': canje.to_dict()}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+# Campos editables de un premio y validación de cada uno
+def _premio_desde_json(premio, data):
+    if 'nombre' in data:
+        if not isinstance(data['nombre'], str) or not data['nombre'].strip():
+            raise ValueError('El nombre es requerido')
+        premio.nombre = data['nombre'].strip()
+    if 'descripcion' in data:
+        premio.descripcion = data['descripcion']
+    if 'puntos' in data:
+        puntos = data['puntos']
+        if not isinstance(puntos, int) or isinstance(puntos, bool) or puntos <= 0:
+            raise ValueError('Los puntos deben ser un entero positivo')
+        premio.puntos = puntos
+    if 'stock' in data:
+        stock = data['stock']
+        if stock is not None and (not isinstance(stock, int) or isinstance(stock, bool) or stock < 0):
+            raise ValueError('El stock debe ser un entero no negativo o null (ilimitado)')
+        premio.stock = stock
+    for campo in ('requiere_entrega', 'activo'):
+        if campo in data:
+            if not isinstance(data[campo], bool):
+                raise ValueError(f'{campo} debe ser true o false')
+            setattr(premio, campo, data[campo])
+    if 'orden' in data:
+        if not isinstance(data['orden'], int) or isinstance(data['orden'], bool):
+            raise ValueError('El orden debe ser un entero')
+        premio.orden = data['orden']
+
+@admin_bp.route('/rewards', methods=['GET'])
+@require_admin
+def list_rewards():
+    try:
+        # Incluye los inactivos; el catálogo público sólo muestra los activos
+        premios = Premio.query.order_by(Premio.orden, Premio.id).all()
+        return jsonify({'premios': serialize_many(Premio, premios)}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/rewards', methods=['POST'])
+@require_admin
+def create_reward():
+    try:
+        data = request.get_json() or {}
+        premio_id = data.get('id')
+        if not isinstance(premio_id, str) or not premio_id.strip():
+            return jsonify({'error': 'El id del premio es requerido'}), 400
+        if 'nombre' not in data or 'puntos' not in data:
+            return jsonify({'error': 'Nombre y puntos son requeridos'}), 400
+        if Premio.query.get(premio_id.strip()):
+            return jsonify({'error': 'Ya existe un premio con ese id'}), 400
+        
+        premio = Premio(id=premio_id.strip())
+        _premio_desde_json(premio, data)
+        db.session.add(premio)
+        # El catálogo cacheado se invalida al confirmar (services/catalog.py)
+        db.session.commit()
+        
+        return jsonify({'premio': premio.to_dict()}), 201
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/rewards/<premio_id>', methods=['PUT'])
+@require_admin
+def update_reward(premio_id):
+    try:
+        premio = Premio.query.get(premio_id)
+        if not premio:
+            return jsonify({'error': 'Premio no encontrado'}), 404
+        
+        _premio_desde_json(premio, request.get_json() or {})
+        db.session.commit()
+        
+        return jsonify({'premio': premio.to_dict()}), 200
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def _parse_fecha(nombre):
+    valor = request.args.get(nombre)
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise ValueError(f'{nombre}: fecha inválida, usar AAAA-MM-DD')
+
+@admin_bp.route('/export/<tipo>', methods=['GET'])
+@require_admin
+def export_data(tipo):
+    try:
+        if tipo not in EXPORTACIONES:
+            return jsonify({'error': 'Exportación no encontrada'}), 404
+        formato = request.args.get('formato', 'csv')
+        comprimir = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+        usuario_id = request.args.get('usuario_id', type=int)
+        if request.args.get('usuario_id') and usuario_id is None:
+            return jsonify({'error': 'usuario_id inválido'}), 400
+        
+        partes = exportar(
+            tipo, formato, comprimir,
+            desde=_parse_fecha('desde'),
+            hasta=_parse_fecha('hasta'),
+            usuario_id=usuario_id,
+            codigo=request.args.get('codigo')
+        )
+        
+        # Se escribe a medida que se leen las filas (memoria constante)
+        nombre = f'{tipo}.{formato}'
+        mimetype = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+        if comprimir:
+            nombre += '.gz'
+            mimetype = 'application/gzip'
+        return Response(
+            stream_with_context(partes),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={nombre}'}
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
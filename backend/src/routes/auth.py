@@ -3,6 +3,13 @@ from datetime import datetime, timedelta
 import jwt
 import os
 from src.models.user import db, User, HistorialPuntos
+from sqlalchemy.exc import IntegrityError
+from src.services.auth_cache import token_cache, user_is_active
+from src.services.customers import (
+    PUNTOS_BIENVENIDA, parse_customer, find_conflicts, conflict_message
+)
+from src.services.hashing import password_hasher, HashingUnavailable
+from src.services.events import publicar_saldo
 from datetime import date
 
 auth_bp = Blueprint("auth", __name__)
@@ -18,13 +25,34 @@ def generate_token(user_id):
     return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
 
 
+def generate_admin_token(admin_id):
+    payload = {
+        "admin_id": admin_id,
+        "exp": datetime.utcnow() + timedelta(hours=12),
+    }
+    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+
+
+def verify_admin_token(token):
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        return payload["admin_id"]
+    except (jwt.InvalidTokenError, KeyError):
+        return None
+
+
 def verify_token(token):
+    # Los tokens ya verificados se resuelven desde el cache hasta su "exp"
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        token_cache.put(token, payload["user_id"], payload["exp"])
         return payload["user_id"]
     except jwt.ExpiredSignatureError:
         return None
-    except jwt.InvalidTokenError:
+    except (jwt.InvalidTokenError, KeyError):
         return None
 
 
@@ -34,50 +62,44 @@ def register():
         data = request.get_json()
 
         # Validar datos requeridos
-        required_fields = [
-            "email",
-            "password",
-            "nombre_completo",
-            "dni",
-            "domicilio",
-            "fecha_nacimiento",
-        ]
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return jsonify({"error": f"Campo {field} es requerido"}), 400
-
-        # Verificar si el email ya existe
-        if User.query.filter_by(email=data["email"]).first():
-            return jsonify({"error": "El email ya está registrado"}), 400
+        if not data.get("password"):
+            return jsonify({"error": "Campo password es requerido"}), 400
+        try:
+            cliente = parse_customer(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Email, username y DNI se verifican en una sola consulta
+        existentes = find_conflicts([cliente["email"]], [cliente["username"]], [cliente["dni"]])
+        mensaje = conflict_message(cliente, existentes)
+        if mensaje:
+            return jsonify({"error": mensaje}), 400
 
         # Crear nuevo usuario
         user = User(
-            username=data["username"],
-            email=data["email"],
-            nombre=data["nombre"],
-            apellido=data["apellido"],
-            nombre_completo=data["nombre_completo"],
-            dni=data["dni"],
-            domicilio=data["domicilio"],
-            fecha_nacimiento=datetime.strptime(
-                data["fecha_nacimiento"], "%Y-%m-%d"
-            ).date(),
-            puntos_actuales=100,  # Puntos iniciales
+            **cliente,
+            puntos_actuales=PUNTOS_BIENVENIDA,  # Puntos iniciales
             email_verificado=True,  # Por simplicidad, lo marcamos como verificado
         )
-        user.set_password(data["password"])
+        user.password_hash = password_hasher.hash_password(data["password"])
 
+        # Usuario y puntos de bienvenida en una única transacción
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.flush()
+        except IntegrityError:
+            # Registro simultáneo con los mismos datos
+            db.session.rollback()
+            return jsonify({"error": "El usuario ya está registrado"}), 400
 
-        # Registrar puntos iniciales en historial
         historial = HistorialPuntos(
             usuario_id=user.id,
             tipo_operacion="carga",
-            puntos_cantidad=100,
+            puntos_cantidad=PUNTOS_BIENVENIDA,
             descripcion="Puntos de bienvenida al registrarse",
         )
         db.session.add(historial)
+        publicar_saldo(db.session, user.id, PUNTOS_BIENVENIDA)
         db.session.commit()
 
         # Generar token
@@ -94,6 +116,9 @@ def register():
             201,
         )
 
+    except HashingUnavailable as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -109,12 +134,18 @@ def login():
 
         user = User.query.filter_by(email=data["email"]).first()
 
-        if not user or not user.check_password(data["password"]):
+        if not user or not password_hasher.verify_password(
+            user.password_hash, data["password"]
+        ):
             return jsonify({"error": "Credenciales inválidas"}), 401
 
         if not user.activo:
             return jsonify({"error": "Usuario desactivado"}), 401
 
+        # Actualizar hashes generados con un método o costo anterior
+        if password_hasher.needs_rehash(user.password_hash):
+            user.password_hash = password_hasher.hash_password(data["password"])
+
         # Actualizar último login
         user.ultimo_login = datetime.utcnow()
         db.session.commit()
@@ -129,6 +160,8 @@ def login():
             200,
         )
 
+    except HashingUnavailable as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -146,6 +179,9 @@ def verify_user_token():
         if not user_id:
             return jsonify({"error": "Token inválido o expirado"}), 401
 
+        if not user_is_active(user_id):
+            return jsonify({"error": "Usuario no encontrado o desactivado"}), 401
+
         user = User.query.get(user_id)
         if not user or not user.activo:
             return jsonify({"error": "Usuario no encontrado o desactivado"}), 401
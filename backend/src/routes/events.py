@@ -0,0 +1,71 @@
+from flask import Blueprint, Response, request, jsonify
+import time
+from src.models.user import db, User
+from src.routes.auth import verify_token
+from src.services.auth_cache import user_is_active
+from src.services.events import (
+    hub, sse_disponible, TooManyConnections,
+    SSE_HEARTBEAT_SECONDS, SSE_MAX_SECONDS, SSE_RETRY_MS
+)
+from src.services.serialization import dumps
+
+# Saldo en vivo por Server-Sent Events. En producción lo sirve el proceso de
+# src/sse.py (workers gevent); ver backend/README.md.
+events_bp = Blueprint('events', __name__)
+
+def _sse(evento, datos):
+    return f'event: {evento}\ndata: {dumps(datos)}\n\n'
+
+@events_bp.route('/user/points/stream', methods=['GET'])
+def stream_user_points():
+    # Sin workers asíncronos la conexión bloquearía un worker: 204 hace que
+    # EventSource deje de reconectar (el saldo se ve al recargar)
+    if not sse_disponible(request.environ):
+        return Response(status=204)
+    
+    # EventSource no permite enviar headers: el token también se acepta
+    # como ?token=
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        token = auth_header.split(' ')[1]
+    else:
+        token = request.args.get('token')
+    user_id = verify_token(token) if token else None
+    if not user_id:
+        return jsonify({'error': 'Token inválido o expirado'}), 401
+    if not user_is_active(user_id):
+        return jsonify({'error': 'Usuario no encontrado o desactivado'}), 401
+    
+    try:
+        sub = hub.subscribe(user_id)
+    except TooManyConnections as e:
+        return jsonify({'error': str(e)}), 429
+    
+    try:
+        # Suscripto primero y leído después: un cambio entre ambos pasos
+        # llega igual como evento. El generador ya no usa la base, así que
+        # la conexión vuelve al pool al terminar este handler.
+        puntos_actuales = db.session.query(User.puntos_actuales).filter_by(id=user_id).scalar()
+    except Exception as e:
+        hub.unsubscribe(sub)
+        return jsonify({'error': str(e)}), 500
+    
+    def generate():
+        yield f'retry: {SSE_RETRY_MS}\n\n'
+        yield _sse('saldo', {'puntos_actuales': puntos_actuales})
+        fin = time.monotonic() + SSE_MAX_SECONDS
+        while time.monotonic() < fin:
+            eventos = sub.wait(SSE_HEARTBEAT_SECONDS)
+            if eventos:
+                # Sólo importa el más reciente de cada tipo
+                for tipo, datos in dict(eventos).items():
+                    yield _sse(tipo, datos)
+            else:
+                yield ': ping\n\n'
+    
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    response.call_on_close(lambda: hub.unsubscribe(sub))
+    return response
@@ -1,7 +1,22 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
+import json
 from datetime import datetime
-from src.models.user import db, User, CodigoPromocional, HistorialPuntos, CanjeRealizado
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db, User, CodigoPromocional, HistorialPuntos, CanjeRealizado, Premio
 from src.routes.auth import verify_token
+from src.services.auth_cache import user_is_active
+from src.services.code_cache import code_cache
+from src.services.archive import codigos_archivados, completar_pagina
+from src.services.catalog import catalog_cache
+from src.services.rate_limit import rate_limited, registrar_fallo
+from src.services.rollups import registrar_canje, registrar_codigos
+from src.services.fulfillment import encolar_canje
+from src.services.events import publicar_saldo
+from src.storage import write_queue, StorageBusy
+from src.utils.pagination import parse_limit, keyset_page
+from src.utils.etag import conditional
+from src.services.serialization import columns_for, parse_fields, serialize_many
 
 points_bp = Blueprint('points', __name__)
 
@@ -16,21 +31,46 @@ def require_auth(f):
         if not user_id:
             return jsonify({'error': 'Token inválido o expirado'}), 401
         
-        user = User.query.get(user_id)
-        if not user or not user.activo:
+        # El estado del usuario sale de un cache de TTL corto; el objeto
+        # completo se carga sólo en los handlers que lo necesitan.
+        if not user_is_active(user_id):
             return jsonify({'error': 'Usuario no encontrado o desactivado'}), 401
         
-        request.current_user = user
+        request.current_user_id = user_id
         return f(*args, **kwargs)
     
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+def token_user_id():
+    # Usuario del token sin consultar la base (verify_token usa su cache);
+    # lo usa el límite de intentos, que corre antes de require_auth.
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None
+    return verify_token(auth_header.split(' ')[1])
+
+def get_current_user():
+    return User.query.get(request.current_user_id)
+
+def user_data_etag():
+    # ETag de los datos del usuario: una lectura por clave primaria, sin
+    # tocar historial ni canjes. Cada escritura en el saldo, el historial o
+    # el perfil incrementa version_datos.
+    user_id = request.current_user_id
+    version = db.session.query(User.version_datos).filter_by(id=user_id).scalar()
+    if version is None:
+        return None
+    return f'u{user_id}-v{version}'
+
 @points_bp.route('/user/points', methods=['GET'])
 @require_auth
+@conditional(user_data_etag)
 def get_user_points():
     try:
-        user = request.current_user
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'Usuario no encontrado o desactivado'}), 401
         return jsonify({
             'puntos_actuales': user.puntos_actuales,
             'usuario': user.to_dict()
@@ -40,18 +80,128 @@ def get_user_points():
 
 @points_bp.route('/user/history', methods=['GET'])
 @require_auth
+@conditional(user_data_etag)
 def get_user_history():
     try:
-        user = request.current_user
-        historial = HistorialPuntos.query.filter_by(usuario_id=user.id).order_by(HistorialPuntos.fecha_operacion.desc()).all()
+        user_id = request.current_user_id
+        fields = parse_fields(HistorialPuntos)
+        cursor = request.args.get('cursor')
+        limit = parse_limit()
+        # Sólo se leen las columnas a serializar (más las del cursor)
+        query = db.session.query(*columns_for(HistorialPuntos, fields, 'fecha', 'id'))
+        historial, next_cursor = keyset_page(
+            query.filter(HistorialPuntos.usuario_id == user_id),
+            HistorialPuntos.fecha,
+            HistorialPuntos.id,
+            cursor,
+            limit
+        )
+        filas = serialize_many(HistorialPuntos, historial, fields)
+        
+        # Al agotarse el historial vivo se sigue con los segmentos archivados
+        if next_cursor is None:
+            archivadas, next_cursor = completar_pagina(user_id, cursor, historial, limit, fields)
+            filas += archivadas
         
         return jsonify({
-            'historial': [h.to_dict() for h in historial]
+            'historial': filas,
+            'next_cursor': next_cursor
         }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Condición de los UPDATE que consumen un uso: el estado del código se
+# vuelve a comprobar en la base, el cache puede tener una foto de hasta
+# CODE_CACHE_TTL segundos
+def _codigo_vigente(ahora):
+    return and_(
+        CodigoPromocional.activo.is_(True),
+        or_(
+            CodigoPromocional.fecha_expiracion.is_(None),
+            CodigoPromocional.fecha_expiracion > ahora
+        )
+    )
+
+# Motivo por el que un UPDATE condicional no consumió el uso
+def _motivo_rechazo(codigo_id, ahora):
+    fila = db.session.execute(
+        select(CodigoPromocional.activo, CodigoPromocional.fecha_expiracion)
+        .where(CodigoPromocional.id == codigo_id)
+    ).first()
+    if fila is None:
+        return 'Código no válido'
+    if not fila.activo:
+        return 'Código desactivado'
+    if fila.fecha_expiracion and fila.fecha_expiracion <= ahora:
+        return 'Código expirado'
+    return 'Código agotado'
+
+# Transacción de escritura de redeem_code; corre en la cola de escritura.
+# Devuelve (error, puntos_actuales, código releído después del UPDATE).
+def _aplicar_codigo(user_id, codigo, codigo_texto):
+    # Registrar en historial: la restricción única (usuario, código)
+    # reemplaza la consulta previa de "código ya usado".
+    # Los usos ya archivados no están en la tabla ni en su índice único
+    if codigos_archivados(user_id, [codigo_texto]):
+        return 'Ya has usado este código anteriormente', None, None
+    
+    historial = HistorialPuntos(
+        usuario_id=user_id,
+        tipo_operacion='carga',
+        puntos_cantidad=codigo.puntos_valor,
+        descripcion=f'Código promocional: {codigo.descripcion or codigo.codigo}',
+        codigo_promocional=codigo_texto
+    )
+    db.session.add(historial)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return 'Ya has usado este código anteriormente', None, None
+    
+    # Consumir un uso sólo si el código sigue vigente y quedan usos
+    # disponibles (UPDATE condicional)
+    ahora = datetime.utcnow()
+    consumido = db.session.execute(
+        update(CodigoPromocional)
+        .where(
+            CodigoPromocional.id == codigo.id,
+            _codigo_vigente(ahora),
+            or_(
+                CodigoPromocional.usos_maximos.is_(None),
+                CodigoPromocional.usos_maximos <= 0,
+                CodigoPromocional.usos_actuales < CodigoPromocional.usos_maximos
+            )
+        )
+        .values(usos_actuales=CodigoPromocional.usos_actuales + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if consumido.rowcount == 0:
+        db.session.rollback()
+        return _motivo_rechazo(codigo.id, ahora), None, None
+    
+    # Aplicar puntos sin leer el saldo previo
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(
+            puntos_actuales=User.puntos_actuales + codigo.puntos_valor,
+            version_datos=User.version_datos + 1
+        )
+        .execution_options(synchronize_session=False)
+    )
+    registrar_codigos(historial.fecha.date(), [(codigo_texto, codigo.puntos_valor)])
+    puntos_actuales = db.session.query(User.puntos_actuales).filter_by(id=user_id).scalar()
+    publicar_saldo(db.session, user_id, puntos_actuales)
+    # El código del cache no refleja este uso: se devuelve la fila actual
+    codigo_dict = db.session.get(CodigoPromocional, codigo.id).to_dict()
+    db.session.commit()
+    return None, puntos_actuales, codigo_dict
+
 @points_bp.route('/codes/redeem', methods=['POST'])
+@rate_limited('codigos', token_user_id)
 @require_auth
 def redeem_code():
     try:
@@ -61,11 +211,12 @@ def redeem_code():
         if not codigo_texto:
             return jsonify({'error': 'Código requerido'}), 400
         
-        user = request.current_user
+        user_id = request.current_user_id
         
         # Buscar el código
-        codigo = CodigoPromocional.query.filter_by(codigo=codigo_texto).first()
+        codigo = code_cache.get(codigo_texto)
         if not codigo:
+            registrar_fallo()
             return jsonify({'error': 'Código no válido'}), 400
         
         if not codigo.activo:
@@ -75,116 +226,356 @@ def redeem_code():
         if codigo.fecha_expiracion and codigo.fecha_expiracion < datetime.utcnow():
             return jsonify({'error': 'Código expirado'}), 400
         
-        # Verificar límite de usos
-        if codigo.usos_maximos > 0 and codigo.usos_actuales >= codigo.usos_maximos:
-            return jsonify({'error': 'Código agotado'}), 400
-        
-        # Verificar si el usuario ya usó este código
-        historial_existente = HistorialPuntos.query.filter_by(
-            usuario_id=user.id,
-            codigo_usado=codigo_texto
-        ).first()
-        
-        if historial_existente:
-            return jsonify({'error': 'Ya has usado este código anteriormente'}), 400
-        
-        # Aplicar puntos
-        user.puntos_actuales += codigo.puntos_valor
-        codigo.usos_actuales += 1
-        
-        # Registrar en historial
-        historial = HistorialPuntos(
-            usuario_id=user.id,
-            tipo_operacion='carga',
-            puntos_cantidad=codigo.puntos_valor,
-            descripcion=f'Código promocional: {codigo.descripcion or codigo.codigo}',
-            codigo_usado=codigo_texto
+        error, puntos_actuales, codigo_dict = write_queue.run(
+            _aplicar_codigo, user_id, codigo, codigo_texto
         )
+        if error:
+            # La foto del cache ya no vale (agotado, desactivado o vencido)
+            if error != 'Ya has usado este código anteriormente':
+                code_cache.invalidate(codigo_texto)
+            return jsonify({'error': error}), 400
         
-        db.session.add(historial)
-        db.session.commit()
+        # Los códigos con límite de usos se releen para reflejar el contador
+        if (codigo.usos_maximos or 0) > 0:
+            code_cache.invalidate(codigo_texto)
         
         return jsonify({
             'message': f'¡Código válido! Has ganado {codigo.puntos_valor} puntos NorteGAS.',
             'puntos_ganados': codigo.puntos_valor,
-            'puntos_actuales': user.puntos_actuales,
-            'codigo': codigo.to_dict()
+            'puntos_actuales': puntos_actuales,
+            'codigo': codigo_dict
         }), 200
         
+    except StorageBusy as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+MAX_CODIGOS_POR_LOTE = 50
+
+# Transacción de escritura de redeem-batch; corre en la cola de escritura.
+# Devuelve ({código rechazado: motivo}, puntos_actuales).
+def _aplicar_lote(user_id, aplicables, ahora):
+    # Los códigos con límite de usos necesitan su UPDATE condicional; los
+    # ilimitados se incrementan juntos, sólo los que siguen vigentes.
+    rechazados = {}
+    for codigo in aplicables:
+        if not (codigo.usos_maximos or 0) > 0:
+            continue
+        consumido = db.session.execute(
+            update(CodigoPromocional)
+            .where(
+                CodigoPromocional.id == codigo.id,
+                _codigo_vigente(ahora),
+                CodigoPromocional.usos_actuales < CodigoPromocional.usos_maximos
+            )
+            .values(usos_actuales=CodigoPromocional.usos_actuales + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if consumido.rowcount == 0:
+            rechazados[codigo.codigo] = _motivo_rechazo(codigo.id, ahora)
+    
+    ilimitados = [c for c in aplicables if not (c.usos_maximos or 0) > 0]
+    if ilimitados:
+        vigentes = set(db.session.execute(
+            select(CodigoPromocional.id)
+            .where(CodigoPromocional.id.in_([c.id for c in ilimitados]), _codigo_vigente(ahora))
+            .with_for_update()
+        ).scalars())
+        for codigo in ilimitados:
+            if codigo.id not in vigentes:
+                rechazados[codigo.codigo] = _motivo_rechazo(codigo.id, ahora)
+        if vigentes:
+            db.session.execute(
+                update(CodigoPromocional)
+                .where(CodigoPromocional.id.in_(vigentes), _codigo_vigente(ahora))
+                .values(usos_actuales=CodigoPromocional.usos_actuales + 1)
+                .execution_options(synchronize_session=False)
+            )
+    
+    aplicados = [c for c in aplicables if c.codigo not in rechazados]
+    if aplicados:
+        db.session.execute(
+            insert(HistorialPuntos),
+            [
+                {
+                    'usuario_id': user_id,
+                    'tipo_operacion': 'carga',
+                    'puntos_cantidad': c.puntos_valor,
+                    'descripcion': f'Código promocional: {c.descripcion or c.codigo}',
+                    'fecha': ahora,
+                    'codigo_promocional': c.codigo
+                }
+                for c in aplicados
+            ]
+        )
+        db.session.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(
+                puntos_actuales=User.puntos_actuales + sum(c.puntos_valor for c in aplicados),
+                version_datos=User.version_datos + 1
+            )
+            .execution_options(synchronize_session=False)
+        )
+        registrar_codigos(ahora.date(), [(c.codigo, c.puntos_valor) for c in aplicados])
+    puntos_actuales = db.session.query(User.puntos_actuales).filter_by(id=user_id).scalar()
+    if aplicados:
+        publicar_saldo(db.session, user_id, puntos_actuales)
+    db.session.commit()
+    return rechazados, puntos_actuales
+
+
+@points_bp.route('/codes/redeem-batch', methods=['POST'])
+@rate_limited('codigos', token_user_id)
+@require_auth
+def redeem_codes_batch():
+    try:
+        data = request.get_json()
+        codigos_pedidos = data.get('codigos')
+        
+        if not isinstance(codigos_pedidos, list) or not codigos_pedidos:
+            return jsonify({'error': 'Lista de códigos requerida'}), 400
+        
+        # Normalizar y descartar repetidos conservando el orden
+        textos = list(dict.fromkeys(
+            str(c).strip().upper() for c in codigos_pedidos if str(c).strip()
+        ))
+        if not textos:
+            return jsonify({'error': 'Lista de códigos requerida'}), 400
+        if len(textos) > MAX_CODIGOS_POR_LOTE:
+            return jsonify({'error': f'Máximo {MAX_CODIGOS_POR_LOTE} códigos por solicitud'}), 400
+        
+        user_id = request.current_user_id
+        
+        # Una consulta para los códigos y otra para los usos previos
+        codigos = {
+            c.codigo: c for c in
+            CodigoPromocional.query.filter(CodigoPromocional.codigo.in_(textos)).all()
+        }
+        usados = {
+            fila.codigo_promocional for fila in
+            db.session.query(HistorialPuntos.codigo_promocional).filter(
+                HistorialPuntos.usuario_id == user_id,
+                HistorialPuntos.codigo_promocional.in_(textos)
+            )
+        }
+        usados |= codigos_archivados(user_id, textos)
+        
+        inexistentes = sum(1 for texto in textos if texto not in codigos)
+        if inexistentes:
+            registrar_fallo(inexistentes)
+        
+        ahora = datetime.utcnow()
+        resultados = []
+        aplicables = []
+        for texto in textos:
+            codigo = codigos.get(texto)
+            if not codigo:
+                error = 'Código no válido'
+            elif not codigo.activo:
+                error = 'Código desactivado'
+            elif codigo.fecha_expiracion and codigo.fecha_expiracion < ahora:
+                error = 'Código expirado'
+            elif (codigo.usos_maximos or 0) > 0 and codigo.usos_actuales >= codigo.usos_maximos:
+                error = 'Código agotado'
+            elif texto in usados:
+                error = 'Ya has usado este código anteriormente'
+            else:
+                error = None
+                aplicables.append(codigo)
+            resultados.append({'codigo': texto, 'valido': error is None, 'error': error})
+        
+        rechazados, puntos_actuales = write_queue.run(_aplicar_lote, user_id, aplicables, ahora)
+        
+        aplicados = [c for c in aplicables if c.codigo not in rechazados]
+        for resultado in resultados:
+            if resultado['codigo'] in rechazados:
+                resultado.update(valido=False, error=rechazados[resultado['codigo']])
+            elif resultado['valido']:
+                resultado['puntos'] = codigos[resultado['codigo']].puntos_valor
+        
+        puntos_ganados = sum(c.puntos_valor for c in aplicados)
+        
+        for codigo in aplicables:
+            if (codigo.usos_maximos or 0) > 0 or codigo.codigo in rechazados:
+                code_cache.invalidate(codigo.codigo)
+        
+        return jsonify({
+            'resultados': resultados,
+            'puntos_ganados': puntos_ganados,
+            'puntos_actuales': puntos_actuales
+        }), 200
+        
+    except IntegrityError:
+        # Otro request aplicó alguno de estos códigos al mismo tiempo
+        db.session.rollback()
+        return jsonify({'error': 'Alguno de los códigos ya fue usado. Intentá nuevamente.'}), 409
+    except StorageBusy as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@points_bp.route('/rewards', methods=['GET'])
+def get_rewards_catalog():
+    try:
+        # Catálogo desde la foto en memoria, ya serializada y con ETag
+        snapshot = catalog_cache.get()
+        if request.if_none_match.contains(snapshot.etag):
+            response = Response(status=304)
+        else:
+            response = Response(snapshot.body, mimetype='application/json')
+        response.set_etag(snapshot.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Transacción de escritura de redeem_reward; corre en la cola de escritura.
+# Devuelve (error, resultado). El stock y los puntos se descuentan con
+# UPDATE condicionales: si otro canje se llevó la última unidad o el saldo
+# no alcanza, no se modifica ninguna fila y se deshace todo.
+def _aplicar_canje(user_id, premio_id, datos_entrega):
+    premio = db.session.execute(
+        select(Premio.id, Premio.nombre, Premio.puntos, Premio.stock)
+        .where(Premio.id == premio_id, Premio.activo.is_(True))
+    ).first()
+    if premio is None:
+        return 'Premio no disponible', None
+    
+    if premio.stock is not None:
+        reservado = db.session.execute(
+            update(Premio)
+            .where(Premio.id == premio.id, Premio.stock > 0)
+            .values(stock=Premio.stock - 1)
+            .execution_options(synchronize_session=False)
+        )
+        if reservado.rowcount == 0:
+            db.session.rollback()
+            return 'Premio sin stock', None
+    
+    debitado = db.session.execute(
+        update(User)
+        .where(User.id == user_id, User.puntos_actuales >= premio.puntos)
+        .values(
+            puntos_actuales=User.puntos_actuales - premio.puntos,
+            version_datos=User.version_datos + 1
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if debitado.rowcount == 0:
+        db.session.rollback()
+        return 'Puntos insuficientes', None
+    
+    canje = CanjeRealizado(
+        usuario_id=user_id,
+        tipo_canje=premio.id,
+        descripcion=premio.nombre,
+        puntos_utilizados=premio.puntos,
+        datos_entrega=json.dumps(datos_entrega, ensure_ascii=False) if datos_entrega else None,
+        estado='pendiente'
+    )
+    db.session.add(canje)
+    db.session.add(HistorialPuntos(
+        usuario_id=user_id,
+        tipo_operacion='canje',
+        puntos_cantidad=-premio.puntos,
+        descripcion=f'Canje: {premio.nombre}'
+    ))
+    db.session.flush()
+    # Resumen diario por tipo de canje, en la misma transacción
+    registrar_canje(canje.fecha_canje.date(), canje.tipo_canje, premio.puntos)
+    # La entrega la procesa el worker a partir de la outbox
+    encolar_canje(canje.id)
+    
+    puntos_actuales = db.session.query(User.puntos_actuales).filter_by(id=user_id).scalar()
+    publicar_saldo(db.session, user_id, puntos_actuales)
+    canje_dict = canje.to_dict()
+    db.session.commit()
+    return None, {
+        'premio': premio.nombre,
+        'puntos': premio.puntos,
+        'puntos_actuales': puntos_actuales,
+        'canje': canje_dict,
+        'con_stock': premio.stock is not None
+    }
+
 @points_bp.route('/rewards/redeem', methods=['POST'])
 @require_auth
 def redeem_reward():
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         premio_id = data.get('premio_id')
-        premio_nombre = data.get('premio_nombre')
-        puntos_requeridos = data.get('puntos_requeridos')
-        nombre_entrega = data.get('nombre_entrega')
-        direccion_entrega = data.get('direccion_entrega')
-        
-        if not all([premio_id, premio_nombre, puntos_requeridos]):
-            return jsonify({'error': 'Datos del premio incompletos'}), 400
-        
-        user = request.current_user
-        
-        # Verificar puntos suficientes
-        if user.puntos_actuales < puntos_requeridos:
-            return jsonify({'error': 'Puntos insuficientes'}), 400
-        
-        # Descontar puntos
-        user.puntos_actuales -= puntos_requeridos
-        
-        # Crear registro de canje
-        canje = CanjeRealizado(
-            usuario_id=user.id,
-            premio_id=premio_id,
-            premio_nombre=premio_nombre,
-            puntos_utilizados=puntos_requeridos,
-            nombre_entrega=nombre_entrega,
-            direccion_entrega=direccion_entrega,
-            estado='pendiente'
+        if not premio_id:
+            return jsonify({'error': 'Premio requerido'}), 400
+        
+        # Precio y nombre salen del catálogo; lo que mande el cliente se ignora
+        premio = next((p for p in catalog_cache.get().premios if p['id'] == premio_id), None)
+        if premio is None:
+            return jsonify({'error': 'Premio no disponible'}), 400
+        
+        datos_entrega = None
+        if premio['requiere_entrega']:
+            nombre = (data.get('nombre_entrega') or '').strip()
+            direccion = (data.get('direccion_entrega') or '').strip()
+            if not nombre or not direccion:
+                return jsonify({'error': 'Nombre y dirección de entrega son requeridos'}), 400
+            datos_entrega = {'nombre': nombre, 'direccion': direccion}
+        
+        error, resultado = write_queue.run(
+            _aplicar_canje, request.current_user_id, premio_id, datos_entrega
         )
+        if error:
+            if error == 'Premio sin stock':
+                catalog_cache.invalidate()
+            return jsonify({'error': error}), 400
         
-        # Registrar en historial de puntos
-        historial = HistorialPuntos(
-            usuario_id=user.id,
-            tipo_operacion='canje',
-            puntos_cantidad=-puntos_requeridos,
-            descripcion=f'Canje: {premio_nombre}'
-        )
-        
-        db.session.add(canje)
-        db.session.add(historial)
-        db.session.commit()
+        # El stock mostrado en el catálogo de este proceso se actualiza ya
+        if resultado['con_stock']:
+            catalog_cache.invalidate()
         
         return jsonify({
-            'message': f'¡Felicitaciones! Has canjeado {premio_nombre} por {puntos_requeridos} puntos.',
-            'puntos_restantes': user.puntos_actuales,
-            'canje': canje.to_dict()
+            'message': f"¡Felicitaciones! Has canjeado {resultado['premio']} por {resultado['puntos']} puntos.",
+            'puntos_restantes': resultado['puntos_actuales'],
+            'canje': resultado['canje']
         }), 200
         
+    except StorageBusy as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @points_bp.route('/rewards/history', methods=['GET'])
 @require_auth
+@conditional(user_data_etag)
 def get_rewards_history():
     try:
-        user = request.current_user
-        canjes = CanjeRealizado.query.filter_by(usuario_id=user.id).order_by(CanjeRealizado.fecha_canje.desc()).all()
+        user_id = request.current_user_id
+        fields = parse_fields(CanjeRealizado)
+        # Sólo se leen las columnas a serializar (más las del cursor)
+        query = db.session.query(*columns_for(CanjeRealizado, fields, 'fecha_canje', 'id'))
+        canjes, next_cursor = keyset_page(
+            query.filter(CanjeRealizado.usuario_id == user_id),
+            CanjeRealizado.fecha_canje,
+            CanjeRealizado.id,
+            request.args.get('cursor'),
+            parse_limit()
+        )
         
         return jsonify({
-            'canjes': [c.to_dict() for c in canjes]
+            'canjes': serialize_many(CanjeRealizado, canjes, fields),
+            'next_cursor': next_cursor
         }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @points_bp.route('/codes/validate', methods=['POST'])
+@rate_limited('codigos', token_user_id)
 @require_auth
 def validate_code():
     try:
@@ -194,11 +585,12 @@ def validate_code():
         if not codigo_texto:
             return jsonify({'error': 'Código requerido'}), 400
         
-        user = request.current_user
+        user_id = request.current_user_id
         
         # Buscar el código
-        codigo = CodigoPromocional.query.filter_by(codigo=codigo_texto).first()
+        codigo = code_cache.get(codigo_texto)
         if not codigo:
+            registrar_fallo()
             return jsonify({'valid': False, 'message': 'Código no válido'}), 200
         
         if not codigo.activo:
@@ -209,16 +601,16 @@ def validate_code():
             return jsonify({'valid': False, 'message': 'Código expirado'}), 200
         
         # Verificar límite de usos
-        if codigo.usos_maximos > 0 and codigo.usos_actuales >= codigo.usos_maximos:
+        if (codigo.usos_maximos or 0) > 0 and codigo.usos_actuales >= codigo.usos_maximos:
             return jsonify({'valid': False, 'message': 'Código agotado'}), 200
         
         # Verificar si el usuario ya usó este código
         historial_existente = HistorialPuntos.query.filter_by(
-            usuario_id=user.id,
-            codigo_usado=codigo_texto
+            usuario_id=user_id,
+            codigo_promocional=codigo_texto
         ).first()
         
-        if historial_existente:
+        if historial_existente or codigos_archivados(user_id, [codigo_texto]):
             return jsonify({'valid': False, 'message': 'Ya has usado este código'}), 200
         
         return jsonify({
@@ -1,56 +1,83 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from src.models.user import User, db
+from src.utils.pagination import parse_limit, encode_cursor, decode_cursor
+from src.logging_setup import log_payload
+from src.services.serialization import columns_for, dumps, parse_fields, serializer_for
 import logging
 
-# Configurar logging
-logging.basicConfig(level=logging.DEBUG)
+# El nivel y la salida (asíncrona) se configuran en create_app
 logger = logging.getLogger(__name__)
 
 user_bp = Blueprint('user', __name__)
 
+STREAM_BATCH_SIZE = 1000
+
 @user_bp.route('/users', methods=['GET'])
 def get_users():
     try:
-        logger.info("=== INICIANDO GET /users ===")
-        
-        # Obtener todos los usuarios de la tabla 'user'
-        users = User.query.all()
-        logger.info(f"Usuarios encontrados: {len(users)}")
-        
-        # Convertir a formato JSON usando to_dict()
-        result = [user.to_dict() for user in users]
-        
-        logger.info(f"=== RESPUESTA: {len(result)} usuarios ===")
-        return jsonify(result)
-        
+        fields = parse_fields(User)
+        serialize = serializer_for(User, fields)
+        
+        # Se seleccionan sólo las columnas pedidas; el id se agrega siempre
+        # porque el cursor se construye a partir de él.
+        query = db.session.query(*columns_for(User, fields, 'id'))
+        
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                last_id = int(decode_cursor(cursor)[0])
+            except (IndexError, TypeError, ValueError):
+                raise ValueError('Cursor inválido')
+            query = query.filter(User.id > last_id)
+        query = query.order_by(User.id)
+        
+        if request.args.get('format') == 'ndjson':
+            # Streaming: las filas se leen de a lotes y se escriben a medida
+            # que se generan, sin armar la lista completa en memoria.
+            def generate():
+                rows = query.execution_options(yield_per=STREAM_BATCH_SIZE)
+                for row in rows:
+                    yield dumps(serialize(row)) + '\n'
+            
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        limit = parse_limit()
+        rows = query.limit(limit + 1).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].id)
+        
+        logger.debug("GET /users: %d usuarios", len(rows))
+        return jsonify({
+            'usuarios': [serialize(row) for row in rows],
+            'next_cursor': next_cursor
+        })
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"ERROR en GET /users: {str(e)}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error en GET /users")
         return jsonify({'error': f'Error interno: {str(e)}'}), 500
 
 @user_bp.route('/users', methods=['POST'])
 def create_user():
     try:
-        logger.info("=== INICIANDO POST /users ===")
         data = request.json
-        logger.info(f"Datos recibidos: {data}")
+        log_payload(logger, "POST /users payload: %s", data)
         
         # Validar datos requeridos
         if not data.get('email') or not data.get('username'):
-            logger.error("Faltan datos requeridos")
             return jsonify({'error': 'Email y username son requeridos'}), 400
         
         # Verificar si el email ya existe
         existing_user = User.query.filter_by(email=data['email']).first()
         if existing_user:
-            logger.error(f"Email ya existe: {data['email']}")
             return jsonify({'error': 'El email ya está registrado'}), 400
         
         # Verificar si el username ya existe
         existing_username = User.query.filter_by(username=data['username']).first()
         if existing_username:
-            logger.error(f"Username ya existe: {data['username']}")
             return jsonify({'error': 'El username ya está registrado'}), 400
         
         # Crear usuario simple
@@ -59,58 +86,37 @@ def create_user():
             email=data['email']
         )
         
-        logger.info(f"Usuario creado en memoria: {user.username}")
-        
         # Guardar en BD
         db.session.add(user)
-        logger.info("Usuario añadido a sesión")
-        
         db.session.commit()
-        logger.info("Commit realizado")
-        
-        # Verificar que se guardó
-        saved_user = User.query.filter_by(email=data['email']).first()
-        if saved_user:
-            logger.info(f"Usuario verificado en BD: ID={saved_user.id}")
-        else:
-            logger.error("Usuario NO encontrado después del commit")
-        
-        # Contar usuarios totales
-        total_users = User.query.count()
-        logger.info(f"Total usuarios después de crear: {total_users}")
+        logger.info("Usuario creado: id=%s", user.id)
         
         response_data = user.to_dict()
         response_data['message'] = 'Usuario creado exitosamente'
         
-        logger.info(f"=== RESPUESTA POST: {response_data} ===")
         return jsonify(response_data), 201
         
     except Exception as e:
-        logger.error(f"ERROR en POST /users: {str(e)}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error en POST /users")
         db.session.rollback()
         return jsonify({'error': f'Error al crear usuario: {str(e)}'}), 500
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
     try:
-        logger.info(f"=== GET /users/{user_id} ===")
         user = User.query.get_or_404(user_id)
-        logger.info(f"Usuario encontrado: {user.username}")
         
         return jsonify(user.to_dict())
     except Exception as e:
-        logger.error(f"ERROR en GET /users/{user_id}: {str(e)}")
+        logger.exception("Error en GET /users/%s", user_id)
         return jsonify({'error': str(e)}), 500
 
 @user_bp.route('/users/<int:user_id>', methods=['PUT'])
 def update_user(user_id):
     try:
-        logger.info(f"=== PUT /users/{user_id} ===")
         user = User.query.get_or_404(user_id)
         data = request.json
-        logger.info(f"Datos para actualizar: {data}")
+        log_payload(logger, "PUT /users payload: %s", data)
         
         if 'email' in data:
             # Verificar que el nuevo email no esté en uso
@@ -127,7 +133,7 @@ def update_user(user_id):
             user.username = data['username']
         
         db.session.commit()
-        logger.info("Usuario actualizado exitosamente")
+        logger.info("Usuario actualizado: id=%s", user_id)
         
         response_data = user.to_dict()
         response_data['message'] = 'Usuario actualizado exitosamente'
@@ -135,22 +141,21 @@ def update_user(user_id):
         return jsonify(response_data)
         
     except Exception as e:
-        logger.error(f"ERROR en PUT /users/{user_id}: {str(e)}")
+        logger.exception("Error en PUT /users/%s", user_id)
         db.session.rollback()
         return jsonify({'error': f'Error al actualizar usuario: {str(e)}'}), 500
 
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
     try:
-        logger.info(f"=== DELETE /users/{user_id} ===")
         user = User.query.get_or_404(user_id)
         db.session.delete(user)
         db.session.commit()
-        logger.info("Usuario eliminado exitosamente")
+        logger.info("Usuario eliminado: id=%s", user_id)
         
         return jsonify({'message': 'Usuario eliminado exitosamente'}), 200
         
     except Exception as e:
-        logger.error(f"ERROR en DELETE /users/{user_id}: {str(e)}")
+        logger.exception("Error en DELETE /users/%s", user_id)
         db.session.rollback()
         return jsonify({'error': f'Error al eliminar usuario: {str(e)}'}), 500
@@ -0,0 +1,69 @@
+from datetime import datetime
+from werkzeug.security import generate_password_hash
+from src.models.user import db, CodigoPromocional, Administrador, Premio, ensure_columns, ensure_indexes
+from src.services.hashing import PASSWORD_HASH_METHOD
+from src.utils.sql import insert_ignore
+
+CODIGOS_INICIALES = [
+    {'codigo': 'NORTEGAS2024', 'puntos_valor': 200, 'descripcion': 'Código promocional NorteGAS 2024'},
+    {'codigo': 'GASNATURAL', 'puntos_valor': 300, 'descripcion': 'Código Gas Natural'},
+    {'codigo': 'PROMO2024', 'puntos_valor': 250, 'descripcion': 'Promoción especial 2024'},
+    {'codigo': 'BIENVENIDO', 'puntos_valor': 100, 'descripcion': 'Código de bienvenida'},
+    {'codigo': 'ESPECIAL', 'puntos_valor': 150, 'descripcion': 'Código especial'},
+    {'codigo': 'BONUS', 'puntos_valor': 75, 'descripcion': 'Código bonus'},
+    {'codigo': 'REGALO', 'puntos_valor': 200, 'descripcion': 'Código regalo'},
+    {'codigo': 'DEMO123', 'puntos_valor': 50, 'descripcion': 'Código demo'},
+]
+
+# Catálogo inicial (el mismo que mostraba el frontend); stock None = ilimitado
+PREMIOS_INICIALES = [
+    {'id': 'envio_gratis', 'nombre': 'Envío Gratis', 'descripcion': 'Delivery gratuito de tu próxima garrafa',
+     'puntos': 500, 'stock': None, 'requiere_entrega': True, 'orden': 1},
+    {'id': 'descuento_5000', 'nombre': 'Descuento $5000', 'descripcion': 'Descuento en la compra de garrafa',
+     'puntos': 2500, 'stock': None, 'requiere_entrega': True, 'orden': 2},
+    {'id': 'taza_nortegas', 'nombre': 'Taza NorteGAS', 'descripcion': 'Taza exclusiva con logo de NorteGAS',
+     'puntos': 1500, 'stock': 100, 'requiere_entrega': False, 'orden': 3},
+    {'id': 'gorra_nortegas', 'nombre': 'Gorra NorteGAS', 'descripcion': 'Gorra oficial con bordado NorteGAS',
+     'puntos': 1500, 'stock': 100, 'requiere_entrega': False, 'orden': 4},
+]
+
+ADMIN_INICIAL = {
+    'email': 'admin@nortegas.com',
+    'nombre': 'Administrador NorteGAS',
+    'rol': 'admin',
+    'password': 'admin123',
+}
+
+
+def init_database():
+    # Tablas, índices (también en bases existentes) y datos iniciales.
+    # Es idempotente: se puede correr en cada despliegue.
+    db.create_all()
+    ensure_columns()
+    ensure_indexes()
+
+    ahora = datetime.utcnow()
+    # Un único INSERT multi-fila; los códigos existentes se ignoran
+    db.session.execute(
+        insert_ignore(CodigoPromocional.__table__, db.engine).values([
+            {**codigo, 'activo': True, 'fecha_creacion': ahora, 'usos_actuales': 0}
+            for codigo in CODIGOS_INICIALES
+        ])
+    )
+
+    # Los premios existentes no se pisan (precio y stock los maneja el admin)
+    db.session.execute(
+        insert_ignore(Premio.__table__, db.engine).values([
+            {**premio, 'activo': True, 'fecha_actualizacion': ahora}
+            for premio in PREMIOS_INICIALES
+        ])
+    )
+
+    admin = dict(ADMIN_INICIAL)
+    admin['password_hash'] = generate_password_hash(admin.pop('password'), method=PASSWORD_HASH_METHOD)
+    db.session.execute(
+        insert_ignore(Administrador.__table__, db.engine).values(
+            activo=True, fecha_creacion=ahora, **admin
+        )
+    )
+    db.session.commit()
@@ -0,0 +1,280 @@
+import gzip
+import json
+import os
+import uuid
+from datetime import date, datetime, time, timedelta
+from itertools import groupby
+from operator import attrgetter, itemgetter
+from sqlalchemy import delete, func, insert, select
+from src.models.user import (
+    db, HistorialPuntos, SegmentoHistorial, SegmentoUsuario, SaldoArchivado, CodigoUsadoArchivado
+)
+from src.services.expiration import POINTS_EXPIRE_MONTHS
+from src.services.serialization import columns_for, dumps, serializer_for
+from src.utils.pagination import encode_cursor, parse_cursor
+from src.utils.sql import insert_ignore, upsert_increment
+
+# Archivo de historial_puntos. Los movimientos anteriores al corte (primer
+# día del mes de hace ARCHIVE_AFTER_MONTHS meses) salen de la tabla y pasan
+# a segmentos de sólo escritura: un archivo NDJSON comprimido por mes, con
+# un miembro gzip por usuario. segmentos_historial_usuarios indica en qué
+# segmentos aparece cada usuario y en qué posición, así el historial paginado
+# lee sólo esos bloques. Los archivos viven en ARCHIVE_DIR y hay que
+# respaldarlos junto con la base.
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "database", "archivo"
+)
+ARCHIVE_AFTER_MONTHS = int(os.environ.get("ARCHIVE_AFTER_MONTHS", "24"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "5000"))
+
+# Filas por sentencia al cargar el índice, los saldos y los códigos
+LOTE_INDICE = 500
+
+
+def _sumar_meses(mes, meses):
+    total = mes.year * 12 + mes.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def validar_meses(meses=ARCHIVE_AFTER_MONTHS):
+    # El vencimiento cuenta los créditos archivados como viejos: todo lo
+    # archivado tiene que ser anterior al corte de vencimiento
+    if meses < POINTS_EXPIRE_MONTHS:
+        raise ValueError(
+            f"No se puede archivar con {meses} meses: los puntos vencen a los "
+            f"{POINTS_EXPIRE_MONTHS} meses (POINTS_EXPIRE_MONTHS) y el archivo "
+            f"tiene que conservar al menos ese historial en la tabla"
+        )
+
+
+def corte_archivo(hoy=None, meses=ARCHIVE_AFTER_MONTHS):
+    # Primer día del mes más viejo que sigue en la tabla
+    hoy = hoy or datetime.utcnow().date()
+    return _sumar_meses(date(hoy.year, hoy.month, 1), -meses)
+
+
+def inicio_historial_vivo():
+    # Primer día que no fue archivado (date.min si no hay segmentos)
+    ultimo_mes = db.session.query(func.max(SegmentoHistorial.mes)).scalar()
+    return _sumar_meses(ultimo_mes, 1) if ultimo_mes else date.min
+
+
+def _lotes(filas, tamanio=LOTE_INDICE):
+    for i in range(0, len(filas), tamanio):
+        yield filas[i:i + tamanio]
+
+
+def _archivar_mes(mes):
+    rango = (
+        HistorialPuntos.fecha >= datetime.combine(mes, time.min),
+        HistorialPuntos.fecha < datetime.combine(_sumar_meses(mes, 1), time.min),
+    )
+    ultimo_id = db.session.query(func.max(HistorialPuntos.id)).filter(*rango).scalar()
+    if ultimo_id is None:
+        return 0
+    # Se borra exactamente lo que se escribió, aunque entren filas nuevas
+    filtro = (*rango, HistorialPuntos.id <= ultimo_id)
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    nombre = f"historial-{mes:%Y-%m}-{uuid.uuid4().hex[:8]}.ndjson.gz"
+    ruta = os.path.join(ARCHIVE_DIR, nombre)
+    serialize = serializer_for(HistorialPuntos)
+    indice, saldos, codigos = [], [], []
+    filas, primer_id = 0, ultimo_id
+
+    resultado = db.session.execute(
+        select(*columns_for(HistorialPuntos))
+        .where(*filtro)
+        .order_by(HistorialPuntos.usuario_id, HistorialPuntos.fecha.desc(), HistorialPuntos.id.desc())
+        .execution_options(yield_per=ARCHIVE_BATCH_SIZE)
+    )
+    try:
+        with open(ruta + ".tmp", "wb") as archivo:
+            for usuario_id, grupo in groupby(resultado, key=attrgetter("usuario_id")):
+                grupo = list(grupo)
+                lineas = "".join(dumps(serialize(fila)) + "\n" for fila in grupo)
+                bloque = gzip.compress(lineas.encode("utf-8"), compresslevel=6, mtime=0)
+                indice.append({
+                    "usuario_id": usuario_id,
+                    "inicio": archivo.tell(),
+                    "longitud": len(bloque),
+                    "filas": len(grupo),
+                    "fecha_min": grupo[-1].fecha,
+                    "fecha_max": grupo[0].fecha,
+                    "creditos": sum(f.puntos_cantidad for f in grupo if f.puntos_cantidad > 0),
+                    "debitos": sum(f.puntos_cantidad for f in grupo if f.puntos_cantidad < 0),
+                })
+                archivo.write(bloque)
+                saldos.append({
+                    "usuario_id": usuario_id,
+                    "puntos": sum(fila.puntos_cantidad for fila in grupo),
+                    "filas": len(grupo),
+                })
+                codigos.extend(
+                    {"usuario_id": usuario_id, "codigo": fila.codigo_promocional}
+                    for fila in grupo if fila.codigo_promocional
+                )
+                filas += len(grupo)
+                primer_id = min(primer_id, min(fila.id for fila in grupo))
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(ruta + ".tmp", ruta)
+
+        # Índice, saldos archivados y borrado en una sola transacción: si
+        # falla, el archivo se elimina y las filas siguen en la tabla.
+        segmento = SegmentoHistorial(
+            archivo=nombre, mes=mes, filas=filas, primer_id=primer_id, ultimo_id=ultimo_id
+        )
+        db.session.add(segmento)
+        db.session.flush()
+        for fila in indice:
+            fila["segmento_id"] = segmento.id
+        for lote in _lotes(indice):
+            db.session.execute(insert(SegmentoUsuario), lote)
+        for lote in _lotes(saldos):
+            db.session.execute(upsert_increment(
+                SaldoArchivado.__table__, db.engine, ["usuario_id"], lote, ["puntos", "filas"]
+            ))
+        for lote in _lotes(codigos):
+            db.session.execute(insert_ignore(CodigoUsadoArchivado.__table__, db.engine), lote)
+        db.session.execute(
+            delete(HistorialPuntos).where(*filtro).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        for resto in (ruta, ruta + ".tmp"):
+            if os.path.exists(resto):
+                os.remove(resto)
+        raise
+    return filas
+
+
+# Archiva, mes por mes, los movimientos anteriores al corte. Cada mes se
+# confirma por separado, así una corrida interrumpida se retoma desde el
+# mes pendiente. Devuelve [(mes, filas archivadas), ...].
+def archivar(meses=ARCHIVE_AFTER_MONTHS, hoy=None):
+    validar_meses(meses)
+    corte = corte_archivo(hoy, meses)
+    primera = db.session.query(func.min(HistorialPuntos.fecha)).filter(
+        HistorialPuntos.fecha < datetime.combine(corte, time.min)
+    ).scalar()
+    archivados = []
+    if primera is None:
+        return archivados
+    mes = date(primera.year, primera.month, 1)
+    while mes < corte:
+        filas = _archivar_mes(mes)
+        if filas:
+            archivados.append((mes, filas))
+        mes = _sumar_meses(mes, 1)
+    return archivados
+
+
+def _leer_bloque(archivo, inicio, longitud):
+    with open(os.path.join(ARCHIVE_DIR, archivo), "rb") as segmento:
+        segmento.seek(inicio)
+        datos = segmento.read(longitud)
+    return [json.loads(linea) for linea in gzip.decompress(datos).splitlines()]
+
+
+# Hasta "limite" movimientos archivados del usuario anteriores a antes_de
+# ((fecha, id) o None), del más nuevo al más viejo, como dicts ya
+# serializados. Se leen los segmentos del usuario de más nuevo a más viejo
+# y se corta cuando el siguiente ya no puede aportar filas a la página.
+def historial_archivado(usuario_id, antes_de, limite):
+    query = (
+        select(SegmentoHistorial.archivo, SegmentoUsuario.inicio, SegmentoUsuario.longitud,
+               SegmentoUsuario.fecha_max)
+        .join(SegmentoHistorial, SegmentoHistorial.id == SegmentoUsuario.segmento_id)
+        .where(SegmentoUsuario.usuario_id == usuario_id)
+        .order_by(SegmentoUsuario.fecha_max.desc())
+    )
+    if antes_de is not None:
+        query = query.where(SegmentoUsuario.fecha_min <= antes_de[0])
+
+    filas = []
+    for segmento in db.session.execute(query).all():
+        if len(filas) >= limite and segmento.fecha_max < filas[limite - 1][0][0]:
+            break
+        for fila in _leer_bloque(segmento.archivo, segmento.inicio, segmento.longitud):
+            clave = (datetime.fromisoformat(fila["fecha"]), fila["id"])
+            if antes_de is None or clave < antes_de:
+                filas.append((clave, fila))
+        filas.sort(key=itemgetter(0), reverse=True)
+    return [fila for _, fila in filas[:limite]]
+
+
+# Completa con el historial archivado una página de /user/history cuyo
+# tramo vivo se agotó (keyset_page sin next_cursor). Lo archivado es
+# anterior al corte y el corte sólo avanza, así que siempre va después de
+# las filas vivas. Devuelve (filas archivadas serializadas, next_cursor).
+def completar_pagina(usuario_id, cursor, vivas, limite, fields=None):
+    if vivas:
+        antes_de = (vivas[-1].fecha, vivas[-1].id)
+    else:
+        antes_de = parse_cursor(cursor) if cursor else None
+
+    faltan = limite - len(vivas)
+    filas = historial_archivado(usuario_id, antes_de, faltan + 1)
+    next_cursor = None
+    if len(filas) > faltan:
+        filas = filas[:faltan]
+        if filas:
+            next_cursor = encode_cursor(filas[-1]["fecha"], filas[-1]["id"])
+        else:
+            next_cursor = encode_cursor(*antes_de)
+
+    if fields is not None:
+        filas = [{campo: fila[campo] for campo in fields} for fila in filas]
+    return filas, next_cursor
+
+
+def _iter_segmento(archivo):
+    # Recorre un segmento completo sin cargarlo en memoria (gzip lee los
+    # miembros concatenados como un solo flujo)
+    with gzip.open(os.path.join(ARCHIVE_DIR, archivo), "rt", encoding="utf-8") as segmento:
+        for linea in segmento:
+            yield json.loads(linea)
+
+
+# Movimientos archivados con fecha en [inicio, fin) (None = sin límite),
+# segmento por segmento en orden de mes. Con usuario_id sólo se leen sus
+# bloques, según el índice.
+def iter_archivado(inicio=None, fin=None, usuario_id=None):
+    query = select(SegmentoHistorial.id, SegmentoHistorial.archivo).order_by(
+        SegmentoHistorial.mes, SegmentoHistorial.id
+    )
+    if inicio is not None:
+        query = query.where(SegmentoHistorial.mes >= date(inicio.year, inicio.month, 1))
+    if fin is not None:
+        dia_fin = fin.date() if fin.time() == time.min else fin.date() + timedelta(days=1)
+        query = query.where(SegmentoHistorial.mes < dia_fin)
+
+    for segmento in db.session.execute(query).all():
+        if usuario_id is None:
+            filas = _iter_segmento(segmento.archivo)
+        else:
+            bloque = db.session.execute(
+                select(SegmentoUsuario.inicio, SegmentoUsuario.longitud).where(
+                    SegmentoUsuario.segmento_id == segmento.id,
+                    SegmentoUsuario.usuario_id == usuario_id,
+                )
+            ).first()
+            if bloque is None:
+                continue
+            filas = _leer_bloque(segmento.archivo, bloque.inicio, bloque.longitud)
+        for fila in filas:
+            fecha = datetime.fromisoformat(fila["fecha"])
+            if (inicio is None or fecha >= inicio) and (fin is None or fecha < fin):
+                yield fila
+
+
+def codigos_archivados(usuario_id, codigos):
+    # Códigos del usuario que figuran en movimientos ya archivados
+    return set(db.session.execute(
+        select(CodigoUsadoArchivado.codigo).where(
+            CodigoUsadoArchivado.usuario_id == usuario_id,
+            CodigoUsadoArchivado.codigo.in_(list(codigos))
+        )
+    ).scalars())
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from src.models.user import db, User
+
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_USER_CACHE_TTL = float(os.environ.get("AUTH_USER_CACHE_TTL", "30"))
+AUTH_USER_CACHE_SIZE = int(os.environ.get("AUTH_USER_CACHE_SIZE", "10000"))
+
+
+# LRU acotado con vencimiento por entrada. El vencimiento se expresa en
+# tiempo de reloj (time.time) para poder usar directamente el "exp" del JWT.
+class ExpiringLRU:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+# token JWT ya verificado -> user_id, hasta el "exp" del token
+token_cache = ExpiringLRU(AUTH_TOKEN_CACHE_SIZE)
+# user_id -> flag activo, con TTL corto
+user_status_cache = ExpiringLRU(AUTH_USER_CACHE_SIZE)
+
+
+def user_is_active(user_id):
+    activo = user_status_cache.get(user_id)
+    if activo is None:
+        activo = db.session.query(User.activo).filter_by(id=user_id).scalar()
+        # Un usuario inexistente se cachea como inactivo
+        activo = bool(activo)
+        user_status_cache.put(user_id, activo, time.time() + AUTH_USER_CACHE_TTL)
+    return activo
+
+
+# Al desactivar, modificar o borrar un usuario se invalida su estado cuando
+# la transacción confirma.
+def _track_user_change(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        user_status_cache.invalidate(target.id)
+        return
+    session.info.setdefault("usuarios_modificados", set()).add(target.id)
+
+
+event.listen(User, "after_update", _track_user_change)
+event.listen(User, "after_delete", _track_user_change)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop("usuarios_modificados", ()):
+        user_status_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_user_changes(session):
+    session.info.pop("usuarios_modificados", None)
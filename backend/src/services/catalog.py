@@ -0,0 +1,90 @@
+import hashlib
+import os
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from src.models.user import Premio
+from src.services.serialization import dumps, serialize_many
+
+# El stock cambia con cada canje (UPDATE directo, sin eventos del ORM), así
+# que la foto del catálogo vence además por TTL.
+CATALOG_CACHE_TTL = float(os.environ.get("CATALOG_CACHE_TTL", "30"))
+
+
+class CatalogSnapshot:
+    def __init__(self, premios):
+        self.premios = premios
+        self.body = dumps({"premios": premios})
+        self.etag = "c" + hashlib.sha1(self.body.encode("utf-8")).hexdigest()[:20]
+
+
+# Foto en memoria del catálogo de premios activos, ya serializada y con su
+# ETag: las lecturas no tocan la base ni vuelven a serializar. Se invalida
+# al crear, modificar o borrar un premio (cuando la transacción confirma).
+class CatalogCache:
+    def __init__(self, ttl=CATALOG_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._snapshot = None
+        self._expires_at = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._snapshot is not None and self._expires_at > now:
+                self.hits += 1
+                return self._snapshot
+            self.misses += 1
+            generation = self._generation
+
+        premios = Premio.query.filter_by(activo=True).order_by(Premio.orden, Premio.id).all()
+        snapshot = CatalogSnapshot(serialize_many(Premio, premios))
+
+        with self._lock:
+            if generation == self._generation:
+                self._snapshot = snapshot
+                self._expires_at = now + self.ttl
+        return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": 1 if self._snapshot is not None else 0,
+            }
+
+
+catalog_cache = CatalogCache()
+
+
+def _track_premio_change(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        catalog_cache.invalidate()
+        return
+    session.info["catalogo_modificado"] = True
+
+
+for _evento in ("after_insert", "after_update", "after_delete"):
+    event.listen(Premio, _evento, _track_premio_change)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_catalog(session):
+    if session.info.pop("catalogo_modificado", False):
+        catalog_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_catalog_changes(session):
+    session.info.pop("catalogo_modificado", None)
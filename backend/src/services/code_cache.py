@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session, object_session
+from src.models.user import db, CodigoPromocional
+
+CODE_CACHE_TTL = float(os.environ.get("CODE_CACHE_TTL", "60"))
+CODE_CACHE_MAX_ENTRIES = int(os.environ.get("CODE_CACHE_MAX_ENTRIES", "10000"))
+# Cada cuántos segundos se buscan códigos creados por otros procesos
+CODE_CACHE_SYNC_SECONDS = float(os.environ.get("CODE_CACHE_SYNC_SECONDS", "1"))
+
+
+def normalize_code(codigo_texto):
+    return (codigo_texto or "").strip().upper()
+
+
+def _snapshot(codigo):
+    # Copia transitoria (sin sesión) para compartir entre requests y threads
+    return CodigoPromocional(
+        **{
+            column.key: getattr(codigo, column.key)
+            for column in CodigoPromocional.__table__.columns
+        }
+    )
+
+
+# Cache read-through del catálogo de códigos promocionales. Guarda también
+# los códigos inexistentes (cache negativo), que son la mayor parte del
+# tráfico de adivinación. Las entradas vencen por TTL o al vencer el propio
+# código, y se invalidan al crear, modificar o borrar un código. Los códigos
+# creados en otros procesos (otros workers, el CLI) no pasan por este cache:
+# cada sync_seconds se compara el último id de la tabla y, si cambió, se
+# descartan los inexistentes cacheados.
+class CodeCache:
+
+    def __init__(self, ttl=CODE_CACHE_TTL, max_entries=CODE_CACHE_MAX_ENTRIES,
+                 sync_seconds=CODE_CACHE_SYNC_SECONDS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.sync_seconds = sync_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._ultimo_id = None
+        self._proxima_sync = 0.0
+        self._lock = threading.Lock()
+
+    def _sync(self, now):
+        with self._lock:
+            if now < self._proxima_sync:
+                return
+            self._proxima_sync = now + self.sync_seconds
+        ultimo_id = db.session.query(func.max(CodigoPromocional.id)).scalar()
+        with self._lock:
+            if ultimo_id != self._ultimo_id:
+                self._ultimo_id = ultimo_id
+                self._generation += 1
+                for key in [k for k, entry in self._entries.items() if entry[1] is None]:
+                    del self._entries[key]
+
+    def get(self, codigo_texto):
+        key = normalize_code(codigo_texto)
+        now = time.monotonic()
+        if now >= self._proxima_sync:
+            self._sync(now)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        codigo = CodigoPromocional.query.filter_by(codigo=key).first()
+        snapshot = _snapshot(codigo) if codigo else None
+
+        expires_at = now + self.ttl
+        if snapshot is not None and snapshot.fecha_expiracion:
+            restante = (snapshot.fecha_expiracion - datetime.utcnow()).total_seconds()
+            expires_at = min(expires_at, now + max(restante, 0))
+
+        with self._lock:
+            # Si hubo una invalidación mientras se consultaba la base, el
+            # resultado puede estar desactualizado y no se guarda.
+            if generation == self._generation and self.ttl > 0:
+                self._entries[key] = (expires_at, snapshot)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, codigo_texto=None):
+        with self._lock:
+            self._generation += 1
+            if codigo_texto is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(normalize_code(codigo_texto), None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "ttl": self.ttl,
+            }
+
+
+code_cache = CodeCache()
+
+
+# Invalidación al escribir: los códigos tocados en un flush se invalidan
+# recién cuando la transacción confirma.
+def _track_code_change(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        code_cache.invalidate(target.codigo)
+        return
+    pendientes = session.info.setdefault("codigos_modificados", set())
+    pendientes.add(target.codigo)
+    pendientes.update(inspect(target).attrs.codigo.history.deleted or ())
+
+
+for _evento in ("after_insert", "after_update", "after_delete"):
+    event.listen(CodigoPromocional, _evento, _track_code_change)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_codes(session):
+    for codigo_texto in session.info.pop("codigos_modificados", ()):
+        code_cache.invalidate(codigo_texto)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_code_changes(session):
+    session.info.pop("codigos_modificados", None)
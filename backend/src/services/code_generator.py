@@ -0,0 +1,149 @@
+import csv
+import io
+import re
+import secrets
+from datetime import datetime
+from sqlalchemy import func
+from src.models.user import db, CodigoPromocional
+from src.services.code_cache import code_cache
+from src.utils.sql import bind_value, executemany_ignore
+
+# Sin caracteres ambiguos (0/O, 1/I/L) para códigos impresos
+DEFAULT_ALPHABET = "ABCDEFGHJKMNPQRSTUVWXYZ23456789"
+DEFAULT_LENGTH = 8
+CHUNK_SIZE = 5000
+MAX_CODES = 5_000_000
+# Relación mínima entre el espacio de códigos y la cantidad pedida, para que
+# las colisiones sean raras y los códigos no se puedan adivinar.
+MIN_SPACE_RATIO = 1000
+PREFIX_RE = re.compile(r"^[A-Z0-9-]{1,20}$")
+
+
+class CodeGenerationError(ValueError):
+    pass
+
+
+def _campaign_filter(prefijo, longitud):
+    # Rango sobre el índice único de "codigo" en lugar de LIKE
+    siguiente = prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+    return [
+        CodigoPromocional.codigo >= prefijo,
+        CodigoPromocional.codigo < siguiente,
+        func.length(CodigoPromocional.codigo) == len(prefijo) + longitud,
+    ]
+
+
+def _es_entero(valor):
+    # Los parámetros llegan de JSON: True/False no cuentan como enteros
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+
+def _validate(cantidad, prefijo, longitud, alfabeto):
+    if not _es_entero(cantidad) or not 0 < cantidad <= MAX_CODES:
+        raise CodeGenerationError(f"La cantidad debe estar entre 1 y {MAX_CODES}")
+    if not PREFIX_RE.match(prefijo):
+        raise CodeGenerationError("El prefijo es requerido y sólo admite letras, números y guiones (máx. 20)")
+    if len(alfabeto) < 10 or not re.match(r"^[A-Z0-9]+$", alfabeto):
+        raise CodeGenerationError("El alfabeto debe tener al menos 10 letras o números distintos")
+    if not _es_entero(longitud) or not 4 <= longitud or len(prefijo) + longitud > 50:
+        raise CodeGenerationError("Longitud de código inválida")
+    if len(alfabeto) ** longitud < cantidad * MIN_SPACE_RATIO:
+        raise CodeGenerationError("La longitud es insuficiente para esa cantidad de códigos")
+
+
+def generate_codes(cantidad, prefijo, puntos_valor, longitud=DEFAULT_LENGTH,
+                   alfabeto=DEFAULT_ALPHABET, descripcion=None,
+                   fecha_expiracion=None, usos_maximos=1):
+    prefijo = (prefijo or "").strip().upper()
+    alfabeto = "".join(dict.fromkeys((alfabeto or "").upper()))
+    _validate(cantidad, prefijo, longitud, alfabeto)
+    if not _es_entero(puntos_valor) or puntos_valor <= 0:
+        raise CodeGenerationError("puntos_valor debe ser un entero positivo")
+    if usos_maximos is not None and not _es_entero(usos_maximos):
+        raise CodeGenerationError("usos_maximos debe ser un entero")
+
+    filtros = _campaign_filter(prefijo, longitud)
+    if db.session.query(CodigoPromocional.id).filter(*filtros).first():
+        raise CodeGenerationError(f"Ya existen códigos con el prefijo {prefijo!r} y esa longitud")
+
+    # Los valores comunes se convierten una sola vez; cada fila sólo
+    # agrega el código.
+    conn = db.session.connection()
+    tabla_codigos = CodigoPromocional.__table__
+    comunes = {
+        "puntos_valor": puntos_valor,
+        "descripcion": descripcion,
+        "activo": True,
+        "fecha_creacion": datetime.utcnow(),
+        "fecha_expiracion": fecha_expiracion,
+        "usos_maximos": usos_maximos,
+        "usos_actuales": 0,
+    }
+    columnas = ["codigo", *comunes]
+    valores_comunes = tuple(
+        bind_value(tabla_codigos.c[nombre], valor, conn.dialect)
+        for nombre, valor in comunes.items()
+    )
+
+    # Bytes aleatorios traducidos al alfabeto en C; se descartan los bytes
+    # por encima del último múltiplo del tamaño del alfabeto para no sesgar.
+    limite = 256 - 256 % len(alfabeto)
+    tabla = bytes.maketrans(
+        bytes(range(limite)),
+        bytes(ord(alfabeto[b % len(alfabeto)]) for b in range(limite)),
+    )
+    descartar = bytes(range(limite, 256))
+
+    def chunk(n):
+        necesarios = n * longitud
+        datos = b""
+        while len(datos) < necesarios:
+            datos += secrets.token_bytes(necesarios - len(datos) + 64).translate(tabla, descartar)
+        texto = datos[:necesarios].decode("ascii")
+        return [
+            (prefijo + texto[i:i + longitud], *valores_comunes)
+            for i in range(0, necesarios, longitud)
+        ]
+
+    # Todo en una transacción: los lotes se insertan con executemany y las
+    # colisiones (improbables) se descartan con ON CONFLICT DO NOTHING y se
+    # reponen al final.
+    try:
+        pendientes = cantidad
+        while pendientes > 0:
+            for inicio in range(0, pendientes, CHUNK_SIZE):
+                executemany_ignore(conn, tabla_codigos, columnas, chunk(min(CHUNK_SIZE, pendientes - inicio)))
+            insertados = db.session.query(func.count(CodigoPromocional.id)).filter(*filtros).scalar()
+            pendientes = cantidad - insertados
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # Algunos códigos nuevos pueden estar en el cache negativo
+    code_cache.invalidate()
+    return cantidad
+
+
+def iter_campaign_codes(prefijo, longitud=DEFAULT_LENGTH):
+    prefijo = (prefijo or "").strip().upper()
+    query = (
+        db.session.query(CodigoPromocional.codigo, CodigoPromocional.puntos_valor)
+        .filter(*_campaign_filter(prefijo, longitud))
+        .order_by(CodigoPromocional.codigo)
+        .execution_options(yield_per=CHUNK_SIZE)
+    )
+    yield from query
+
+
+def iter_csv(rows, header):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
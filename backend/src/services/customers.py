@@ -0,0 +1,158 @@
+import csv
+from datetime import datetime
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db, User, HistorialPuntos
+from src.services.hashing import password_hasher
+
+PUNTOS_BIENVENIDA = 100
+IMPORT_BATCH_SIZE = 500
+# Hash que no coincide con ninguna contraseña: los clientes importados sin
+# contraseña no pueden iniciar sesión hasta que se les asigne una.
+PASSWORD_HASH_INUTILIZABLE = "!"
+
+CAMPOS_REQUERIDOS = ["email", "nombre_completo", "dni", "domicilio", "fecha_nacimiento"]
+CAMPOS_UNICOS = [("email", "El email ya está registrado"),
+                 ("username", "El username ya está registrado"),
+                 ("dni", "El DNI ya está registrado")]
+
+
+def parse_customer(data):
+    # Valida y normaliza los datos de un cliente (registro o importación)
+    for field in CAMPOS_REQUERIDOS:
+        if not str(data.get(field) or "").strip():
+            raise ValueError(f"Campo {field} es requerido")
+
+    nombre_completo = data["nombre_completo"].strip()
+    partes = nombre_completo.split(" ", 1)
+    try:
+        fecha_nacimiento = datetime.strptime(data["fecha_nacimiento"].strip(), "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError("fecha_nacimiento debe tener el formato AAAA-MM-DD")
+
+    email = data["email"].strip()
+    return {
+        "username": (data.get("username") or "").strip() or email,
+        "email": email,
+        "nombre": (data.get("nombre") or "").strip() or partes[0],
+        "apellido": (data.get("apellido") or "").strip() or (partes[1] if len(partes) > 1 else ""),
+        "nombre_completo": nombre_completo,
+        "dni": str(data["dni"]).strip(),
+        "domicilio": data["domicilio"].strip(),
+        "fecha_nacimiento": fecha_nacimiento,
+    }
+
+
+def find_conflicts(emails, usernames, dnis):
+    # Una sola consulta para los tres campos únicos
+    if not (emails or usernames or dnis):
+        return []
+    return db.session.query(User.email, User.username, User.dni).filter(
+        or_(User.email.in_(emails), User.username.in_(usernames), User.dni.in_(dnis))
+    ).all()
+
+
+def conflict_message(customer, existentes):
+    for email, username, dni in existentes:
+        valores = {"email": email, "username": username, "dni": dni}
+        for campo, mensaje in CAMPOS_UNICOS:
+            if valores[campo] == customer[campo]:
+                return mensaje
+    return None
+
+
+def _insert_batch(lote):
+    # lote: lista de (fila, cliente, password, puntos)
+    hashes = iter(password_hasher.hash_many([p for _, _, p, _ in lote if p]))
+    ahora = datetime.utcnow()
+    usuarios = [
+        {
+            **cliente,
+            "password_hash": next(hashes) if password else PASSWORD_HASH_INUTILIZABLE,
+            "puntos_actuales": puntos,
+            "email_verificado": True,
+            "activo": True,
+        }
+        for _, cliente, password, puntos in lote
+    ]
+
+    db.session.execute(insert(User), usuarios)
+    ids = dict(
+        db.session.query(User.email, User.id).filter(User.email.in_([u["email"] for u in usuarios]))
+    )
+    db.session.execute(insert(HistorialPuntos), [
+        {
+            "usuario_id": ids[u["email"]],
+            "tipo_operacion": "carga",
+            "puntos_cantidad": u["puntos_actuales"],
+            "descripcion": "Puntos de bienvenida al registrarse",
+            "fecha": ahora,
+        }
+        for u in usuarios
+    ])
+    db.session.commit()
+
+
+def _process_batch(lote, on_error):
+    existentes = find_conflicts(
+        [c["email"] for _, c, _, _ in lote],
+        [c["username"] for _, c, _, _ in lote],
+        [c["dni"] for _, c, _, _ in lote],
+    )
+
+    validos = []
+    for item in lote:
+        mensaje = conflict_message(item[1], existentes)
+        if mensaje:
+            on_error(item[0], mensaje)
+        else:
+            validos.append(item)
+    if not validos:
+        return 0
+
+    try:
+        _insert_batch(validos)
+        return len(validos)
+    except IntegrityError:
+        # Alguien registró los mismos datos mientras tanto: se reintenta
+        # fila por fila para aislar las que chocan.
+        db.session.rollback()
+        if len(validos) == 1:
+            on_error(validos[0][0], "El usuario ya existe")
+            return 0
+        return sum(_process_batch([item], on_error) for item in validos)
+
+
+# Importa clientes desde un CSV (iterable de líneas). Las filas se leen,
+# validan e insertan por lotes junto con su movimiento de puntos de
+# bienvenida; cada fila con problemas se informa con on_error(fila, mensaje)
+# sin cortar la importación. Devuelve la cantidad de clientes importados.
+def import_customers(lineas, on_error, batch_size=IMPORT_BATCH_SIZE):
+    importados = 0
+    lote = []
+    # Los duplicados entre lotes los detecta la consulta contra la base
+    vistos = set()
+
+    for fila, registro in enumerate(csv.DictReader(lineas), start=2):
+        try:
+            cliente = parse_customer(registro)
+            puntos = int(registro.get("puntos_iniciales") or PUNTOS_BIENVENIDA)
+        except ValueError as e:
+            on_error(fila, str(e))
+            continue
+
+        claves = {("email", cliente["email"]), ("username", cliente["username"]), ("dni", cliente["dni"])}
+        if claves & vistos:
+            on_error(fila, "Datos duplicados dentro del archivo")
+            continue
+        vistos |= claves
+
+        lote.append((fila, cliente, (registro.get("password") or "").strip(), puntos))
+        if len(lote) >= batch_size:
+            importados += _process_batch(lote, on_error)
+            lote = []
+            vistos = set()
+
+    if lote:
+        importados += _process_batch(lote, on_error)
+    return importados
@@ -0,0 +1,231 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from src.services.metrics import metrics
+
+# Eventos de saldo para /api/user/points/stream (SSE).
+#
+# Las escrituras registran el saldo nuevo en la sesión con publicar_saldo y
+# el evento sale recién cuando la transacción confirma. El broker lleva el
+# evento a todos los procesos; cada proceso lo reparte entre sus conexiones
+# abiertas. Cada conexión tiene un buffer acotado: si el cliente no lee, se
+# descartan los eventos más viejos (el último de cada tipo es el que importa).
+# Los eventos son (tipo, datos): "saldo" cuando cambia puntos_actuales y
+# "datos" cuando cambian otros datos del usuario (perfil, estado de canjes).
+SSE_BUFFER_SIZE = int(os.environ.get("SSE_BUFFER_SIZE", "16"))
+SSE_MAX_CONNECTIONS_PER_USER = int(os.environ.get("SSE_MAX_CONNECTIONS_PER_USER", "5"))
+# Un comentario cada N segundos mantiene viva la conexión a través de
+# proxies y detecta clientes que se fueron. Cada conexión se cierra a los
+# SSE_MAX_SECONDS; EventSource se reconecta solo tras SSE_RETRY_MS.
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", "20"))
+SSE_MAX_SECONDS = float(os.environ.get("SSE_MAX_SECONDS", "600"))
+SSE_RETRY_MS = int(os.environ.get("SSE_RETRY_MS", "5000"))
+# Cada conexión abierta es un request que no termina: con workers sync o
+# gthread ocupa un worker o un thread durante SSE_MAX_SECONDS. "auto" sirve
+# el stream sólo con workers gevent (el servicio de src/sse.py) o con el
+# servidor de desarrollo; "true"/"false" lo fuerzan.
+SSE_ENABLED = os.environ.get("SSE_ENABLED", "auto").lower()
+# Cada cuántos segundos PollingBroker lee los saldos de la base
+SSE_POLL_SECONDS = float(os.environ.get("SSE_POLL_SECONDS", "2"))
+
+logger = logging.getLogger(__name__)
+
+
+def _gevent_activo():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+
+def sse_disponible(environ):
+    if SSE_ENABLED != "auto":
+        return SSE_ENABLED in ("1", "true", "yes")
+    return _gevent_activo() or environ.get("SERVER_SOFTWARE", "").startswith("Werkzeug/")
+
+
+class Subscription:
+    def __init__(self, user_id, buffer_size=SSE_BUFFER_SIZE):
+        self.user_id = user_id
+        self.descartados = 0
+        self._eventos = deque(maxlen=buffer_size)
+        self._hay_eventos = threading.Event()
+        self._lock = threading.Lock()
+
+    def push(self, evento):
+        with self._lock:
+            if len(self._eventos) == self._eventos.maxlen:
+                self.descartados += 1
+            self._eventos.append(evento)
+            self._hay_eventos.set()
+
+    def wait(self, timeout):
+        # Devuelve los eventos pendientes, o [] si pasó timeout sin novedades
+        self._hay_eventos.wait(timeout)
+        with self._lock:
+            eventos = list(self._eventos)
+            self._eventos.clear()
+            self._hay_eventos.clear()
+        return eventos
+
+
+class TooManyConnections(Exception):
+    pass
+
+
+# Reparto en memoria del proceso: user_id -> suscripciones abiertas
+class EventHub:
+    def __init__(self, max_per_user=SSE_MAX_CONNECTIONS_PER_USER):
+        self.max_per_user = max_per_user
+        self._subs = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if len(self._subs[user_id]) >= self.max_per_user:
+                raise TooManyConnections("Demasiadas conexiones abiertas")
+            sub = Subscription(user_id)
+            self._subs[user_id].add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subs.get(sub.user_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.user_id]
+
+    def deliver(self, user_id, evento):
+        with self._lock:
+            subs = list(self._subs.get(user_id, ()))
+        for sub in subs:
+            sub.push(evento)
+
+    def usuarios(self):
+        with self._lock:
+            return list(self._subs)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "usuarios": len(self._subs),
+                "conexiones": sum(len(s) for s in self._subs.values()),
+            }
+
+
+# Broker local: entrega directo al hub del proceso. Con varios workers se
+# reemplaza (set_broker) por uno que publique en un almacén compartido y,
+# desde un thread propio, llame a deliver(user_id, evento) en cada proceso.
+class LocalBroker:
+    def __init__(self):
+        self._deliver = None
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, user_id, evento):
+        self._deliver(user_id, evento)
+
+
+# Broker para procesos que sólo sirven SSE (src/sse.py): los saldos cambian
+# en los workers de la API, así que cada SSE_POLL_SECONDS se leen de la base
+# los de los usuarios con conexiones abiertas. version_datos también cambia
+# con el perfil, las entregas o el vencimiento: se envía "saldo" sólo si
+# puntos_actuales difiere del último enviado y "datos" si cambió otra cosa.
+# Es una consulta por intervalo y por proceso, sin importar cuántas
+# conexiones haya.
+class PollingBroker:
+    LOTE = 500
+
+    def __init__(self, app, usuarios, interval=SSE_POLL_SECONDS):
+        self._app = app
+        self._usuarios = usuarios
+        self.interval = interval
+        self._deliver = None
+        self._enviados = {}
+        self._thread = None
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, user_id, evento):
+        self._deliver(user_id, evento)
+
+    def poll(self):
+        from src.models.user import db, User
+        usuarios = self._usuarios()
+        # Un usuario que se vuelve a conectar recibe su saldo en el primer
+        # ciclo aunque no haya cambiado
+        abiertos = set(usuarios)
+        self._enviados = {u: e for u, e in self._enviados.items() if u in abiertos}
+        with self._app.app_context():
+            for i in range(0, len(usuarios), self.LOTE):
+                filas = db.session.query(User.id, User.version_datos, User.puntos_actuales).filter(
+                    User.id.in_(usuarios[i:i + self.LOTE])
+                ).all()
+                for user_id, version, puntos in filas:
+                    anterior = self._enviados.get(user_id)
+                    if anterior is not None and anterior[0] == version:
+                        continue
+                    self._enviados[user_id] = (version, puntos)
+                    if anterior is None or anterior[1] != puntos:
+                        self._deliver(user_id, ("saldo", {"puntos_actuales": puntos}))
+                    else:
+                        self._deliver(user_id, ("datos", {"version_datos": version}))
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Error al leer saldos para SSE")
+
+    def run_in_background(self):
+        # En cada worker, después del fork
+        self._thread = threading.Thread(target=self._loop, name="sse-poller", daemon=True)
+        self._thread.start()
+
+
+hub = EventHub()
+_broker = LocalBroker()
+_broker.start(hub.deliver)
+
+
+def set_broker(broker):
+    global _broker
+    broker.start(hub.deliver)
+    _broker = broker
+
+
+def publicar_saldo(session, user_id, puntos_actuales):
+    # Se publica en after_commit; un rollback lo descarta
+    session.info.setdefault("saldos_modificados", {})[user_id] = puntos_actuales
+
+
+@event.listens_for(Session, "after_commit")
+def _publicar_saldos(session):
+    for user_id, puntos in session.info.pop("saldos_modificados", {}).items():
+        _broker.publish(user_id, ("saldo", {"puntos_actuales": puntos}))
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_saldos(session):
+    session.info.pop("saldos_modificados", None)
+
+
+def _sse_stats():
+    stats = hub.stats()
+    yield ("sse_connections", "gauge", "Conexiones SSE abiertas en el proceso",
+           [], stats["conexiones"])
+    yield ("sse_users", "gauge", "Usuarios con conexiones SSE abiertas en el proceso",
+           [], stats["usuarios"])
+
+
+metrics.register_collector(_sse_stats)
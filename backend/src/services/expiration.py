@@ -0,0 +1,158 @@
+import os
+from datetime import date, datetime, timedelta
+from sqlalchemy import and_, case, func, insert, literal, select, update
+from src.models.user import (
+    db, User, HistorialPuntos, SegmentoHistorial, SegmentoUsuario, CheckpointProceso
+)
+
+# Vencimiento de puntos: lo acreditado hace más de POINTS_EXPIRE_MONTHS
+# meses y no consumido vence. Los débitos (canjes, ajustes y vencimientos
+# anteriores) consumen primero los lotes más viejos (FIFO). Como los lotes
+# se consumen en el orden en que se acreditaron, lo que queda sin consumir
+# de los lotes viejos es:
+#
+#     créditos anteriores al corte - todos los débitos (si es positivo)
+#
+# Los movimientos archivados entran por segmento (mes): los débitos todos, y
+# los créditos sólo de los meses completos anteriores al corte. El archivo
+# no puede alcanzar al corte (archive.validar_meses), pero si lo hiciera el
+# resultado sería por defecto, nunca de más. Un vencimiento ya aplicado es
+# un débito más: volver a correr el proceso no vence dos veces lo mismo.
+POINTS_EXPIRE_MONTHS = int(os.environ.get("POINTS_EXPIRE_MONTHS", "12"))
+EXPIRATION_BATCH_SIZE = int(os.environ.get("EXPIRATION_BATCH_SIZE", "5000"))
+
+CHECKPOINT = "vencimiento_puntos"
+DESCRIPCION = "Vencimiento de puntos"
+
+
+def corte_vencimiento(ahora, meses=POINTS_EXPIRE_MONTHS):
+    # Misma fecha y hora, "meses" atrás (el día se ajusta a fin de mes)
+    total = ahora.year * 12 + ahora.month - 1 - meses
+    anio, mes = total // 12, total % 12 + 1
+    siguiente = datetime(anio + mes // 12, mes % 12 + 1, 1)
+    dia = min(ahora.day, (siguiente - timedelta(days=1)).day)
+    return ahora.replace(year=anio, month=mes, day=dia)
+
+
+def _a_vencer(inicio, fin, corte):
+    # Puntos a vencer por usuario del rango [inicio, fin), en una consulta
+    # agrupada. Nunca más que el saldo actual, para no dejarlo negativo.
+    credito_viejo = case(
+        (and_(HistorialPuntos.puntos_cantidad > 0, HistorialPuntos.fecha < corte),
+         HistorialPuntos.puntos_cantidad),
+        else_=0,
+    )
+    debito = case((HistorialPuntos.puntos_cantidad < 0, HistorialPuntos.puntos_cantidad), else_=0)
+    movimientos = (
+        select(
+            HistorialPuntos.usuario_id,
+            (func.sum(credito_viejo) + func.sum(debito)).label("disponible"),
+        )
+        .where(HistorialPuntos.usuario_id >= inicio, HistorialPuntos.usuario_id < fin)
+        .group_by(HistorialPuntos.usuario_id)
+        .subquery()
+    )
+    mes_corte = date(corte.year, corte.month, 1)
+    archivados = (
+        select(
+            SegmentoUsuario.usuario_id,
+            func.sum(
+                case((SegmentoHistorial.mes < mes_corte, SegmentoUsuario.creditos), else_=0)
+                + SegmentoUsuario.debitos
+            ).label("disponible"),
+        )
+        .join(SegmentoHistorial, SegmentoHistorial.id == SegmentoUsuario.segmento_id)
+        .where(SegmentoUsuario.usuario_id >= inicio, SegmentoUsuario.usuario_id < fin)
+        .group_by(SegmentoUsuario.usuario_id)
+        .subquery()
+    )
+    disponible = (
+        func.coalesce(movimientos.c.disponible, 0) + func.coalesce(archivados.c.disponible, 0)
+    )
+    saldo = func.coalesce(User.puntos_actuales, 0)
+    puntos = case((disponible < saldo, disponible), else_=saldo)
+    return (
+        select(User.id.label("usuario_id"), puntos.label("puntos"))
+        .outerjoin(movimientos, movimientos.c.usuario_id == User.id)
+        .outerjoin(archivados, archivados.c.usuario_id == User.id)
+        .where(User.id >= inicio, User.id < fin, puntos > 0)
+        .subquery()
+    )
+
+
+def _vencer_lote(inicio, fin, corte, ahora, referencia):
+    # Bloquea los usuarios del lote (PostgreSQL/MySQL) para que un canje
+    # concurrente no cambie el saldo entre el cálculo y el descuento
+    db.session.execute(
+        select(User.id).where(User.id >= inicio, User.id < fin).with_for_update()
+    )
+    ultimo_id = db.session.query(func.max(HistorialPuntos.id)).scalar() or 0
+
+    a_vencer = _a_vencer(inicio, fin, corte)
+    insertadas = db.session.execute(
+        insert(HistorialPuntos).from_select(
+            ["usuario_id", "tipo_operacion", "puntos_cantidad", "descripcion", "fecha",
+             "referencia_externa"],
+            select(
+                a_vencer.c.usuario_id,
+                literal("ajuste"),
+                -a_vencer.c.puntos,
+                literal(DESCRIPCION),
+                literal(ahora),
+                literal(referencia),
+            ),
+        )
+    ).rowcount
+    if insertadas:
+        # El descuento sale de las filas recién insertadas (id > ultimo_id)
+        vencimiento = (
+            select(HistorialPuntos.puntos_cantidad)
+            .where(
+                HistorialPuntos.usuario_id == User.id,
+                HistorialPuntos.id > ultimo_id,
+                HistorialPuntos.referencia_externa == referencia,
+            )
+            .scalar_subquery()
+        )
+        vencidos = (
+            select(HistorialPuntos.usuario_id)
+            .where(HistorialPuntos.id > ultimo_id, HistorialPuntos.referencia_externa == referencia)
+        )
+        db.session.execute(
+            update(User)
+            .where(User.id >= inicio, User.id < fin, User.id.in_(vencidos))
+            .values(
+                puntos_actuales=User.puntos_actuales + vencimiento,
+                version_datos=User.version_datos + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+    return insertadas
+
+
+# Vence los puntos de todos los usuarios, por rangos de id. Cada lote
+# (movimientos de ajuste, saldos y checkpoint) se confirma junto; si el
+# proceso se corta, la próxima corrida sigue desde el último lote
+# confirmado. Genera (último id del lote, usuarios con vencimiento).
+def vencer_puntos(ahora=None, meses=POINTS_EXPIRE_MONTHS, batch_size=EXPIRATION_BATCH_SIZE):
+    ahora = ahora or datetime.utcnow()
+    corte = corte_vencimiento(ahora, meses)
+    referencia = f"vencimiento:{corte:%Y-%m-%d}"
+    max_id = db.session.query(func.max(User.id)).scalar() or 0
+
+    inicio = CheckpointProceso.leer(CHECKPOINT) + 1
+    while inicio <= max_id:
+        fin = inicio + batch_size
+        try:
+            vencidos = _vencer_lote(inicio, fin, corte, ahora, referencia)
+            CheckpointProceso.guardar(CHECKPOINT, fin - 1)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        yield fin - 1, vencidos
+        inicio = fin
+
+    # Recorrido completo: la próxima corrida empieza desde el principio
+    CheckpointProceso.guardar(CHECKPOINT, 0)
+    db.session.commit()
@@ -0,0 +1,105 @@
+import io
+import os
+import zlib
+from datetime import datetime, time, timedelta
+from sqlalchemy import select
+from src.models.user import db, HistorialPuntos, CanjeRealizado
+from src.services.archive import inicio_historial_vivo, iter_archivado
+from src.services.code_generator import iter_csv
+from src.services.serialization import columns_for, dumps, field_names, serializer_for
+
+# Exportaciones completas de historial_puntos y canjes_realizados para
+# finanzas (endpoint de admin y CLI). Las filas se leen con un cursor del
+# servidor de a EXPORT_BATCH_SIZE (yield_per) y se escriben a medida que
+# llegan, en bloques de ~64 KB, así la memoria no depende del tamaño de la
+# exportación.
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "5000"))
+
+FORMATOS = ("csv", "ndjson")
+
+# tipo -> (modelo, columna de fecha, columna que filtra "codigo")
+EXPORTACIONES = {
+    "historial": (HistorialPuntos, HistorialPuntos.fecha, HistorialPuntos.codigo_promocional),
+    "canjes": (CanjeRealizado, CanjeRealizado.fecha_canje, CanjeRealizado.tipo_canje),
+}
+
+
+def _iter_tabla(model, filtros):
+    serialize = serializer_for(model)
+    resultado = db.session.execute(
+        select(*columns_for(model))
+        .where(*filtros)
+        .order_by(model.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    for fila in resultado:
+        yield serialize(fila)
+
+
+def _iter_historial(filtros, inicio, fin, usuario_id, codigo):
+    # Primero los meses archivados que caen en el rango, después la tabla
+    if inicio is None or inicio.date() < inicio_historial_vivo():
+        for fila in iter_archivado(inicio, fin, usuario_id):
+            if codigo is None or fila["codigo_promocional"] == codigo:
+                yield fila
+    yield from _iter_tabla(HistorialPuntos, filtros)
+
+
+def iter_ndjson(filas):
+    buffer = io.StringIO()
+    for fila in filas:
+        buffer.write(dumps(fila))
+        buffer.write("\n")
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_gzip(partes):
+    # Comprime al vuelo: cada bloque de texto sale como bytes gzip
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for parte in partes:
+        comprimido = compresor.compress(parte.encode("utf-8"))
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+
+# Devuelve el generador de la exportación: bloques de texto, o de bytes si
+# comprimir=True. Las validaciones ocurren acá, antes de empezar a escribir.
+# desde/hasta son fechas inclusive; codigo filtra por código promocional en
+# el historial y por tipo de canje (id del premio) en los canjes.
+def exportar(tipo, formato="csv", comprimir=False, desde=None, hasta=None,
+             usuario_id=None, codigo=None):
+    if tipo not in EXPORTACIONES:
+        raise ValueError(f"Tipo de exportación inválido: {tipo}")
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato}")
+    if desde and hasta and desde > hasta:
+        raise ValueError("El rango de fechas es inválido")
+
+    model, fecha_col, codigo_col = EXPORTACIONES[tipo]
+    inicio = datetime.combine(desde, time.min) if desde else None
+    fin = datetime.combine(hasta + timedelta(days=1), time.min) if hasta else None
+    filtros = []
+    if inicio is not None:
+        filtros.append(fecha_col >= inicio)
+    if fin is not None:
+        filtros.append(fecha_col < fin)
+    if usuario_id is not None:
+        filtros.append(model.usuario_id == usuario_id)
+    if codigo:
+        filtros.append(codigo_col == codigo)
+
+    if tipo == "historial":
+        filas = _iter_historial(filtros, inicio, fin, usuario_id, codigo or None)
+    else:
+        filas = _iter_tabla(model, filtros)
+
+    if formato == "csv":
+        partes = iter_csv((fila.values() for fila in filas), field_names(model))
+    else:
+        partes = iter_ndjson(filas)
+    return iter_gzip(partes) if comprimir else partes
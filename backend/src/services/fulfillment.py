@@ -0,0 +1,251 @@
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, select, update
+from src.models.user import db, User, CanjeRealizado, OutboxCanje
+
+# Worker de entregas de canjes. El request de canje sólo inserta la tarea en
+# outbox_canjes; este worker reclama tareas por lotes, avisa al equipo de
+# entregas con el notificador configurado y pasa el canje a "procesado".
+# Se pueden correr varios workers en paralelo: cada lote se reclama con un
+# UPDATE condicional (y FOR UPDATE SKIP LOCKED en PostgreSQL), así dos
+# workers nunca toman la misma tarea.
+FULFILLMENT_BATCH_SIZE = int(os.environ.get("FULFILLMENT_BATCH_SIZE", "50"))
+FULFILLMENT_POLL_INTERVAL = float(os.environ.get("FULFILLMENT_POLL_INTERVAL", "5"))
+FULFILLMENT_MAX_ATTEMPTS = int(os.environ.get("FULFILLMENT_MAX_ATTEMPTS", "8"))
+FULFILLMENT_BACKOFF_BASE = float(os.environ.get("FULFILLMENT_BACKOFF_BASE", "30"))
+FULFILLMENT_BACKOFF_MAX = float(os.environ.get("FULFILLMENT_BACKOFF_MAX", "3600"))
+# Tiempo que queda reservada cada tarea; si el worker muere, otro la retoma.
+# La reserva se renueva antes de cada aviso, así que tiene que superar el
+# timeout del webhook.
+FULFILLMENT_LEASE_SECONDS = int(os.environ.get("FULFILLMENT_LEASE_SECONDS", "300"))
+FULFILLMENT_NOTIFIER = os.environ.get("FULFILLMENT_NOTIFIER", "log")
+FULFILLMENT_WEBHOOK_URL = os.environ.get("FULFILLMENT_WEBHOOK_URL")
+FULFILLMENT_WEBHOOK_TIMEOUT = float(os.environ.get("FULFILLMENT_WEBHOOK_TIMEOUT", "10"))
+
+logger = logging.getLogger(__name__)
+
+
+# Notificadores: reciben el canje (dict) con los datos de contacto del
+# usuario y lanzan una excepción si no pudieron avisar (se reintenta).
+class LogNotifier:
+    # Stub local: sólo registra el aviso. Sirve en desarrollo y en pruebas.
+    def __init__(self):
+        self.enviados = []
+
+    def notify(self, canje):
+        self.enviados.append(canje)
+        logger.info("Canje %s listo para entregar: %s", canje["id"], canje["tipo_canje"])
+
+
+class WebhookNotifier:
+    # POST JSON a una URL (integración con WhatsApp, mail, etc.)
+    def __init__(self, url, timeout=FULFILLMENT_WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def notify(self, canje):
+        # urllib.request sólo lo usa el worker: no se importa con la app
+        import urllib.request
+        cuerpo = json.dumps(canje, ensure_ascii=False).encode("utf-8")
+        pedido = urllib.request.Request(
+            self.url, data=cuerpo, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(pedido, timeout=self.timeout) as respuesta:
+            if respuesta.status >= 300:
+                raise RuntimeError(f"Webhook respondió {respuesta.status}")
+
+
+def notifier_from_config():
+    if FULFILLMENT_NOTIFIER == "webhook":
+        if not FULFILLMENT_WEBHOOK_URL:
+            raise ValueError("FULFILLMENT_WEBHOOK_URL es requerido con FULFILLMENT_NOTIFIER=webhook")
+        if FULFILLMENT_WEBHOOK_TIMEOUT >= FULFILLMENT_LEASE_SECONDS:
+            raise ValueError(
+                "FULFILLMENT_WEBHOOK_TIMEOUT debe ser menor que FULFILLMENT_LEASE_SECONDS"
+            )
+        return WebhookNotifier(FULFILLMENT_WEBHOOK_URL)
+    if FULFILLMENT_NOTIFIER == "log":
+        return LogNotifier()
+    raise ValueError(f"Notificador desconocido: {FULFILLMENT_NOTIFIER}")
+
+
+def encolar_canje(canje_id):
+    # Se llama dentro de la transacción del canje, antes del commit
+    db.session.add(OutboxCanje(canje_id=canje_id))
+
+
+def backoff(intentos):
+    # Exponencial con jitter, acotado
+    espera = min(FULFILLMENT_BACKOFF_MAX, FULFILLMENT_BACKOFF_BASE * 2 ** (intentos - 1))
+    return timedelta(seconds=espera * random.uniform(0.5, 1.0))
+
+
+def _reclamar(limite, ahora):
+    # Toma hasta "limite" tareas vencidas (pendientes o con la reserva
+    # expirada) y las marca con un id de lote propio.
+    lote = uuid.uuid4().hex
+    disponible = or_(
+        and_(OutboxCanje.estado == "pendiente", OutboxCanje.proximo_intento <= ahora),
+        and_(OutboxCanje.estado == "procesando", OutboxCanje.bloqueada_hasta < ahora),
+    )
+    candidatas = (
+        select(OutboxCanje.id)
+        .where(disponible)
+        .order_by(OutboxCanje.proximo_intento)
+        .limit(limite)
+        .with_for_update(skip_locked=True)
+    )
+    db.session.execute(
+        update(OutboxCanje)
+        .where(OutboxCanje.id.in_(candidatas.scalar_subquery()), disponible)
+        .values(
+            estado="procesando",
+            lote=lote,
+            bloqueada_hasta=ahora + timedelta(seconds=FULFILLMENT_LEASE_SECONDS),
+            intentos=OutboxCanje.intentos + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return lote, db.session.execute(
+        select(OutboxCanje.id, OutboxCanje.canje_id, OutboxCanje.intentos)
+        .where(OutboxCanje.lote == lote, OutboxCanje.estado == "procesando")
+    ).all()
+
+
+def _cargar_canjes(canje_ids):
+    filas = db.session.execute(
+        select(CanjeRealizado, User.nombre_completo, User.email)
+        .outerjoin(User, User.id == CanjeRealizado.usuario_id)
+        .where(CanjeRealizado.id.in_(canje_ids))
+    ).all()
+    canjes = {}
+    for canje, nombre_completo, email in filas:
+        datos = canje.to_dict()
+        datos["usuario"] = {"nombre_completo": nombre_completo, "email": email}
+        canjes[canje.id] = datos
+    return canjes
+
+
+def _renovar(lote, tarea):
+    # Extiende la reserva de una tarea antes de avisarla. Si la reserva ya
+    # venció y otro worker la reclamó, no coincide ninguna fila: no se avisa.
+    resultado = db.session.execute(
+        update(OutboxCanje)
+        .where(OutboxCanje.id == tarea.id, OutboxCanje.lote == lote,
+               OutboxCanje.estado == "procesando")
+        .values(bloqueada_hasta=datetime.utcnow() + timedelta(seconds=FULFILLMENT_LEASE_SECONDS))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return resultado.rowcount == 1
+
+
+# Procesa un lote. Devuelve (completadas, reintentos, fallidas).
+def procesar_lote(notifier, limite=FULFILLMENT_BATCH_SIZE):
+    ahora = datetime.utcnow()
+    lote, tareas = _reclamar(limite, ahora)
+    if not tareas:
+        return 0, 0, 0
+
+    canjes = _cargar_canjes([t.canje_id for t in tareas])
+    completadas, reintentos, fallidas = [], [], []
+    for tarea in tareas:
+        canje = canjes.get(tarea.canje_id)
+        if not _renovar(lote, tarea):
+            logger.warning("Tarea de canje %s reclamada por otro worker", tarea.canje_id)
+            continue
+        try:
+            if canje is None:
+                raise LookupError(f"Canje {tarea.canje_id} inexistente")
+            if canje["estado"] == "pendiente":
+                notifier.notify(canje)
+            completadas.append(tarea)
+        except Exception as e:
+            logger.warning("Tarea de canje %s falló (intento %s): %s",
+                           tarea.canje_id, tarea.intentos, e)
+            if tarea.intentos >= FULFILLMENT_MAX_ATTEMPTS or canje is None:
+                fallidas.append((tarea, str(e)))
+            else:
+                reintentos.append((tarea, str(e)))
+
+    # Sólo se cierran las tareas que siguen reservadas por este lote: si una
+    # reserva venció mientras se avisaba, el estado lo decide el otro worker
+    propias = and_(OutboxCanje.lote == lote, OutboxCanje.estado == "procesando")
+    vigentes = set(db.session.execute(
+        select(OutboxCanje.id)
+        .where(OutboxCanje.id.in_([t.id for t in tareas]), propias)
+        .with_for_update()
+    ).scalars())
+    completadas = [t for t in completadas if t.id in vigentes]
+    reintentos = [(t, e) for t, e in reintentos if t.id in vigentes]
+    fallidas = [(t, e) for t, e in fallidas if t.id in vigentes]
+
+    # Transiciones en bloque para los avisos exitosos
+    fin = datetime.utcnow()
+    cerradas = [0, 0, 0]
+    if completadas:
+        db.session.execute(
+            update(CanjeRealizado)
+            .where(
+                CanjeRealizado.id.in_([t.canje_id for t in completadas]),
+                CanjeRealizado.estado == "pendiente",
+            )
+            .values(estado="procesado")
+            .execution_options(synchronize_session=False)
+        )
+        # El estado forma parte de /rewards/history: cambia el ETag del usuario
+        usuarios = sorted({canjes[t.canje_id]["usuario_id"] for t in completadas})
+        db.session.execute(
+            update(User)
+            .where(User.id.in_(usuarios))
+            .values(version_datos=User.version_datos + 1)
+            .execution_options(synchronize_session=False)
+        )
+        cerradas[0] = db.session.execute(
+            update(OutboxCanje)
+            .where(OutboxCanje.id.in_([t.id for t in completadas]), propias)
+            .values(estado="completada", fecha_completada=fin, bloqueada_hasta=None, ultimo_error=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    for tarea, error in reintentos:
+        cerradas[1] += db.session.execute(
+            update(OutboxCanje)
+            .where(OutboxCanje.id == tarea.id, propias)
+            .values(estado="pendiente", proximo_intento=fin + backoff(tarea.intentos),
+                    bloqueada_hasta=None, ultimo_error=error)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    for tarea, error in fallidas:
+        cerradas[2] += db.session.execute(
+            update(OutboxCanje)
+            .where(OutboxCanje.id == tarea.id, propias)
+            .values(estado="fallida", bloqueada_hasta=None, ultimo_error=error)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    db.session.commit()
+    return tuple(cerradas)
+
+
+# Bucle del worker: procesa lotes mientras haya tareas y espera
+# poll_interval cuando la cola queda vacía. Con once=True termina al vaciarla.
+def run_worker(notifier, batch_size=FULFILLMENT_BATCH_SIZE,
+               poll_interval=FULFILLMENT_POLL_INTERVAL, once=False):
+    totales = [0, 0, 0]
+    while True:
+        try:
+            resultado = procesar_lote(notifier, batch_size)
+        except Exception:
+            db.session.rollback()
+            logger.exception("Error procesando el lote de canjes")
+            resultado = (0, 0, 0)
+        totales = [a + b for a, b in zip(totales, resultado)]
+        if sum(resultado) == 0:
+            if once:
+                return tuple(totales)
+            time.sleep(poll_interval)
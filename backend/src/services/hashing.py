@@ -0,0 +1,104 @@
+import os
+import threading
+from itertools import repeat
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+# Método y costo en formato werkzeug, p. ej. "scrypt:32768:8:1" o
+# "pbkdf2:sha256:600000"
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+# 0 desactiva el pool y calcula los hashes en el mismo proceso
+HASH_POOL_WORKERS = int(os.environ.get("HASH_POOL_WORKERS", str(os.cpu_count() or 1)))
+HASH_POOL_MAX_PENDING = int(
+    os.environ.get("HASH_POOL_MAX_PENDING", str(max(HASH_POOL_WORKERS, 1) * 4))
+)
+HASH_TIMEOUT = float(os.environ.get("HASH_TIMEOUT", "5"))
+
+
+class HashingUnavailable(Exception):
+    pass
+
+
+def full_method(method):
+    # Método con todos sus parámetros, como werkzeug lo escribe en el hash:
+    # "scrypt" -> "scrypt:32768:8:1", "pbkdf2" -> "pbkdf2:sha256:<iteraciones>"
+    nombre, *args = method.split(":")
+    if nombre == "scrypt":
+        args = args or [2**15, 8, 1]
+    elif nombre == "pbkdf2":
+        args = [args[0] if args else "sha256",
+                args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS]
+    return ":".join([nombre, *(str(int(a)) if str(a).isdigit() else a for a in args)])
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _check(password_hash, password):
+    return check_password_hash(password_hash, password)
+
+
+# Pool de procesos para la derivación de claves, que es CPU-bound y bloquea
+# el worker si se calcula dentro del request. La cola está acotada: si hay
+# demasiados pedidos en espera se rechaza en lugar de encolar sin límite.
+class PasswordHasher:
+    def __init__(self, workers=HASH_POOL_WORKERS, max_pending=HASH_POOL_MAX_PENDING,
+                 timeout=HASH_TIMEOUT, method=PASSWORD_HASH_METHOD):
+        self.workers = workers
+        self.timeout = timeout
+        self.method = method
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Se crea en el primer uso de cada proceso (después del fork de gunicorn)
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # multiprocessing se importa recién acá, fuera del arranque
+                from concurrent.futures import ProcessPoolExecutor
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HashingUnavailable("Servicio de contraseñas saturado")
+        try:
+            future = self._get_executor().submit(fn, *args)
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise HashingUnavailable("Tiempo de espera agotado al procesar la contraseña")
+        finally:
+            self._slots.release()
+
+    def hash_password(self, password):
+        return self._run(_hash, password, self.method)
+
+    def hash_many(self, passwords):
+        # Para cargas masivas (CLI/importación): reparte los hashes entre
+        # todos los procesos del pool, sin el límite de la cola de requests.
+        if self.workers <= 0 or not passwords:
+            return [_hash(p, self.method) for p in passwords]
+        return list(self._get_executor().map(_hash, passwords, repeat(self.method)))
+
+    def verify_password(self, password_hash, password):
+        return self._run(_check, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        # Formato werkzeug: "<método>$<salt>$<hash>", con el método completo
+        return full_method(password_hash.split("$", 1)[0]) != full_method(self.method)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+password_hasher = PasswordHasher()
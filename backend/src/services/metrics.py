@@ -0,0 +1,219 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from flask import g, has_app_context, request
+from sqlalchemy import event
+
+# 0 desactiva el log de requests lentos
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, limite in enumerate(self.buckets):
+            if value <= limite:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+# Registro en memoria del proceso, expuesto en formato de texto de Prometheus
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = defaultdict(float)
+        self._help = {}
+        self._collectors = []
+
+    def _histogram(self, name, labels, buckets):
+        key = (name, labels)
+        if key not in self._histograms:
+            self._histograms[key] = Histogram(buckets)
+        return self._histograms[key]
+
+    def observe(self, name, value, labels=(), buckets=LATENCY_BUCKETS, help=None):
+        with self._lock:
+            if help:
+                self._help[name] = (help, "histogram")
+            self._histogram(name, tuple(labels), buckets).observe(value)
+
+    def inc(self, name, amount=1, labels=(), help=None):
+        with self._lock:
+            if help:
+                self._help[name] = (help, "counter")
+            self._counters[(name, tuple(labels))] += amount
+
+    def register_collector(self, collector):
+        # collector() -> iterable de (nombre, tipo, ayuda, labels, valor);
+        # para exponer contadores que viven en otros módulos (caches, etc.)
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def render(self):
+        lineas = []
+        vistos = set()
+
+        def encabezado(name, tipo, ayuda):
+            if name not in vistos:
+                vistos.add(name)
+                lineas.append(f"# HELP {name} {ayuda}")
+                lineas.append(f"# TYPE {name} {tipo}")
+
+        with self._lock:
+            for (name, labels), valor in sorted(self._counters.items()):
+                ayuda, tipo = self._help.get(name, (name, "counter"))
+                encabezado(name, tipo, ayuda)
+                lineas.append(f"{name}{_labels(labels)} {_valor(valor)}")
+            for (name, labels), hist in sorted(self._histograms.items(), key=lambda i: i[0]):
+                ayuda, tipo = self._help.get(name, (name, "histogram"))
+                encabezado(name, tipo, ayuda)
+                for limite, cantidad in zip(hist.buckets, hist.counts):
+                    lineas.append(f"{name}_bucket{_labels(labels + (('le', _valor(limite)),))} {cantidad}")
+                lineas.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {hist.total}")
+                lineas.append(f"{name}_sum{_labels(labels)} {_valor(hist.sum)}")
+                lineas.append(f"{name}_count{_labels(labels)} {hist.total}")
+            collectors = list(self._collectors)
+
+        for collector in collectors:
+            for name, tipo, ayuda, labels, valor in collector():
+                encabezado(name, tipo, ayuda)
+                lineas.append(f"{name}{_labels(tuple(labels))} {_valor(valor)}")
+        return "\n".join(lineas) + "\n"
+
+
+def _valor(valor):
+    # Valor exacto: enteros sin decimales y floats con repr (":g" redondea
+    # a 6 dígitos significativos y los contadores grandes pierden precisión)
+    if isinstance(valor, float):
+        if math.isnan(valor):
+            return "NaN"
+        if math.isinf(valor):
+            return "+Inf" if valor > 0 else "-Inf"
+        if valor.is_integer() and abs(valor) < 2**53:
+            return str(int(valor))
+        return repr(valor)
+    return str(int(valor))
+
+
+def _escape(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+metrics = MetricsRegistry()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_app_context() or not conn.info.get("query_start"):
+        return
+    duracion = time.perf_counter() - conn.info["query_start"].pop()
+    stats = g.get("sql_stats")
+    if stats is None:
+        return
+    stats["count"] += 1
+    stats["seconds"] += duracion
+    if SLOW_REQUEST_MS > 0:
+        stats["statements"].append((duracion, statement))
+
+
+def _discard_query_timer(context):
+    if context.connection is not None and context.connection.info.get("query_start"):
+        context.connection.info["query_start"].pop()
+
+
+def _cache_stats():
+    from src.services.auth_cache import token_cache, user_status_cache
+    from src.services.code_cache import code_cache
+    from src.services.catalog import catalog_cache
+    from src.storage import write_queue
+
+    for nombre, cache in (("codigos", code_cache), ("tokens", token_cache),
+                          ("usuarios", user_status_cache), ("catalogo", catalog_cache)):
+        stats = cache.stats()
+        yield ("cache_hits_total", "counter", "Aciertos de los caches en memoria",
+               [("cache", nombre)], stats["hits"])
+        yield ("cache_misses_total", "counter", "Fallos de los caches en memoria",
+               [("cache", nombre)], stats["misses"])
+        yield ("cache_entries", "gauge", "Entradas en los caches en memoria",
+               [("cache", nombre)], stats["entries"])
+    yield ("write_queue_pending", "gauge", "Transacciones esperando en la cola de escritura",
+           [], write_queue.pending())
+
+
+def _start_request():
+    g.request_start = time.perf_counter()
+    g.sql_stats = {"count": 0, "seconds": 0.0, "statements": []}
+
+
+def _record_request(response):
+    inicio = g.pop("request_start", None)
+    stats = g.pop("sql_stats", None)
+    if inicio is None:
+        return response
+
+    duracion = time.perf_counter() - inicio
+    # Se usa la regla de la ruta (no la URL) para no multiplicar las series
+    endpoint = request.url_rule.rule if request.url_rule else "sin_ruta"
+    labels = (("endpoint", endpoint), ("method", request.method))
+
+    metrics.observe("http_request_duration_seconds", duracion, labels,
+                    help="Latencia de los requests HTTP")
+    metrics.inc("http_requests_total", labels=labels + (("status", response.status_code),),
+                help="Requests HTTP por endpoint y código de estado")
+    if stats is not None:
+        metrics.observe("http_request_sql_queries", stats["count"], labels, QUERY_COUNT_BUCKETS,
+                        help="Consultas SQL por request")
+        metrics.observe("http_request_sql_duration_seconds", stats["seconds"], labels,
+                        help="Tiempo total en SQL por request")
+
+    if SLOW_REQUEST_MS > 0 and duracion * 1000 >= SLOW_REQUEST_MS:
+        detalle = "\n".join(
+            f"  {ms * 1000:.1f}ms {sql}" for ms, sql in (stats or {}).get("statements", [])
+        )
+        logger.warning(
+            "Request lento: %s %s %.1fms, %d consultas SQL\n%s",
+            request.method, request.path, duracion * 1000,
+            (stats or {}).get("count", 0), detalle,
+        )
+    return response
+
+
+def metrics_endpoint():
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+def init_metrics(app, db):
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _discard_query_timer)
+    metrics.register_collector(_cache_stats)
+    app.before_request(_start_request)
+    app.after_request(_record_request)
+    app.add_url_rule("/api/metrics", "metrics", metrics_endpoint, methods=["GET"])
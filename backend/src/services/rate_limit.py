@@ -0,0 +1,159 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import g, jsonify, request
+from src.services.metrics import metrics
+
+# Límites de intentos sobre los endpoints de códigos (token bucket): la
+# capacidad es la ráfaga permitida y se repone a razón de N por minuto.
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_CODES_USER_PER_MIN = float(os.environ.get("RATE_LIMIT_CODES_USER_PER_MIN", "20"))
+RATE_LIMIT_CODES_IP_PER_MIN = float(os.environ.get("RATE_LIMIT_CODES_IP_PER_MIN", "60"))
+# Costo total de un intento con un código inexistente (uno normal cuesta 1)
+RATE_LIMIT_FAILURE_COST = float(os.environ.get("RATE_LIMIT_FAILURE_COST", "5"))
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000"))
+# Sólo detrás de un proxy propio: toma la IP de X-Forwarded-For
+RATE_LIMIT_TRUST_PROXY = os.environ.get("RATE_LIMIT_TRUST_PROXY", "false").lower() in ("1", "true", "yes")
+
+
+# Backend en memoria del proceso. Cada worker lleva sus propios contadores;
+# para un límite compartido entre procesos o servidores se reemplaza por un
+# backend con la misma interfaz (consume / penalize / size) sobre un almacén
+# común, con rate_limiter.backend = ...
+class MemoryBackend:
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _refill(self, key, capacity, per_second, now):
+        tokens, last = self._buckets.get(key, (capacity, now))
+        return min(capacity, tokens + (now - last) * per_second)
+
+    def _store(self, key, tokens, now):
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+    def consume(self, limites, cost):
+        # limites: [(key, capacity, per_second), ...]. Descuenta de todos o
+        # de ninguno: devuelve (None, 0) si se permitió el request o (índice
+        # del primer límite agotado, segundos a esperar).
+        with self._lock:
+            now = self.clock()
+            saldos = [self._refill(key, capacity, per_second, now)
+                      for key, capacity, per_second in limites]
+            for i, ((key, _, per_second), tokens) in enumerate(zip(limites, saldos)):
+                if tokens < cost:
+                    return i, (cost - tokens) / per_second
+            for (key, _, _), tokens in zip(limites, saldos):
+                self._store(key, tokens - cost, now)
+            return None, 0
+
+    def penalize(self, key, cost, capacity, per_second):
+        # Descuenta sin rechazar; el saldo puede quedar negativo (hasta una
+        # capacidad completa) para alargar la espera tras muchos fallos.
+        with self._lock:
+            now = self.clock()
+            tokens = self._refill(key, capacity, per_second, now)
+            self._store(key, max(tokens - cost, -capacity), now)
+
+    def size(self):
+        with self._lock:
+            return len(self._buckets)
+
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def consume(self, limites, cost=1):
+        # limites: [(key, per_minute), ...]
+        return self.backend.consume(
+            [(key, per_minute, per_minute / 60) for key, per_minute in limites], cost
+        )
+
+    def penalize(self, key, per_minute, cost):
+        self.backend.penalize(key, cost, per_minute, per_minute / 60)
+
+
+rate_limiter = RateLimiter(MemoryBackend())
+
+
+def client_ip():
+    if RATE_LIMIT_TRUST_PROXY and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or "desconocida"
+
+
+def registrar_fallo(cantidad=1):
+    # Los handlers avisan cuántos códigos buscados no existían
+    g.rate_limit_fallos = g.get("rate_limit_fallos", 0) + cantidad
+
+
+def _rechazar(scope, tipo, espera):
+    metrics.inc("rate_limit_rejected_total", labels=(("scope", scope), ("clave", tipo)),
+                help="Requests rechazados por límite de intentos")
+    segundos = max(1, math.ceil(espera))
+    response = jsonify({'error': f'Demasiados intentos. Probá de nuevo en {segundos} segundos.'})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(segundos)
+    return response
+
+
+# Limita por IP y por usuario antes de ejecutar el handler (y su
+# require_auth). user_id_fn obtiene el usuario sin ir a la base (token
+# cacheado); si no hay usuario sólo se aplica el límite por IP. Los códigos
+# inexistentes informados con registrar_fallo cuestan RATE_LIMIT_FAILURE_COST.
+def rate_limited(scope, user_id_fn,
+                 user_per_minute=RATE_LIMIT_CODES_USER_PER_MIN,
+                 ip_per_minute=RATE_LIMIT_CODES_IP_PER_MIN):
+    def decorator(f):
+        def decorated_function(*args, **kwargs):
+            if not RATE_LIMIT_ENABLED:
+                return f(*args, **kwargs)
+
+            claves = [("ip", f"{scope}:ip:{client_ip()}", ip_per_minute)]
+            user_id = user_id_fn()
+            if user_id is not None:
+                claves.append(("usuario", f"{scope}:usuario:{user_id}", user_per_minute))
+
+            # Se comprueban todos los límites antes de descontar: un request
+            # rechazado por el límite del usuario no gasta el de su IP, que
+            # comparten otros usuarios detrás del mismo NAT
+            agotado, espera = rate_limiter.consume(
+                [(clave, por_minuto) for _, clave, por_minuto in claves]
+            )
+            if agotado is not None:
+                return _rechazar(scope, claves[agotado][0], espera)
+            metrics.inc("rate_limit_allowed_total", labels=(("scope", scope),),
+                        help="Requests admitidos por el límite de intentos")
+
+            g.rate_limit_fallos = 0
+            response = f(*args, **kwargs)
+            fallos = g.pop("rate_limit_fallos", 0)
+            if fallos:
+                metrics.inc("rate_limit_failures_total", fallos, labels=(("scope", scope),),
+                            help="Códigos inexistentes buscados")
+                # El intento ya pagó 1; se cobra el resto del costo del fallo
+                extra = fallos * RATE_LIMIT_FAILURE_COST - 1
+                for tipo, clave, por_minuto in claves:
+                    rate_limiter.penalize(clave, por_minuto, extra)
+            return response
+
+        decorated_function.__name__ = f.__name__
+        return decorated_function
+
+    return decorator
+
+
+def _rate_limit_stats():
+    yield ("rate_limit_keys", "gauge", "Claves con contadores de límite de intentos",
+           [], rate_limiter.backend.size())
+
+
+metrics.register_collector(_rate_limit_stats)
@@ -0,0 +1,94 @@
+from sqlalchemy import func, select, update
+from src.models.user import db, User, HistorialPuntos, SaldoArchivado, CheckpointProceso
+
+CHUNK_SIZE = 5000
+CHECKPOINT = "conciliacion_saldos"
+
+
+# El saldo esperado es la suma del historial vivo más la de los movimientos
+# archivados (saldos_archivados, ver services/archive.py).
+def _suma_historial(usuario_id_col):
+    vivo = (
+        select(func.coalesce(func.sum(HistorialPuntos.puntos_cantidad), 0))
+        .where(HistorialPuntos.usuario_id == usuario_id_col)
+        .scalar_subquery()
+    )
+    archivado = (
+        select(SaldoArchivado.puntos)
+        .where(SaldoArchivado.usuario_id == usuario_id_col)
+        .scalar_subquery()
+    )
+    return vivo + func.coalesce(archivado, 0)
+
+
+def _diferencias(filtro):
+    # Un único agregado agrupado por usuario, restringido al lote
+    suma = (
+        func.coalesce(func.sum(HistorialPuntos.puntos_cantidad), 0)
+        + func.coalesce(SaldoArchivado.puntos, 0)
+    )
+    query = (
+        select(User.id, User.puntos_actuales, suma)
+        .select_from(User)
+        .outerjoin(HistorialPuntos, HistorialPuntos.usuario_id == User.id)
+        .outerjoin(SaldoArchivado, SaldoArchivado.usuario_id == User.id)
+        .where(filtro)
+        .group_by(User.id, User.puntos_actuales, SaldoArchivado.puntos)
+        .having(func.coalesce(User.puntos_actuales, 0) != suma)
+    )
+    return db.session.execute(query).all()
+
+
+def _reparar(user_ids):
+    # Se recalcula en la misma sentencia para no pisar movimientos
+    # concurrentes entre la lectura y la corrección.
+    db.session.execute(
+        update(User)
+        .where(User.id.in_(user_ids))
+        .values(
+            puntos_actuales=_suma_historial(User.id),
+            version_datos=User.version_datos + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _lotes_completos(chunk_size):
+    max_id = db.session.query(func.max(User.id)).scalar() or 0
+    for inicio in range(0, max_id + 1, chunk_size):
+        yield (User.id >= inicio) & (User.id < inicio + chunk_size)
+
+
+def _lotes_incrementales(desde, hasta, chunk_size):
+    # Usuarios con movimientos nuevos desde el último checkpoint, recorriendo
+    # el historial por rangos de id
+    for inicio in range(desde + 1, hasta + 1, chunk_size):
+        fin = min(inicio + chunk_size, hasta + 1)
+        user_ids = db.session.execute(
+            select(HistorialPuntos.usuario_id)
+            .where(HistorialPuntos.id >= inicio, HistorialPuntos.id < fin)
+            .distinct()
+        ).scalars().all()
+        if user_ids:
+            yield User.id.in_(user_ids)
+
+
+# Compara puntos_actuales con la suma del historial y, opcionalmente, lo
+# corrige. Genera (usuario_id, puntos_actuales, suma_historial) por cada
+# diferencia; el checkpoint se guarda al terminar el recorrido.
+def reconcile_balances(reparar=False, incremental=False, chunk_size=CHUNK_SIZE):
+    hasta = db.session.query(func.max(HistorialPuntos.id)).scalar() or 0
+    if incremental:
+        lotes = _lotes_incrementales(CheckpointProceso.leer(CHECKPOINT), hasta, chunk_size)
+    else:
+        lotes = _lotes_completos(chunk_size)
+
+    for filtro in lotes:
+        diferencias = _diferencias(filtro)
+        if reparar and diferencias:
+            _reparar([fila[0] for fila in diferencias])
+        db.session.commit()
+        yield from diferencias
+
+    CheckpointProceso.guardar(CHECKPOINT, hasta)
+    db.session.commit()
@@ -0,0 +1,153 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from sqlalchemy import delete, func, insert, select
+from src.models.user import (
+    db, HistorialPuntos, CanjeRealizado, ResumenCodigoDiario, ResumenCanjeDiario
+)
+from src.services.archive import inicio_historial_vivo
+from src.utils.sql import upsert_increment
+
+# Resúmenes diarios de puntos otorgados por código y de puntos canjeados por
+# tipo de canje. Las funciones registrar_* se llaman dentro de la
+# transacción del canje (no hacen commit), así el resumen y el historial se
+# confirman o se descartan juntos.
+
+
+def registrar_codigos(dia, codigos):
+    # codigos: [(codigo, puntos), ...]. Se agrupan antes del upsert porque
+    # un mismo INSERT no puede actualizar dos veces la misma fila.
+    acumulado = defaultdict(lambda: [0, 0])
+    for codigo, puntos in codigos:
+        acumulado[codigo][0] += puntos
+        acumulado[codigo][1] += 1
+    if not acumulado:
+        return
+    db.session.execute(upsert_increment(
+        ResumenCodigoDiario.__table__, db.engine, ["dia", "codigo"],
+        [
+            {"dia": dia, "codigo": codigo, "puntos": puntos, "usos": usos}
+            for codigo, (puntos, usos) in acumulado.items()
+        ],
+        ["puntos", "usos"],
+    ))
+
+
+def registrar_canje(dia, tipo_canje, puntos):
+    db.session.execute(upsert_increment(
+        ResumenCanjeDiario.__table__, db.engine, ["dia", "tipo_canje"],
+        [{"dia": dia, "tipo_canje": tipo_canje, "puntos": puntos, "cantidad": 1}],
+        ["puntos", "cantidad"],
+    ))
+
+
+def _primer_dia():
+    fechas = [
+        db.session.query(func.min(HistorialPuntos.fecha)).scalar(),
+        db.session.query(func.min(CanjeRealizado.fecha_canje)).scalar(),
+    ]
+    fechas = [f for f in fechas if f is not None]
+    return min(fechas).date() if fechas else None
+
+
+# Recalcula los resúmenes de [desde, hasta] (fechas inclusive) a partir del
+# historial, en una sola transacción: borra los días del rango y los vuelve
+# a insertar con INSERT ... SELECT agrupado. Sin desde se toma el primer
+# movimiento; sin hasta, el día de hoy. Devuelve las filas generadas por
+# cada tabla. Para el día en curso conviene correrlo con poco tráfico: un
+# canje concurrente podría quedar contado dos veces o ninguna.
+def backfill(desde=None, hasta=None):
+    hasta = hasta or datetime.utcnow().date()
+    desde = desde or _primer_dia()
+    if desde is None:
+        return 0, 0
+    inicio = datetime.combine(desde, time.min)
+    fin = datetime.combine(hasta + timedelta(days=1), time.min)
+    # Los meses archivados ya no están en historial_puntos: su resumen por
+    # código se conserva como está
+    desde_codigos = max(desde, inicio_historial_vivo())
+    inicio_codigos = datetime.combine(desde_codigos, time.min)
+
+    dia_codigo = func.date(HistorialPuntos.fecha)
+    codigos = (
+        select(
+            dia_codigo,
+            HistorialPuntos.codigo_promocional,
+            func.sum(HistorialPuntos.puntos_cantidad),
+            func.count(),
+        )
+        .where(
+            HistorialPuntos.codigo_promocional.isnot(None),
+            HistorialPuntos.fecha >= inicio_codigos,
+            HistorialPuntos.fecha < fin,
+        )
+        .group_by(dia_codigo, HistorialPuntos.codigo_promocional)
+    )
+
+    dia_canje = func.date(CanjeRealizado.fecha_canje)
+    canjes = (
+        select(
+            dia_canje,
+            CanjeRealizado.tipo_canje,
+            func.sum(CanjeRealizado.puntos_utilizados),
+            func.count(),
+        )
+        .where(CanjeRealizado.fecha_canje >= inicio, CanjeRealizado.fecha_canje < fin)
+        .group_by(dia_canje, CanjeRealizado.tipo_canje)
+    )
+
+    try:
+        db.session.execute(delete(ResumenCodigoDiario).where(
+            ResumenCodigoDiario.dia >= desde_codigos, ResumenCodigoDiario.dia <= hasta
+        ))
+        db.session.execute(delete(ResumenCanjeDiario).where(
+            ResumenCanjeDiario.dia >= desde, ResumenCanjeDiario.dia <= hasta
+        ))
+        filas_codigos = db.session.execute(
+            insert(ResumenCodigoDiario).from_select(["dia", "codigo", "puntos", "usos"], codigos)
+        ).rowcount
+        filas_canjes = db.session.execute(
+            insert(ResumenCanjeDiario).from_select(["dia", "tipo_canje", "puntos", "cantidad"], canjes)
+        ).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return filas_codigos, filas_canjes
+
+
+def _resumen(model, clave, contador, desde, hasta, valor=None):
+    # Filas diarias del rango y totales por clave, leídos sólo del resumen
+    filtro = [model.dia >= desde, model.dia <= hasta]
+    if valor:
+        filtro.append(clave == valor)
+
+    filas = model.query.filter(*filtro).order_by(model.dia, clave).all()
+    totales = db.session.execute(
+        select(clave, func.sum(model.puntos), func.sum(contador))
+        .where(*filtro)
+        .group_by(clave)
+        .order_by(func.sum(model.puntos).desc())
+    ).all()
+    return filas, totales
+
+
+def resumen_codigos(desde, hasta, codigo=None):
+    filas, totales = _resumen(
+        ResumenCodigoDiario, ResumenCodigoDiario.codigo, ResumenCodigoDiario.usos,
+        desde, hasta, codigo
+    )
+    return filas, [
+        {"codigo": codigo, "puntos": puntos, "usos": usos}
+        for codigo, puntos, usos in totales
+    ]
+
+
+def resumen_canjes(desde, hasta, tipo_canje=None):
+    filas, totales = _resumen(
+        ResumenCanjeDiario, ResumenCanjeDiario.tipo_canje, ResumenCanjeDiario.cantidad,
+        desde, hasta, tipo_canje
+    )
+    return filas, [
+        {"tipo_canje": tipo, "puntos": puntos, "cantidad": cantidad}
+        for tipo, puntos, cantidad in totales
+    ]
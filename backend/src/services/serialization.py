@@ -0,0 +1,147 @@
+import json
+import threading
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import Date, DateTime, inspect
+
+# Serialización de modelos a dict/JSON.
+#
+# Cada modelo declara en SERIALIZE_FIELDS las claves que expone (una clave o
+# un par (clave, atributo) cuando difieren). Para cada combinación modelo +
+# campos se genera una sola vez una función que arma el dict con acceso
+# directo a los atributos, sin recorrer columnas ni preguntar tipos en cada
+# fila. Sirve tanto para instancias como para filas de consultas proyectadas
+# (Row), que exponen las columnas como atributos.
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa json de la stdlib
+    orjson = None
+
+_serializers = {}
+_lock = threading.Lock()
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _field_specs(model):
+    specs = []
+    for field in model.SERIALIZE_FIELDS:
+        key, attr = field if isinstance(field, tuple) else (field, field)
+        specs.append((key, attr))
+    return specs
+
+
+def _compile(model, fields):
+    specs = _field_specs(model)
+    if fields is not None:
+        disponibles = dict(specs)
+        invalidos = [f for f in fields if f not in disponibles]
+        if invalidos or not fields:
+            raise ValueError(f"Campos inválidos: {', '.join(invalidos)}")
+        specs = [(f, disponibles[f]) for f in fields]
+
+    columns = inspect(model).columns
+    items = []
+    for key, attr in specs:
+        if not attr.isidentifier():
+            raise ValueError(f"Atributo inválido en {model.__name__}: {attr}")
+        if isinstance(columns[attr].type, (Date, DateTime)):
+            items.append(f"{key!r}: _iso(obj.{attr})")
+        else:
+            items.append(f"{key!r}: obj.{attr}")
+
+    source = f"def serialize(obj):\n    return {{{', '.join(items)}}}\n"
+    namespace = {"_iso": _iso}
+    exec(compile(source, f"<serializer {model.__name__}>", "exec"), namespace)
+    return namespace["serialize"]
+
+
+def serializer_for(model, fields=None):
+    # Devuelve (y cachea) la función obj -> dict para el modelo y la
+    # proyección indicada. fields=None usa todos los SERIALIZE_FIELDS.
+    key = (model, tuple(fields) if fields is not None else None)
+    serializer = _serializers.get(key)
+    if serializer is None:
+        with _lock:
+            serializer = _serializers.get(key)
+            if serializer is None:
+                serializer = _compile(model, key[1])
+                _serializers[key] = serializer
+    return serializer
+
+
+def parse_fields(model):
+    # Proyección pedida en ?fields=a,b,c (None = todos los campos)
+    fields_param = request.args.get("fields")
+    if not fields_param:
+        return None
+    fields = [f.strip() for f in fields_param.split(",") if f.strip()]
+    serializer_for(model, fields)  # valida los nombres
+    return fields
+
+
+def columns_for(model, fields=None, *extra):
+    # Columnas a seleccionar para serializar la proyección; extra agrega las
+    # que hacen falta aparte (p. ej. las del cursor de paginación).
+    specs = dict(_field_specs(model))
+    attrs = [specs[f] for f in fields] if fields is not None else list(specs.values())
+    attrs += [a for a in extra if a not in attrs]
+    return [getattr(model, a) for a in attrs]
+
+
+def field_names(model):
+    # Claves de SERIALIZE_FIELDS en orden (p. ej. encabezados de CSV)
+    return [key for key, _ in _field_specs(model)]
+
+
+def serialize_many(model, objs, fields=None):
+    serialize = serializer_for(model, fields)
+    return [serialize(obj) for obj in objs]
+
+
+def _default(value):
+    return DefaultJSONProvider.default(value)
+
+
+if orjson is not None:
+    # Las fechas sueltas pasan por el default de Flask (formato HTTP), igual
+    # que con el encoder estándar; las de los modelos ya llegan como texto.
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps(obj):
+    # JSON compacto como str. Con orjson es varias veces más rápido; la
+    # salida es equivalente (UTF-8 sin escapar).
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # Proveedor JSON de Flask (jsonify) que usa orjson cuando está
+    # instalado. Los tipos que orjson no conoce pasan por el default de
+    # Flask (Decimal, fechas, etc.). Los caracteres no ASCII salen en UTF-8
+    # en lugar de escapados. La lectura de JSON no cambia.
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        # jsonify pasa separators (compacto) o indent=2 (debug)
+        extra = dict(kwargs)
+        extra.pop("separators", None)
+        option = _ORJSON_OPTIONS
+        if extra.pop("indent", None):
+            option |= orjson.OPT_INDENT_2
+        if extra:
+            return super().dumps(obj, **kwargs)
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=_default, option=option).decode()
+
+
+def init_json(app):
+    app.json = FastJSONProvider(app)
@@ -0,0 +1,43 @@
+from flask import Flask
+from flask_cors import CORS
+from src.models.user import db
+from src.storage import configure_storage, init_storage
+from src.logging_setup import configure_logging
+
+
+def create_sse_app():
+    # Servicio aparte para /api/user/points/stream, con workers gevent: cada
+    # conexión abierta es un greenlet y no ocupa un worker de la API. Los
+    # saldos cambian en los procesos de la API; este los lee de la base
+    # (PollingBroker). Sin --preload, así el hilo de lectura arranca en cada
+    # worker ya parcheado por gevent:
+    #
+    #   gunicorn -k gevent --worker-connections 1000 'src.sse:create_sse_app()'
+    app = Flask(__name__)
+    configure_logging(app)
+
+    from src.services.serialization import init_json
+    init_json(app)
+    CORS(app, origins="*")
+
+    configure_storage(app)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    init_storage(app, db)
+
+    from src.services.metrics import init_metrics
+    init_metrics(app, db)
+
+    from src.routes.events import events_bp
+    app.register_blueprint(events_bp, url_prefix='/api')
+
+    from src.services.events import PollingBroker, hub, set_broker
+    broker = PollingBroker(app, hub.usuarios)
+    set_broker(broker)
+    broker.run_in_background()
+
+    @app.route('/api/health', methods=['GET'])
+    def health_check():
+        return {'status': 'ok', 'conexiones_sse': hub.stats()}, 200
+
+    return app
@@ -0,0 +1,146 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from flask import g, has_app_context
+from sqlalchemy import event
+
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(__file__), 'database', 'app.db')
+
+# SQLite
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_SINGLE_WRITER = os.environ.get('SQLITE_SINGLE_WRITER', 'true').lower() == 'true'
+WRITE_QUEUE_TIMEOUT = float(os.environ.get('WRITE_QUEUE_TIMEOUT', '10'))
+
+# Servidores (PostgreSQL)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '10'))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', '30'))
+
+
+class StorageBusy(Exception):
+    pass
+
+
+def database_url():
+    url = os.environ.get('DATABASE_URL') or f"sqlite:///{DEFAULT_SQLITE_PATH}"
+    # Heroku/Railway entregan "postgres://", que SQLAlchemy ya no acepta
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(url):
+    if url.startswith('sqlite'):
+        return {
+            'connect_args': {
+                'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+                'check_same_thread': False,
+            }
+        }
+    return {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_pre_ping': True,
+    }
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+
+# Cola de escritura de un solo hilo. En SQLite sólo puede haber un escritor
+# a la vez: en lugar de que los threads compitan por el lock (y reintenten
+# con "database is locked"), las transacciones de escritura se ejecutan en
+# orden en un thread dedicado. Con otros motores se ejecutan directamente.
+class WriteQueue:
+    def __init__(self, timeout=WRITE_QUEUE_TIMEOUT):
+        self.timeout = timeout
+        self._app = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def enable(self, app):
+        self._app = app
+
+    def _ensure_thread(self):
+        # Un thread por proceso, creado en el primer uso (después del fork)
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._worker, name='sqlite-writer', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _worker(self):
+        from src.models.user import db
+        while True:
+            fn, args, future, sql_stats = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self._app.app_context():
+                # Las consultas del writer cuentan para el request que espera
+                if sql_stats is not None:
+                    g.sql_stats = sql_stats
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    db.session.rollback()
+                    future.set_exception(e)
+
+    # Ejecuta fn(*args) como transacción de escritura. fn debe hacer su
+    # propio commit y devolver datos planos (no objetos ligados a la sesión).
+    # La sesión del request se cierra antes de encolar (no debe tener
+    # cambios pendientes): el writer toma su conexión del mismo pool, y si
+    # cada request en espera retuviera la suya el pool se agotaría.
+    def run(self, fn, *args):
+        if self._app is None:
+            return fn(*args)
+        from src.models.user import db
+        db.session.close()
+        self._ensure_thread()
+        future = Future()
+        sql_stats = g.get('sql_stats') if has_app_context() else None
+        self._queue.put((fn, args, future, sql_stats))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Si todavía no empezó se descarta; si ya está corriendo se espera
+            if future.cancel():
+                raise StorageBusy('Base de datos ocupada, intentá nuevamente')
+            return future.result()
+
+    def pending(self):
+        return self._queue.qsize()
+
+
+write_queue = WriteQueue()
+
+
+def configure_storage(app):
+    url = database_url()
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(url)
+
+
+def init_storage(app, db):
+    # Debe llamarse después de db.init_app y antes de abrir conexiones
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _sqlite_pragmas)
+        if SQLITE_SINGLE_WRITER:
+            write_queue.enable(app)
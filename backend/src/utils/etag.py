@@ -0,0 +1,28 @@
+from flask import make_response, request
+
+
+def conditional(etag_fn, cache_control="private, no-cache"):
+    # GET condicional: etag_fn() calcula el ETag (fuerte) antes de ejecutar
+    # el handler, a partir de una versión barata de leer. Si coincide con
+    # If-None-Match se responde 304 sin ejecutar el handler. La versión se
+    # lee primero: si cambia mientras se arma la respuesta, el ETag queda
+    # viejo y el próximo request recibe los datos de nuevo (nunca un 304
+    # con datos desactualizados).
+    def decorator(f):
+        def decorated_function(*args, **kwargs):
+            etag = etag_fn()
+            if etag is not None and request.if_none_match.contains(etag):
+                response = make_response("", 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            if etag is not None:
+                response.set_etag(etag)
+                response.headers["Cache-Control"] = cache_control
+            return response
+
+        decorated_function.__name__ = f.__name__
+        return decorated_function
+
+    return decorator
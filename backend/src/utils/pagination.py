@@ -0,0 +1,66 @@
+import base64
+import json
+from datetime import datetime
+from flask import request
+from sqlalchemy import and_, or_
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def parse_limit(default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    # Sin parámetros se devuelve una primera página acotada
+    try:
+        limit = int(request.args.get("limit", default))
+    except (TypeError, ValueError):
+        raise ValueError("Parámetro limit inválido")
+    if limit < 1:
+        raise ValueError("Parámetro limit inválido")
+    return min(limit, maximum)
+
+
+def encode_cursor(*values):
+    raw = json.dumps(
+        [v.isoformat() if isinstance(v, datetime) else v for v in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list):
+            raise ValueError
+        return values
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido")
+
+
+def parse_cursor(cursor):
+    # Cursor de keyset_page -> (fecha, id)
+    values = decode_cursor(cursor)
+    try:
+        return datetime.fromisoformat(values[0]), int(values[1])
+    except (IndexError, TypeError, ValueError):
+        raise ValueError("Cursor inválido")
+
+
+def keyset_page(query, fecha_col, id_col, cursor, limit):
+    # Paginación por (fecha, id) descendente: el costo de cada página es
+    # constante sin importar qué tan profundo esté el cursor.
+    if cursor:
+        fecha, last_id = parse_cursor(cursor)
+        query = query.filter(
+            or_(fecha_col < fecha, and_(fecha_col == fecha, id_col < last_id))
+        )
+
+    rows = query.order_by(fecha_col.desc(), id_col.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, fecha_col.key), last.id)
+    return rows, next_cursor
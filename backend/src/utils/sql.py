@@ -0,0 +1,50 @@
+from importlib import import_module
+from sqlalchemy import insert
+
+
+def _dialecto(nombre):
+    # Los módulos de cada motor se cargan al usarse: importarlos todos
+    # (mysql, postgresql, sqlite) suma decenas de ms al arranque de la app
+    return import_module(f"sqlalchemy.dialects.{nombre}")
+
+
+def bind_value(column, value, dialect):
+    # Convierte un valor Python al formato del driver, como haría SQLAlchemy
+    processor = column.type.dialect_impl(dialect).bind_processor(dialect)
+    return processor(value) if processor and value is not None else value
+
+
+def executemany_ignore(conn, table, columnas, filas):
+    # executemany directo sobre el driver para cargas masivas: evita el
+    # armado de parámetros por fila de SQLAlchemy. Las filas son tuplas ya
+    # convertidas (ver bind_value) en el orden de "columnas".
+    marcador = "?" if conn.dialect.paramstyle == "qmark" else "%s"
+    sql = (
+        f"INSERT INTO {table.name} ({', '.join(columnas)}) "
+        f"VALUES ({', '.join([marcador] * len(columnas))}) ON CONFLICT DO NOTHING"
+    )
+    conn.exec_driver_sql(sql, filas)
+
+
+def insert_ignore(table, bind):
+    # INSERT ... ON CONFLICT DO NOTHING según el motor en uso
+    dialect = bind.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        return _dialecto(dialect).insert(table).on_conflict_do_nothing()
+    return insert(table).prefix_with("IGNORE")
+
+
+def upsert_increment(table, bind, claves, filas, incrementos):
+    # INSERT ... ON CONFLICT (claves) DO UPDATE que suma los valores nuevos a
+    # los existentes (contadores). Las filas no deben repetir claves.
+    dialect = bind.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        stmt = _dialecto(dialect).insert(table).values(filas)
+        return stmt.on_conflict_do_update(
+            index_elements=claves,
+            set_={c: table.c[c] + stmt.excluded[c] for c in incrementos},
+        )
+    stmt = _dialecto("mysql").insert(table).values(filas)
+    return stmt.on_duplicate_key_update(
+        {c: table.c[c] + stmt.inserted[c] for c in incrementos}
+    )
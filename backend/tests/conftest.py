@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from datetime import date
+
+import pytest
+
+# Los módulos leen su configuración del entorno al importarse: esto va antes
+# de importar la app. Sin límite de intentos (todos los requests de prueba
+# salen de la misma IP; test_rate_limit lo activa con un reloj propio) y con
+# logs sólo de advertencias.
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+from src.main import create_app
+from src.models.user import db, User
+from src.routes.auth import generate_token
+from src.seed import init_database
+from src.services import archive
+from src.services.auth_cache import token_cache, user_status_cache
+from src.services.catalog import catalog_cache
+from src.services.code_cache import code_cache
+
+# Hash barato para los usuarios de prueba (el costo real se mide aparte)
+PASSWORD_HASH = generate_password_hash("clave", method="pbkdf2:sha256:1")
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # Una base SQLite nueva por test, inicializada como en un despliegue
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path / "archivo"))
+    for cache in (code_cache, catalog_cache, token_cache, user_status_cache):
+        cache.invalidate()
+
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        init_database()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def crear_usuarios(app):
+    # crear_usuarios(cantidad, puntos) -> [(id, headers con el token), ...]
+    def crear(cantidad, puntos=0):
+        with app.app_context():
+            inicio = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+            db.session.execute(insert(User), [
+                {
+                    "id": user_id,
+                    "username": f"usuario{user_id}",
+                    "email": f"usuario{user_id}@test.com",
+                    "password_hash": PASSWORD_HASH,
+                    "nombre": "Usuario",
+                    "apellido": str(user_id),
+                    "nombre_completo": f"Usuario {user_id}",
+                    "dni": str(10000000 + user_id),
+                    "domicilio": "Calle 123",
+                    "fecha_nacimiento": date(1990, 1, 1),
+                    "puntos_actuales": puntos,
+                }
+                for user_id in range(inicio, inicio + cantidad)
+            ])
+            db.session.commit()
+        return [
+            (user_id, {"Authorization": f"Bearer {generate_token(user_id)}"})
+            for user_id in range(inicio, inicio + cantidad)
+        ]
+    return crear
+
+
+@pytest.fixture
+def en_paralelo(app):
+    # en_paralelo(funcion, argumentos, hilos) -> (resultados, segundos)
+    # Los argumentos se reparten entre los hilos; cada hilo usa su propio
+    # test client y todos arrancan juntos.
+    def ejecutar(funcion, argumentos, hilos):
+        argumentos = list(argumentos)
+        resultados = [None] * len(argumentos)
+        barrera = threading.Barrier(hilos + 1)
+
+        def tarea(numero):
+            client = app.test_client()
+            barrera.wait()
+            for i in range(numero, len(argumentos), hilos):
+                resultados[i] = funcion(client, argumentos[i])
+
+        threads = [threading.Thread(target=tarea, args=(n,)) for n in range(hilos)]
+        for thread in threads:
+            thread.start()
+        barrera.wait()
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return resultados, time.perf_counter() - inicio
+    return ejecutar
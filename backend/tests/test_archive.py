@@ -0,0 +1,163 @@
+import os
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import func, insert, update
+from src.models.user import db, User, HistorialPuntos, SegmentoHistorial
+from src.services import archive
+from src.services.reconciliation import reconcile_balances
+
+HOY = date(2026, 10, 18)
+# Con 24 meses se archiva todo lo anterior a octubre de 2024
+CORTE = datetime(2024, 10, 1)
+
+
+def _sembrar(usuarios):
+    # Unos movimientos por mes desde 2023, con fechas repetidas (el cursor
+    # desempata por id) y el saldo igual a la suma del historial
+    movimientos = []
+    for n, (user_id, _) in enumerate(usuarios):
+        fecha = datetime(2023, 1, 3, 10)
+        saldo = 0
+        while fecha < datetime(2026, 10, 1):
+            for i in range(1 + (fecha.month + n) % 3):
+                puntos = -20 if saldo >= 20 and i == 2 else 10 * (n + 1)
+                saldo += puntos
+                movimientos.append({
+                    "usuario_id": user_id, "tipo_operacion": "carga" if puntos > 0 else "canje",
+                    "puntos_cantidad": puntos, "descripcion": f"Movimiento {len(movimientos)}",
+                    "fecha": fecha, "codigo_promocional": None,
+                })
+            fecha += timedelta(days=29, hours=n)
+        db.session.execute(update(User).where(User.id == user_id).values(puntos_actuales=saldo))
+    db.session.execute(insert(HistorialPuntos), movimientos)
+    db.session.commit()
+
+
+def _paginas(client, headers, limit, fields=None):
+    filas, cursor = [], None
+    while True:
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        if fields:
+            params["fields"] = fields
+        respuesta = client.get("/api/user/history", query_string=params, headers=headers)
+        assert respuesta.status_code == 200
+        datos = respuesta.get_json()
+        assert len(datos["historial"]) <= limit
+        filas += datos["historial"]
+        cursor = datos["next_cursor"]
+        if cursor is None:
+            return filas
+
+
+@pytest.fixture
+def archivado(app, client, crear_usuarios):
+    # (usuarios, historial completo de cada uno antes de archivar)
+    usuarios = crear_usuarios(3)
+    with app.app_context():
+        _sembrar(usuarios)
+    antes = {user_id: _paginas(client, headers, 200) for user_id, headers in usuarios}
+    with app.app_context():
+        assert archive.archivar(24, hoy=HOY)
+        vivas = db.session.query(func.min(HistorialPuntos.fecha)).scalar()
+    assert vivas >= CORTE
+    return usuarios, antes
+
+
+@pytest.mark.parametrize("limit", [1, 7, 50, 200])
+def test_paginas_cruzan_de_la_tabla_al_archivo(client, archivado, limit):
+    usuarios, antes = archivado
+    for user_id, headers in usuarios:
+        filas = _paginas(client, headers, limit)
+        assert filas == antes[user_id]
+        assert any(datetime.fromisoformat(f["fecha"]) < CORTE for f in filas)
+
+
+def test_paginas_con_fields_sobre_el_archivo(client, archivado):
+    usuarios, antes = archivado
+    user_id, headers = usuarios[1]
+    filas = _paginas(client, headers, 5, fields="puntos,fecha")
+    assert filas == [{"puntos": f["puntos"], "fecha": f["fecha"]} for f in antes[user_id]]
+
+
+def test_cursor_dentro_del_archivo(client, archivado):
+    # Un cursor que ya apunta a filas archivadas sigue dentro del archivo
+    usuarios, antes = archivado
+    user_id, headers = usuarios[0]
+    archivadas = [f for f in antes[user_id] if datetime.fromisoformat(f["fecha"]) < CORTE]
+    respuesta = client.get("/api/user/history", query_string={"limit": 3}, headers=headers)
+    cursor = respuesta.get_json()["next_cursor"]
+    filas = []
+    while cursor:
+        respuesta = client.get("/api/user/history", query_string={"limit": 3, "cursor": cursor},
+                               headers=headers)
+        datos = respuesta.get_json()
+        filas += datos["historial"]
+        cursor = datos["next_cursor"]
+        if filas and datetime.fromisoformat(filas[-1]["fecha"]) < CORTE:
+            break
+    respuesta = client.get("/api/user/history", query_string={"limit": 4, "cursor": cursor},
+                           headers=headers)
+    siguiente = respuesta.get_json()["historial"]
+    posicion = archivadas.index(filas[-1]) + 1
+    assert siguiente == archivadas[posicion:posicion + 4]
+
+
+def test_codigo_archivado_no_se_reutiliza(app, client, crear_usuarios):
+    (user_id, headers), = crear_usuarios(1)
+    with app.app_context():
+        db.session.execute(insert(HistorialPuntos).values(
+            usuario_id=user_id, tipo_operacion="carga", puntos_cantidad=75,
+            descripcion="Código promocional: BONUS", fecha=datetime(2023, 5, 1),
+            codigo_promocional="BONUS",
+        ))
+        db.session.execute(update(User).where(User.id == user_id).values(puntos_actuales=75))
+        db.session.commit()
+        assert archive.archivar(24, hoy=HOY) == [(date(2023, 5, 1), 1)]
+        assert db.session.query(HistorialPuntos).count() == 0
+
+    respuesta = client.post("/api/codes/redeem", json={"codigo": "BONUS"}, headers=headers)
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()["error"] == "Ya has usado este código anteriormente"
+    respuesta = client.post("/api/codes/validate", json={"codigo": "bonus"}, headers=headers)
+    assert not respuesta.get_json()["valid"]
+    respuesta = client.post("/api/codes/redeem-batch", json={"codigos": ["BONUS"]}, headers=headers)
+    assert respuesta.get_json()["resultados"][0]["error"] == "Ya has usado este código anteriormente"
+    with app.app_context():
+        assert db.session.get(User, user_id).puntos_actuales == 75
+
+
+def test_conciliacion_despues_de_archivar(app, archivado):
+    usuarios, antes = archivado
+    user_id = usuarios[2][0]
+    with app.app_context():
+        assert list(reconcile_balances()) == []
+
+        db.session.execute(update(User).where(User.id == user_id).values(puntos_actuales=1))
+        db.session.commit()
+        esperado = sum(f["puntos"] for f in antes[user_id])
+        assert list(reconcile_balances()) == [(user_id, 1, esperado)]
+        list(reconcile_balances(reparar=True))
+        assert db.session.get(User, user_id).puntos_actuales == esperado
+        assert list(reconcile_balances()) == []
+
+
+def test_falla_del_commit_no_deja_archivo_ni_borra_filas(app, crear_usuarios, monkeypatch):
+    usuarios = crear_usuarios(2)
+    with app.app_context():
+        _sembrar(usuarios)
+        filas = db.session.query(HistorialPuntos).count()
+
+        def commit_fallido():
+            raise RuntimeError("disco lleno")
+        with monkeypatch.context() as parche:
+            parche.setattr(db.session, "commit", commit_fallido)
+            with pytest.raises(RuntimeError):
+                archive.archivar(24, hoy=HOY)
+
+        assert os.listdir(archive.ARCHIVE_DIR) == []
+        assert db.session.query(HistorialPuntos).count() == filas
+        assert db.session.query(SegmentoHistorial).count() == 0
+        assert list(reconcile_balances()) == []
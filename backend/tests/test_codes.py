@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, insert, update
+from src.models.user import db, Administrador, CodigoPromocional
+from src.routes.auth import generate_admin_token
+from src.routes import points
+from src.services.code_cache import code_cache
+from src.storage import write_queue
+
+
+def _canjear(client, headers, codigo):
+    return client.post("/api/codes/redeem", json={"codigo": codigo}, headers=headers)
+
+
+def test_canje_devuelve_usos_actualizados(client, crear_usuarios):
+    # BONUS no tiene límite de usos: queda en el cache entre un canje y otro
+    for usos, (_, headers) in enumerate(crear_usuarios(3), start=1):
+        respuesta = _canjear(client, headers, "BONUS")
+        assert respuesta.status_code == 200
+        assert respuesta.get_json()["codigo"]["usos_actuales"] == usos
+
+
+def test_codigo_creado_en_otro_proceso_sale_del_cache_negativo(app, client, crear_usuarios,
+                                                               monkeypatch):
+    monkeypatch.setattr(code_cache, "sync_seconds", 3600)
+    monkeypatch.setattr(code_cache, "_proxima_sync", 0.0)
+    (_, headers), = crear_usuarios(1)
+    assert _canjear(client, headers, "NUEVO2025").status_code == 400
+
+    # Otro worker crea el código: este proceso no se entera por invalidate()
+    with app.app_context():
+        otro_proceso = create_engine(db.engine.url)
+    with otro_proceso.begin() as conn:
+        conn.execute(insert(CodigoPromocional).values(
+            codigo="NUEVO2025", puntos_valor=10, activo=True, usos_actuales=0
+        ))
+    otro_proceso.dispose()
+
+    # Hasta la próxima sincronización sigue figurando como inexistente
+    assert _canjear(client, headers, "NUEVO2025").status_code == 400
+    monkeypatch.setattr(code_cache, "_proxima_sync", 0.0)
+    assert _canjear(client, headers, "NUEVO2025").status_code == 200
+
+
+def _en_otro_proceso(app, sentencia):
+    # Cambio hecho por otro worker o el CLI: no invalida el cache de este proceso
+    with app.app_context():
+        otro_proceso = create_engine(db.engine.url)
+    with otro_proceso.begin() as conn:
+        conn.execute(sentencia)
+    otro_proceso.dispose()
+
+
+def test_codigo_desactivado_en_otro_proceso_no_se_canjea(app, client, crear_usuarios):
+    usuarios = crear_usuarios(3)
+    assert _canjear(client, usuarios[0][1], "BONUS").status_code == 200
+    with app.app_context():
+        assert code_cache.get("BONUS").activo
+
+    _en_otro_proceso(app, update(CodigoPromocional)
+                     .where(CodigoPromocional.codigo == "BONUS").values(activo=False))
+    respuesta = _canjear(client, usuarios[1][1], "BONUS")
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()["error"] == "Código desactivado"
+    # El rechazo descarta la foto vieja: el siguiente canje ya la ve inactiva
+    with app.app_context():
+        assert not code_cache.get("BONUS").activo
+
+    respuesta = client.post("/api/codes/redeem-batch", json={"codigos": ["BONUS"]},
+                            headers=usuarios[2][1])
+    assert respuesta.get_json()["resultados"][0]["error"] == "Código desactivado"
+    with app.app_context():
+        assert db.session.query(CodigoPromocional.usos_actuales).filter_by(codigo="BONUS").scalar() == 1
+
+
+def test_codigo_vencido_despues_de_leerlo_no_se_canjea(app, crear_usuarios):
+    (user_id, _), = crear_usuarios(1)
+    with app.app_context():
+        db.session.execute(insert(CodigoPromocional).values(
+            codigo="VENCE", puntos_valor=10, activo=True, usos_actuales=0,
+            fecha_expiracion=datetime.utcnow() + timedelta(hours=1)
+        ))
+        db.session.commit()
+        codigo = code_cache.get("VENCE")
+
+    # Otro worker adelanta el vencimiento después de que el lote leyó el código
+    _en_otro_proceso(app, update(CodigoPromocional)
+                     .where(CodigoPromocional.codigo == "VENCE")
+                     .values(fecha_expiracion=datetime.utcnow() - timedelta(minutes=1)))
+    with app.app_context():
+        rechazados, puntos = write_queue.run(
+            points._aplicar_lote, user_id, [codigo], datetime.utcnow()
+        )
+    assert rechazados == {"VENCE": "Código expirado"}
+    assert puntos == 0
+
+
+@pytest.fixture
+def admin(app):
+    with app.app_context():
+        admin_id = db.session.query(Administrador.id).scalar()
+    return {"Authorization": f"Bearer {generate_admin_token(admin_id)}"}
+
+
+def _generar(client, admin, **cambios):
+    datos = {"cantidad": 20, "prefijo": "CAMP", "puntos_valor": 50, "longitud": 8, **cambios}
+    return client.post("/api/admin/codes/generate", json=datos, headers=admin)
+
+
+@pytest.mark.parametrize("cambios", [
+    {"longitud": "8"},
+    {"longitud": None},
+    {"cantidad": "20"},
+    {"cantidad": 2.5},
+    {"cantidad": True},
+    {"puntos_valor": "50"},
+    {"usos_maximos": "1"},
+    {"fecha_expiracion": 20261231},
+])
+def test_generar_codigos_con_tipos_invalidos(client, admin, cambios):
+    respuesta = _generar(client, admin, **cambios)
+    assert respuesta.status_code == 400
+    assert "error" in respuesta.get_json()
+
+
+def test_generar_codigos_pasa_por_la_cola_de_escritura(app, client, admin, monkeypatch):
+    encolados = []
+    run = write_queue.run
+
+    def espiar(fn, *args):
+        encolados.append(fn.__name__)
+        return run(fn, *args)
+    monkeypatch.setattr(write_queue, "run", espiar)
+
+    respuesta = _generar(client, admin)
+    assert respuesta.status_code == 201
+    filas = respuesta.get_data(as_text=True).splitlines()
+    assert filas[0] == "codigo,puntos_valor"
+    assert len(filas) == 21
+    assert encolados == ["generate_codes"]
+    with app.app_context():
+        assert db.session.query(CodigoPromocional).filter(
+            CodigoPromocional.codigo.like("CAMP%")
+        ).count() == 20
@@ -0,0 +1,77 @@
+from src.models.user import db, User
+from src.services import events
+from src.services.events import PollingBroker, hub
+
+
+def _stream(client, token, **kwargs):
+    return client.get(f"/api/user/points/stream?token={token}", **kwargs)
+
+
+def test_sin_workers_asincronos_el_stream_no_se_abre(client, crear_usuarios):
+    (_, headers), = crear_usuarios(1)
+    token = headers["Authorization"].split(" ")[1]
+    assert _stream(client, token).status_code == 204
+    assert hub.stats()["conexiones"] == 0
+
+
+def test_stream_envia_el_saldo(client, crear_usuarios, monkeypatch):
+    monkeypatch.setattr(events, "SSE_ENABLED", "true")
+    (_, headers), = crear_usuarios(1, puntos=40)
+    token = headers["Authorization"].split(" ")[1]
+    respuesta = _stream(client, token, buffered=False)
+    assert respuesta.status_code == 200
+    partes = iter(respuesta.response)
+    assert next(partes).startswith(b"retry:")
+    assert next(partes) == b'event: saldo\ndata: {"puntos_actuales":40}\n\n'
+    respuesta.close()
+    assert hub.stats()["conexiones"] == 0
+
+
+def _cambiar_en_otro_proceso(app, user_id, **valores):
+    # El cambio lo hace un worker de la API: sólo se ve en la base
+    with app.app_context():
+        db.session.execute(
+            db.update(User).where(User.id == user_id)
+            .values(version_datos=User.version_datos + 1, **valores)
+        )
+        db.session.commit()
+
+
+def test_polling_broker_entrega_los_saldos_que_cambiaron(app, crear_usuarios):
+    (user_id, _), = crear_usuarios(1)
+    broker = PollingBroker(app, hub.usuarios)
+    broker.start(hub.deliver)
+    sub = hub.subscribe(user_id)
+    try:
+        # Primer ciclo: el saldo actual; después, sólo si cambia
+        broker.poll()
+        assert sub.wait(0) == [("saldo", {"puntos_actuales": 0})]
+        broker.poll()
+        assert sub.wait(0) == []
+        _cambiar_en_otro_proceso(app, user_id, puntos_actuales=500)
+        broker.poll()
+        assert sub.wait(0) == [("saldo", {"puntos_actuales": 500})]
+
+        # Otros cambios de version_datos (perfil, entregas) no son un saldo
+        _cambiar_en_otro_proceso(app, user_id, domicilio="Otra calle 456")
+        broker.poll()
+        with app.app_context():
+            version = db.session.get(User, user_id).version_datos
+        assert sub.wait(0) == [("datos", {"version_datos": version})]
+    finally:
+        hub.unsubscribe(sub)
+
+
+def test_stream_envia_el_ultimo_evento_de_cada_tipo(client, crear_usuarios, monkeypatch):
+    monkeypatch.setattr(events, "SSE_ENABLED", "true")
+    (user_id, headers), = crear_usuarios(1, puntos=40)
+    token = headers["Authorization"].split(" ")[1]
+    respuesta = _stream(client, token, buffered=False)
+    partes = iter(respuesta.response)
+    next(partes), next(partes)
+    for evento in (("saldo", {"puntos_actuales": 50}), ("datos", {"version_datos": 3}),
+                   ("saldo", {"puntos_actuales": 60})):
+        hub.deliver(user_id, evento)
+    assert next(partes) == b'event: saldo\ndata: {"puntos_actuales":60}\n\n'
+    assert next(partes) == b'event: datos\ndata: {"version_datos":3}\n\n'
+    respuesta.close()
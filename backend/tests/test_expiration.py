@@ -0,0 +1,91 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, update
+from src.models.user import db, User, HistorialPuntos
+from src.services import archive
+from src.services.expiration import corte_vencimiento, vencer_puntos
+
+AHORA = datetime(2026, 10, 18, 12)
+USUARIOS = 50
+
+
+def _sembrar(usuarios, semilla=7):
+    # Historial al azar desde 2022 y lo que vence según una simulación FIFO
+    azar = random.Random(semilla)
+    corte = corte_vencimiento(AHORA)
+    movimientos, esperado = [], {}
+    for user_id, _ in usuarios:
+        fecha, lotes, saldo = datetime(2022, 1, 1), [], 0
+        for _ in range(azar.randint(0, 30)):
+            fecha += timedelta(days=azar.randint(1, 90), seconds=azar.randint(0, 100))
+            if fecha > AHORA:
+                break
+            if saldo > 0 and azar.random() < 0.35:
+                debito = azar.randint(1, saldo)
+                saldo -= debito
+                movimientos.append({"usuario_id": user_id, "tipo_operacion": "canje",
+                                    "puntos_cantidad": -debito, "fecha": fecha})
+                while debito:
+                    consumido = min(debito, lotes[0][1])
+                    lotes[0][1] -= consumido
+                    debito -= consumido
+                    if lotes[0][1] == 0:
+                        lotes.pop(0)
+            else:
+                credito = azar.randint(1, 300)
+                saldo += credito
+                lotes.append([fecha, credito])
+                movimientos.append({"usuario_id": user_id, "tipo_operacion": "carga",
+                                    "puntos_cantidad": credito, "fecha": fecha})
+        db.session.execute(update(User).where(User.id == user_id).values(puntos_actuales=saldo))
+        vence = sum(puntos for fecha_lote, puntos in lotes if fecha_lote < corte)
+        if vence:
+            esperado[user_id] = vence
+    db.session.execute(insert(HistorialPuntos), movimientos)
+    db.session.commit()
+    return esperado
+
+
+def _vencidos():
+    list(vencer_puntos(ahora=AHORA, batch_size=20))
+    return {
+        user_id: -puntos for user_id, puntos in
+        db.session.query(HistorialPuntos.usuario_id, HistorialPuntos.puntos_cantidad)
+        .filter(HistorialPuntos.referencia_externa.like("vencimiento:%"))
+    }
+
+
+def test_vencimiento_con_historial_archivado_coincide_con_fifo(app, crear_usuarios):
+    usuarios = crear_usuarios(USUARIOS)
+    with app.app_context():
+        esperado = _sembrar(usuarios)
+        assert archive.archivar(24, hoy=AHORA.date())
+        assert _vencidos() == esperado
+
+
+def test_no_se_archiva_lo_que_todavia_puede_vencer(app):
+    with app.app_context():
+        with pytest.raises(ValueError):
+            archive.archivar(3, hoy=AHORA.date())
+    resultado = app.test_cli_runner().invoke(args=["points", "archive", "--meses", "3"])
+    assert resultado.exit_code != 0
+    assert "POINTS_EXPIRE_MONTHS" in resultado.output
+
+
+def test_segmentos_posteriores_al_corte_no_vencen_de_mas(app, crear_usuarios):
+    # Archivo hecho sin la validación (por ejemplo, con otra configuración):
+    # los créditos de los meses que no son enteramente anteriores al corte
+    # no se cuentan como viejos
+    usuarios = crear_usuarios(USUARIOS)
+    with app.app_context():
+        esperado = _sembrar(usuarios)
+        mes = datetime(2022, 1, 1).date()
+        while mes < archive.corte_archivo(AHORA.date(), 3):
+            archive._archivar_mes(mes)
+            mes = archive._sumar_meses(mes, 1)
+        vencidos = _vencidos()
+    assert vencidos
+    for user_id, puntos in vencidos.items():
+        assert puntos <= esperado[user_id]
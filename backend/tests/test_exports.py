@@ -0,0 +1,177 @@
+import csv
+import gzip
+import io
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+from src.models.user import db, Administrador, HistorialPuntos
+from src.routes.auth import generate_admin_token
+from src.services import archive
+from src.services.serialization import field_names
+
+HOY = date(2026, 10, 18)
+
+
+def _sembrar(usuarios):
+    # Un movimiento por mes y usuario desde 2023; uno de cada tres con código
+    movimientos = []
+    for n, (user_id, _) in enumerate(usuarios):
+        fecha = datetime(2023, 1, 5, 9 + n)
+        while fecha < datetime(2026, 10, 1):
+            movimientos.append({
+                "usuario_id": user_id, "tipo_operacion": "carga", "puntos_cantidad": 10 + n,
+                "descripcion": f"Carga, \"{fecha:%B}\"", "fecha": fecha,
+                "codigo_promocional": f"COD{fecha:%Y%m}" if fecha.month % 3 == 0 else None,
+            })
+            fecha += timedelta(days=31)
+    db.session.execute(insert(HistorialPuntos), movimientos)
+    db.session.commit()
+
+
+@pytest.fixture
+def admin(app):
+    with app.app_context():
+        admin_id = db.session.query(Administrador.id).scalar()
+    return {"Authorization": f"Bearer {generate_admin_token(admin_id)}"}
+
+
+def _exportar(client, admin, tipo="historial", **params):
+    respuesta = client.get(f"/api/admin/export/{tipo}", query_string=params, headers=admin)
+    assert respuesta.status_code == 200, respuesta.get_json()
+    return respuesta
+
+
+def _ndjson(texto):
+    return [json.loads(linea) for linea in texto.splitlines()]
+
+
+@pytest.fixture
+def historial(app, client, crear_usuarios, admin):
+    # (usuarios, movimientos exportados antes de archivar); después se
+    # archiva todo lo anterior a octubre de 2024
+    usuarios = crear_usuarios(3)
+    with app.app_context():
+        _sembrar(usuarios)
+    antes = _ndjson(_exportar(client, admin, formato="ndjson").get_data(as_text=True))
+    with app.app_context():
+        assert archive.archivar(24, hoy=HOY)
+    return usuarios, antes
+
+
+def _por_id(filas):
+    return sorted(filas, key=lambda fila: fila["id"])
+
+
+def test_historial_incluye_meses_archivados(client, admin, historial):
+    _, antes = historial
+    despues = _ndjson(_exportar(client, admin, formato="ndjson").get_data(as_text=True))
+    assert len(antes) == 3 * 45
+    assert _por_id(despues) == antes
+
+
+@pytest.mark.parametrize("filtros", [
+    {"desde": "2023-06-01", "hasta": "2023-12-31"},
+    {"desde": "2024-09-01", "hasta": "2024-11-30"},
+    {"desde": "2025-01-01"},
+    {"hasta": "2023-03-05"},
+    {"usuario_id": "usuario"},
+    {"codigo": "COD202306"},
+    {"codigo": "COD202506", "usuario_id": "usuario", "desde": "2025-01-01"},
+])
+def test_filtros(client, admin, historial, filtros):
+    usuarios, antes = historial
+    filtros = dict(filtros)
+    if "usuario_id" in filtros:
+        filtros["usuario_id"] = usuarios[1][0]
+
+    def incluida(fila):
+        dia = fila["fecha"][:10]
+        return (
+            dia >= filtros.get("desde", "") and dia <= filtros.get("hasta", "9999")
+            and fila["usuario_id"] == filtros.get("usuario_id", fila["usuario_id"])
+            and fila["codigo_promocional"] == filtros.get("codigo", fila["codigo_promocional"])
+        )
+
+    esperado = [fila for fila in antes if incluida(fila)]
+    filas = _ndjson(_exportar(client, admin, formato="ndjson", **filtros).get_data(as_text=True))
+    assert esperado
+    assert _por_id(filas) == esperado
+
+
+def test_csv_y_gzip(client, admin, historial):
+    _, antes = historial
+    texto = _exportar(client, admin).get_data(as_text=True)
+    lector = csv.DictReader(io.StringIO(texto))
+    assert lector.fieldnames == field_names(HistorialPuntos)
+    filas = list(lector)
+    assert sorted(int(fila["id"]) for fila in filas) == [fila["id"] for fila in antes]
+    assert {fila["descripcion"] for fila in filas} == {fila["descripcion"] for fila in antes}
+
+    for formato, plano in (("csv", texto), ("ndjson", None)):
+        respuesta = _exportar(client, admin, formato=formato, gzip="1")
+        assert respuesta.mimetype == "application/gzip"
+        assert respuesta.headers["Content-Disposition"].endswith(f"historial.{formato}.gz")
+        descomprimido = gzip.decompress(respuesta.get_data()).decode("utf-8")
+        if plano is None:
+            plano = _exportar(client, admin, formato=formato).get_data(as_text=True)
+        assert descomprimido == plano
+
+
+def test_canjes_filtrados_por_tipo(client, admin, crear_usuarios):
+    usuarios = crear_usuarios(2, puntos=10000)
+    for (_, headers), premio in zip(usuarios, ("taza_nortegas", "gorra_nortegas")):
+        respuesta = client.post("/api/rewards/redeem", json={
+            "premio_id": premio, "nombre_entrega": "Usuario", "direccion_entrega": "Calle 123"
+        }, headers=headers)
+        assert respuesta.status_code == 200
+
+    todos = _ndjson(_exportar(client, admin, "canjes", formato="ndjson").get_data(as_text=True))
+    assert {fila["tipo_canje"] for fila in todos} == {"taza_nortegas", "gorra_nortegas"}
+    filas = _ndjson(_exportar(client, admin, "canjes", formato="ndjson",
+                              codigo="taza_nortegas").get_data(as_text=True))
+    assert [(f["usuario_id"], f["tipo_canje"]) for f in filas] == [(usuarios[0][0], "taza_nortegas")]
+
+
+@pytest.mark.parametrize("tipo, params", [
+    ("historial", {"formato": "xml"}),
+    ("historial", {"desde": "2025-13-01"}),
+    ("historial", {"desde": "2025-02-01", "hasta": "2025-01-01"}),
+    ("canjes", {"usuario_id": "abc"}),
+])
+def test_parametros_invalidos_antes_de_escribir(client, admin, tipo, params):
+    respuesta = client.get(f"/api/admin/export/{tipo}", query_string=params, headers=admin)
+    # El error sale como JSON, no como un archivo cortado a mitad de camino
+    assert respuesta.status_code == 400
+    assert respuesta.mimetype == "application/json"
+    assert "Content-Disposition" not in respuesta.headers
+    assert "error" in respuesta.get_json()
+
+
+def test_tipo_inexistente(client, admin):
+    assert client.get("/api/admin/export/usuarios", headers=admin).status_code == 404
+
+
+def test_cli(app, client, admin, historial, tmp_path):
+    usuarios, _ = historial
+    user_id = usuarios[2][0]
+    runner = app.test_cli_runner()
+    params = {"formato": "ndjson", "usuario_id": user_id, "desde": "2024-01-01"}
+    esperado = _exportar(client, admin, **params).get_data(as_text=True)
+
+    resultado = runner.invoke(args=["export", "historial", "--formato", "ndjson",
+                                    "--usuario", str(user_id), "--desde", "2024-01-01"])
+    assert resultado.exit_code == 0, resultado.output
+    assert resultado.output == esperado
+
+    salida = tmp_path / "historial.csv.gz"
+    resultado = runner.invoke(args=["export", "historial", "--gzip", "--output", str(salida)])
+    assert resultado.exit_code == 0, resultado.output
+    assert gzip.decompress(salida.read_bytes()).decode("utf-8") == \
+        _exportar(client, admin).get_data(as_text=True)
+
+    resultado = runner.invoke(args=["export", "canjes", "--desde", "2025-02-01",
+                                    "--hasta", "2025-01-01"])
+    assert resultado.exit_code != 0
+    assert "rango de fechas" in resultado.output
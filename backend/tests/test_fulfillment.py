@@ -0,0 +1,54 @@
+import threading
+from datetime import datetime
+
+from sqlalchemy import update
+from src.models.user import db, OutboxCanje
+from src.services.fulfillment import LogNotifier, procesar_lote
+
+
+def _canjear(client, usuarios):
+    for _, headers in usuarios:
+        assert client.post("/api/rewards/redeem", json={"premio_id": "taza_nortegas"},
+                           headers=headers).status_code == 200
+
+
+class ReservaVencida(LogNotifier):
+    # En el primer aviso la reserva del lote vence y otro worker (otro hilo,
+    # otra sesión) reclama y procesa las mismas tareas
+    def __init__(self, app, otro):
+        super().__init__()
+        self.app = app
+        self.otro = otro
+        self.resultado_otro = None
+
+    def notify(self, canje):
+        super().notify(canje)
+        if self.resultado_otro is None:
+            with self.app.app_context():
+                db.session.execute(update(OutboxCanje).values(bloqueada_hasta=datetime(2000, 1, 1)))
+                db.session.commit()
+
+            def otro_worker():
+                with self.app.app_context():
+                    self.resultado_otro = procesar_lote(self.otro)
+                    db.session.remove()
+            hilo = threading.Thread(target=otro_worker)
+            hilo.start()
+            hilo.join()
+
+
+def test_reserva_vencida_durante_el_lote(app, client, crear_usuarios):
+    usuarios = crear_usuarios(3, puntos=5000)
+    _canjear(client, usuarios)
+    otro = LogNotifier()
+    primero = ReservaVencida(app, otro)
+
+    with app.app_context():
+        # El primer worker sólo llegó a avisar una tarea; las demás ya son
+        # del otro worker y no las avisa ni las cierra
+        assert procesar_lote(primero) == (0, 0, 0)
+        tareas = db.session.query(OutboxCanje.estado, OutboxCanje.intentos).all()
+    assert primero.resultado_otro == (3, 0, 0)
+    assert len(primero.enviados) == 1
+    assert len(otro.enviados) == 3
+    assert tareas == [("completada", 2)] * 3
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+from werkzeug.security import generate_password_hash
+from src.models.user import db, User
+from src.services.hashing import PasswordHasher, PASSWORD_HASH_METHOD, password_hasher
+
+LOGINS = 24
+HILOS = 4
+
+
+@pytest.mark.parametrize("metodo", ["scrypt", "scrypt:32768:8:1", "pbkdf2", "pbkdf2:sha256"])
+def test_hash_con_el_metodo_configurado_no_se_rehashea(metodo):
+    hasher = PasswordHasher(workers=0, method=metodo)
+    assert not hasher.needs_rehash(generate_password_hash("clave", method=metodo))
+
+
+@pytest.mark.parametrize("metodo, configurado", [
+    ("scrypt:16384:8:1", "scrypt"),
+    ("pbkdf2:sha256:1000", "pbkdf2:sha256"),
+    ("pbkdf2:sha256:1000", "scrypt"),
+    ("scrypt", "pbkdf2:sha256:1000"),
+])
+def test_hash_con_otro_metodo_o_costo_se_rehashea(metodo, configurado):
+    hasher = PasswordHasher(workers=0, method=configurado)
+    assert hasher.needs_rehash(generate_password_hash("clave", method=metodo))
+
+
+def test_logins_por_segundo(app, crear_usuarios, en_paralelo):
+    # Logins con el método configurado; el hash corre en el pool de procesos
+    usuarios = crear_usuarios(LOGINS)
+    with app.app_context():
+        password_hash = generate_password_hash("clave", method=PASSWORD_HASH_METHOD)
+        User.query.update({User.password_hash: password_hash})
+        db.session.commit()
+
+    def login(client, user_id):
+        respuesta = client.post("/api/auth/login", json={
+            "email": f"usuario{user_id}@test.com", "password": "clave"
+        })
+        return respuesta.status_code
+
+    resultados, segundos = en_paralelo(login, [user_id for user_id, _ in usuarios], HILOS)
+    nucleos = max(password_hasher.workers, 1)
+    print(f"\n{PASSWORD_HASH_METHOD}: {LOGINS / segundos:.1f} logins/s, "
+          f"{LOGINS / segundos / nucleos:.1f} por núcleo ({nucleos} de {os.cpu_count()})")
+    assert resultados == [200] * LOGINS
+    # Ningún login reescribió un hash que ya usa el método configurado
+    with app.app_context():
+        assert {h for (h,) in db.session.query(User.password_hash)} == {password_hash}
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import delete, insert, inspect
+from src.models.user import db, HistorialPuntos, ensure_indexes
+
+
+def _indices():
+    return {i["name"] for i in inspect(db.engine).get_indexes("historial_puntos")}
+
+
+def _base_previa(user_id):
+    # Una app.db de antes del índice único: el índice viejo no único y un
+    # código usado dos veces por el mismo usuario
+    with db.engine.begin() as conn:
+        conn.execute(db.text("DROP INDEX uq_historial_usuario_codigo"))
+        conn.execute(db.text(
+            "CREATE INDEX ix_historial_usuario_codigo "
+            "ON historial_puntos (usuario_id, codigo_promocional)"
+        ))
+    fila = {
+        "usuario_id": user_id, "tipo_operacion": "carga", "puntos_cantidad": 50,
+        "descripcion": "Código promocional: DOBLE", "fecha": datetime(2025, 3, 1),
+        "codigo_promocional": "DOBLE",
+    }
+    db.session.execute(insert(HistorialPuntos), [fila, fila])
+    db.session.commit()
+
+
+def test_duplicados_no_borran_el_indice_previo(app, crear_usuarios):
+    (user_id, _), = crear_usuarios(1)
+    with app.app_context():
+        _base_previa(user_id)
+        with pytest.raises(RuntimeError, match="DOBLE.*HAVING COUNT"):
+            ensure_indexes()
+        assert "ix_historial_usuario_codigo" in _indices()
+        assert "uq_historial_usuario_codigo" not in _indices()
+
+        resultado = app.test_cli_runner().invoke(args=["init-db"])
+        assert resultado.exit_code != 0
+        assert "uq_historial_usuario_codigo" in resultado.output
+
+        duplicada = db.session.query(db.func.max(HistorialPuntos.id)).scalar()
+        db.session.execute(delete(HistorialPuntos).where(HistorialPuntos.id == duplicada))
+        db.session.commit()
+        ensure_indexes()
+        assert "uq_historial_usuario_codigo" in _indices()
+        assert "ix_historial_usuario_codigo" not in _indices()
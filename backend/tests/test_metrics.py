@@ -0,0 +1,60 @@
+from sqlalchemy import event
+from src.models.user import db
+from src.services.metrics import MetricsRegistry, metrics
+
+
+def _lineas(registry):
+    return registry.render().splitlines()
+
+
+def test_valores_sin_redondeo():
+    registry = MetricsRegistry()
+    registry.inc("canjes_total", 1234567)
+    registry.inc("puntos_total", 0.1)
+    registry.inc("puntos_total", 0.2)
+    registry.observe("latencia_seconds", 1234.5678901)
+    registry.register_collector(lambda: [("cache_entries", "gauge", "Entradas", (), 7654321)])
+
+    lineas = _lineas(registry)
+    assert "canjes_total 1234567" in lineas
+    assert f"puntos_total {0.1 + 0.2!r}" in lineas
+    assert "latencia_seconds_sum 1234.5678901" in lineas
+    assert 'latencia_seconds_bucket{le="0.005"} 0' in lineas
+    assert 'latencia_seconds_bucket{le="10"} 0' in lineas
+    assert "cache_entries 7654321" in lineas
+
+
+def test_endpoint_de_metricas(client):
+    client.get("/api/health")
+    respuesta = client.get("/api/metrics")
+    assert respuesta.status_code == 200
+    assert "# TYPE" in respuesta.get_data(as_text=True)
+
+
+def _consultas_por_request(registry, endpoint):
+    serie = f'http_request_sql_queries_sum{{endpoint="{endpoint}",method="POST"}} '
+    for linea in _lineas(registry):
+        if linea.startswith(serie):
+            return float(linea[len(serie):])
+    return 0
+
+
+def test_consultas_de_la_cola_de_escritura_cuentan_para_el_request(app, client, crear_usuarios):
+    # La transacción del canje corre en el thread de la cola de escritura
+    (_, headers), = crear_usuarios(1)
+    ejecutadas = []
+    with app.app_context():
+        engine = db.engine
+
+    def contar(conn, cursor, statement, *args):
+        ejecutadas.append(statement)
+
+    antes = _consultas_por_request(metrics, "/api/codes/redeem")
+    event.listen(engine, "before_cursor_execute", contar)
+    try:
+        respuesta = client.post("/api/codes/redeem", json={"codigo": "BONUS"}, headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", contar)
+    assert respuesta.status_code == 200
+    assert any(s.lstrip().upper().startswith("UPDATE") for s in ejecutadas)
+    assert _consultas_por_request(metrics, "/api/codes/redeem") - antes == len(ejecutadas)
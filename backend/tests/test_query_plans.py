@@ -0,0 +1,129 @@
+import os
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert, text
+from src.models.user import db, HistorialPuntos, CanjeRealizado
+
+# Filas del historial sembradas para el test; con QUERY_PLAN_ROWS se puede
+# correr sobre millones de filas
+QUERY_PLAN_ROWS = int(os.environ.get("QUERY_PLAN_ROWS", "200000"))
+USUARIOS = 2000
+
+TABLAS_LEDGER = ("historial_puntos", "canjes_realizados")
+SCAN_COMPLETO = re.compile(r"^SCAN (%s)\b" % "|".join(TABLAS_LEDGER))
+
+
+def _sembrar(usuarios):
+    base = datetime(2024, 1, 1)
+    lote = []
+    for i in range(QUERY_PLAN_ROWS):
+        lote.append({
+            "usuario_id": usuarios[i % len(usuarios)][0],
+            "tipo_operacion": "carga",
+            "puntos_cantidad": 10,
+            "descripcion": "Carga",
+            "fecha": base + timedelta(seconds=i),
+            "codigo_promocional": f"SEED{i}",
+        })
+        if len(lote) == 10000:
+            db.session.execute(insert(HistorialPuntos), lote)
+            lote = []
+    if lote:
+        db.session.execute(insert(HistorialPuntos), lote)
+    db.session.execute(insert(CanjeRealizado), [
+        {
+            "usuario_id": usuarios[i % len(usuarios)][0],
+            "tipo_canje": "taza_nortegas",
+            "descripcion": "Taza NorteGAS",
+            "puntos_utilizados": 1500,
+            "fecha_canje": base + timedelta(minutes=i),
+            "estado": "pendiente",
+        }
+        for i in range(QUERY_PLAN_ROWS // 10)
+    ])
+    db.session.commit()
+    # Con estadísticas el planificador elige como lo haría en producción
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
+
+@pytest.fixture
+def sembrado(app, crear_usuarios):
+    usuarios = crear_usuarios(USUARIOS, puntos=100000)
+    with app.app_context():
+        _sembrar(usuarios)
+    return usuarios
+
+
+def _consultas_ledger(app, requests):
+    # Ejecuta los requests y devuelve las sentencias (con sus parámetros)
+    # que tocaron el historial o los canjes
+    with app.app_context():
+        engine = db.engine
+    sentencias = []
+
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and any(tabla in statement for tabla in TABLAS_LEDGER):
+            sentencias.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", registrar)
+    try:
+        requests()
+    finally:
+        event.remove(engine, "before_cursor_execute", registrar)
+    return sentencias
+
+
+def _planes(app, sentencias):
+    with app.app_context():
+        conn = db.session.connection()
+        for statement, parameters in sentencias:
+            filas = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+            yield statement, [fila[-1] for fila in filas]
+
+
+def _sin_scan_completo(app, sentencias):
+    assert sentencias
+    for statement, plan in _planes(app, sentencias):
+        completos = [paso for paso in plan if SCAN_COMPLETO.match(paso)]
+        assert not completos, f"{statement}\n{plan}"
+
+
+def test_historial_usa_indices(app, client, sembrado):
+    _, headers = sembrado[7]
+
+    def requests():
+        pagina = client.get("/api/user/history?limit=5", headers=headers).get_json()
+        client.get(f"/api/user/history?limit=5&cursor={pagina['next_cursor']}", headers=headers)
+        client.get("/api/user/points", headers=headers)
+
+    _sin_scan_completo(app, _consultas_ledger(app, requests))
+
+
+def test_canjes_usan_indices(app, client, sembrado):
+    _, headers = sembrado[11]
+
+    def requests():
+        pagina = client.get("/api/rewards/history?limit=2", headers=headers).get_json()
+        client.get(f"/api/rewards/history?limit=2&cursor={pagina['next_cursor']}", headers=headers)
+        respuesta = client.post("/api/rewards/redeem", json={"premio_id": "taza_nortegas"},
+                                headers=headers)
+        assert respuesta.status_code == 200
+
+    _sin_scan_completo(app, _consultas_ledger(app, requests))
+
+
+def test_codigos_usan_indices(app, client, sembrado):
+    _, headers = sembrado[3]
+
+    def requests():
+        assert client.post("/api/codes/validate", json={"codigo": "BONUS"},
+                           headers=headers).get_json()["valid"]
+        assert client.post("/api/codes/redeem", json={"codigo": "BONUS"},
+                           headers=headers).status_code == 200
+        assert client.post("/api/codes/redeem-batch", json={"codigos": ["REGALO", "DEMO123", "BONUS"]},
+                           headers=headers).status_code == 200
+
+    _sin_scan_completo(app, _consultas_ledger(app, requests))
@@ -0,0 +1,86 @@
+import pytest
+from src.services import rate_limit
+from src.services.rate_limit import MemoryBackend, rate_limiter
+
+# Límites por defecto: 20 por minuto por usuario y 60 por IP (uno cada 3 s)
+POR_USUARIO = 20
+POR_IP = 60
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    # Limitador activo con un reloj que avanza sólo cuando el test lo pide
+    ahora = [1000.0]
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limiter, "backend", MemoryBackend(clock=lambda: ahora[0]))
+
+    def avanzar(segundos):
+        ahora[0] += segundos
+    return avanzar
+
+
+def _validar(client, headers, codigo="BONUS", ip="10.0.0.1"):
+    return client.post("/api/codes/validate", json={"codigo": codigo}, headers=headers,
+                       environ_base={"REMOTE_ADDR": ip})
+
+
+def test_limite_por_usuario(client, crear_usuarios, reloj):
+    (_, headers), = crear_usuarios(1)
+    for _ in range(POR_USUARIO):
+        assert _validar(client, headers).status_code == 200
+    respuesta = _validar(client, headers)
+    assert respuesta.status_code == 429
+    assert respuesta.headers["Retry-After"] == "3"
+
+    reloj(3)
+    assert _validar(client, headers).status_code == 200
+    assert _validar(client, headers).status_code == 429
+
+
+def test_rechazo_por_usuario_no_gasta_la_ip(client, crear_usuarios, reloj):
+    # Varios usuarios detrás del mismo NAT: los intentos rechazados de uno
+    # no le quitan cupo a los demás
+    usuarios = [headers for _, headers in crear_usuarios(4)]
+    for _ in range(POR_USUARIO):
+        assert _validar(client, usuarios[0]).status_code == 200
+    for _ in range(10):
+        assert _validar(client, usuarios[0]).status_code == 429
+    for headers in usuarios[1:3]:
+        for _ in range(POR_USUARIO):
+            assert _validar(client, headers).status_code == 200
+
+    # Se agotó el cupo de la IP, no el del cuarto usuario
+    assert _validar(client, usuarios[3]).status_code == 429
+    assert _validar(client, usuarios[3], ip="10.0.0.2").status_code == 200
+
+
+def test_codigos_inexistentes_cuestan_mas(client, crear_usuarios, reloj):
+    (_, headers), = crear_usuarios(1)
+    fallos = int(POR_USUARIO // rate_limit.RATE_LIMIT_FAILURE_COST)
+    for _ in range(fallos):
+        respuesta = _validar(client, headers, codigo="NOEXISTE")
+        assert respuesta.status_code == 200
+        assert not respuesta.get_json()["valid"]
+    respuesta = _validar(client, headers)
+    assert respuesta.status_code == 429
+    assert respuesta.headers["Retry-After"] == "3"
+
+    # La penalización también se cobra a la IP: a los demás usuarios detrás
+    # de la misma IP les quedan POR_IP - POR_USUARIO intentos
+    otros = [headers for _, headers in crear_usuarios(3)]
+    for headers in otros[:2]:
+        for _ in range(POR_USUARIO):
+            assert _validar(client, headers).status_code == 200
+    assert _validar(client, otros[2]).status_code == 429
+
+
+def test_backend_descuenta_todos_los_limites_o_ninguno():
+    ahora = [0.0]
+    backend = MemoryBackend(clock=lambda: ahora[0])
+    limites = [("ip", 5, 1.0), ("usuario", 2, 1.0)]
+    assert backend.consume(limites, 1) == (None, 0)
+    assert backend.consume(limites, 1) == (None, 0)
+    assert backend.consume(limites, 1) == (1, 1.0)
+    # La IP conserva los 3 tokens que le quedaban
+    assert backend.consume([("ip", 5, 1.0)], 3) == (None, 0)
+    assert backend.consume([("ip", 5, 1.0)], 1) == (0, 1.0)
@@ -0,0 +1,53 @@
+from collections import Counter
+
+from sqlalchemy import insert
+from src.models.user import db, User, CodigoPromocional, HistorialPuntos
+
+HILOS = 8
+USUARIOS = 120
+USOS_MAXIMOS = 40
+PUNTOS = 25
+
+
+def _crear_codigo(app, texto, usos_maximos):
+    with app.app_context():
+        db.session.execute(insert(CodigoPromocional).values(
+            codigo=texto, puntos_valor=PUNTOS, descripcion="Código limitado",
+            activo=True, usos_maximos=usos_maximos, usos_actuales=0,
+        ))
+        db.session.commit()
+
+
+def _canjear(client, headers):
+    respuesta = client.post("/api/codes/redeem", json={"codigo": "LIMITADO"}, headers=headers)
+    return respuesta.status_code, respuesta.get_json()
+
+
+def test_codigo_limitado_no_se_sobrevende(app, crear_usuarios, en_paralelo):
+    _crear_codigo(app, "LIMITADO", USOS_MAXIMOS)
+    usuarios = crear_usuarios(USUARIOS)
+    # Cada usuario manda el mismo código dos veces (doble click)
+    pedidos = [headers for _, headers in usuarios] * 2
+
+    resultados, segundos = en_paralelo(_canjear, pedidos, HILOS)
+    print(f"\n{len(pedidos)} canjes en {segundos:.2f}s: {len(pedidos) / segundos:.0f} canjes/s")
+
+    estados = Counter(status for status, _ in resultados)
+    errores = Counter(datos["error"] for status, datos in resultados if status != 200)
+    assert estados[200] == USOS_MAXIMOS
+    assert set(estados) == {200, 400}
+    assert set(errores) <= {"Código agotado", "Ya has usado este código anteriormente"}
+
+    with app.app_context():
+        codigo = CodigoPromocional.query.filter_by(codigo="LIMITADO").one()
+        assert codigo.usos_actuales == USOS_MAXIMOS
+        movimientos = Counter(
+            usuario_id for (usuario_id,) in db.session.query(HistorialPuntos.usuario_id)
+            .filter_by(codigo_promocional="LIMITADO")
+        )
+        assert len(movimientos) == USOS_MAXIMOS
+        assert set(movimientos.values()) == {1}
+        # Ningún saldo perdió ni ganó puntos de más
+        saldos = dict(db.session.query(User.id, User.puntos_actuales))
+        for user_id, _ in usuarios:
+            assert saldos[user_id] == (PUNTOS if user_id in movimientos else 0)
@@ -0,0 +1,91 @@
+from collections import Counter
+
+from sqlalchemy import update
+from src.models.user import db, User, Administrador, CanjeRealizado, Premio
+from src.routes.auth import generate_admin_token
+from src.services.fulfillment import LogNotifier, procesar_lote
+
+
+def _historial(client, headers, etag=None):
+    if etag:
+        headers = {**headers, "If-None-Match": etag}
+    return client.get("/api/rewards/history", headers=headers)
+
+
+def test_cambio_de_estado_del_canje_cambia_el_etag(app, client, crear_usuarios):
+    (_, headers), = crear_usuarios(1, puntos=5000)
+    assert client.post("/api/rewards/redeem", json={"premio_id": "taza_nortegas"},
+                       headers=headers).status_code == 200
+    respuesta = _historial(client, headers)
+    etag = respuesta.headers["ETag"]
+    canje_id = respuesta.get_json()["canjes"][0]["id"]
+    assert _historial(client, headers, etag).status_code == 304
+
+    # El worker de entregas pasa el canje a "procesado"
+    with app.app_context():
+        assert procesar_lote(LogNotifier()) == (1, 0, 0)
+    respuesta = _historial(client, headers, etag)
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()["canjes"][0]["estado"] == "procesado"
+    etag = respuesta.headers["ETag"]
+
+    # El admin lo marca como entregado
+    with app.app_context():
+        admin_id = db.session.query(Administrador.id).scalar()
+    admin = {"Authorization": f"Bearer {generate_admin_token(admin_id)}"}
+    assert client.post(f"/api/admin/canjes/{canje_id}/entregado", headers=admin).status_code == 200
+    respuesta = _historial(client, headers, etag)
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()["canjes"][0]["estado"] == "entregado"
+
+
+def _canjear_premio(premio_id):
+    def canjear(client, headers):
+        respuesta = client.post("/api/rewards/redeem", json={
+            "premio_id": premio_id, "nombre_entrega": "Usuario", "direccion_entrega": "Calle 123"
+        }, headers=headers)
+        return respuesta.status_code, respuesta.get_json()
+    return canjear
+
+
+def _estado_final(app, usuarios):
+    with app.app_context():
+        saldos = dict(db.session.query(User.id, User.puntos_actuales))
+        canjes = Counter(u for (u,) in db.session.query(CanjeRealizado.usuario_id))
+    return {u: saldos[u] for u, _ in usuarios}, canjes
+
+
+def test_stock_nunca_queda_negativo(app, crear_usuarios, en_paralelo):
+    with app.app_context():
+        db.session.execute(update(Premio).where(Premio.id == "taza_nortegas").values(stock=10))
+        db.session.commit()
+    # Saldo para dos tazas por usuario, tres intentos cada uno
+    usuarios = crear_usuarios(40, puntos=3000)
+    pedidos = [headers for _, headers in usuarios] * 3
+
+    resultados, segundos = en_paralelo(_canjear_premio("taza_nortegas"), pedidos, 8)
+    print(f"\n{len(pedidos)} canjes de premios en {segundos:.2f}s")
+
+    exitos = [datos for status, datos in resultados if status == 200]
+    errores = Counter(datos["error"] for status, datos in resultados if status != 200)
+    assert len(exitos) == 10
+    assert set(errores) <= {"Premio sin stock", "Puntos insuficientes"}
+    saldos, canjes = _estado_final(app, usuarios)
+    with app.app_context():
+        assert db.session.get(Premio, "taza_nortegas").stock == 0
+    assert sum(canjes.values()) == 10
+    for user_id, saldo in saldos.items():
+        assert saldo == 3000 - 1500 * canjes[user_id] >= 0
+
+
+def test_saldo_nunca_queda_negativo(app, crear_usuarios, en_paralelo):
+    # envio_gratis (500 puntos, sin stock): alcanza para dos de cinco intentos
+    usuarios = crear_usuarios(30, puntos=1200)
+    pedidos = [headers for _, headers in usuarios] * 5
+
+    resultados, _ = en_paralelo(_canjear_premio("envio_gratis"), pedidos, 8)
+
+    assert Counter(status for status, _ in resultados) == {200: 60, 400: 90}
+    saldos, canjes = _estado_final(app, usuarios)
+    assert set(canjes.values()) == {2}
+    assert set(saldos.values()) == {200}
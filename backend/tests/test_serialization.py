@@ -0,0 +1,78 @@
+import json
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from src.models.user import db, HistorialPuntos
+from src.services.serialization import columns_for, serialize_many
+
+FILAS = 10_000
+CORRIDAS = 3
+
+
+def _sembrar(usuario_id):
+    base = datetime(2024, 1, 1)
+    db.session.execute(insert(HistorialPuntos), [
+        {
+            "usuario_id": usuario_id,
+            "tipo_operacion": "carga",
+            "puntos_cantidad": i % 500,
+            "descripcion": f"Código promocional: Carga {i}",
+            "fecha": base + timedelta(minutes=i),
+            "codigo_promocional": f"COD{i}",
+        }
+        for i in range(FILAS)
+    ])
+    db.session.commit()
+
+
+def _a_mano(usuario_id):
+    # Como antes: entidades completas y un dict armado por fila
+    filas = HistorialPuntos.query.filter_by(usuario_id=usuario_id).all()
+    return json.dumps([
+        {
+            "id": h.id,
+            "usuario_id": h.usuario_id,
+            "tipo_operacion": h.tipo_operacion,
+            "puntos": h.puntos_cantidad,
+            "descripcion": h.descripcion,
+            "fecha": h.fecha.isoformat() if h.fecha else None,
+            "codigo_promocional": h.codigo_promocional,
+            "referencia_externa": h.referencia_externa,
+        }
+        for h in filas
+    ])
+
+
+def _serializador(app, usuario_id, fields=None):
+    # Como /user/history: columnas proyectadas y serializador generado
+    filas = db.session.query(*columns_for(HistorialPuntos, fields)).filter(
+        HistorialPuntos.usuario_id == usuario_id
+    ).all()
+    return app.json.dumps(serialize_many(HistorialPuntos, filas, fields))
+
+
+def _filas_por_segundo(funcion):
+    mejor = float("inf")
+    for _ in range(CORRIDAS):
+        db.session.expunge_all()
+        inicio = time.perf_counter()
+        salida = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return FILAS / mejor, salida
+
+
+def test_filas_serializadas_por_segundo(app, crear_usuarios):
+    (usuario_id, _), = crear_usuarios(1)
+    with app.app_context():
+        _sembrar(usuario_id)
+        a_mano, esperado = _filas_por_segundo(lambda: _a_mano(usuario_id))
+        generado, salida = _filas_por_segundo(lambda: _serializador(app, usuario_id))
+        proyectado, _ = _filas_por_segundo(
+            lambda: _serializador(app, usuario_id, ["puntos", "fecha"])
+        )
+
+    print(f"\npáginas de {FILAS} filas: to_dict a mano {a_mano:,.0f} filas/s, "
+          f"serializador {generado:,.0f} filas/s, proyección de 2 campos {proyectado:,.0f} filas/s")
+    assert json.loads(salida) == json.loads(esperado)
+    assert generado > a_mano
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+
+# Tiempo de CPU máximo de "from src.main import create_app; create_app()" en
+# un proceso nuevo (el de reloj varía demasiado con la carga de la máquina), sin contar flask/sqlalchemy (que se importan igual). Es lo
+# que agrega la app al arranque; con --preload, una sola vez por despliegue.
+# Hoy son 65-85 ms según la máquina, casi todo el mapeo de los
+# modelos y la compilación de las rutas de Werkzeug; el margen no alcanza
+# para volver a cargar los dialectos de otros motores (~55 ms).
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", "100"))
+# Módulos que sólo usan los jobs o los otros motores: no entran al arranque
+NO_IMPORTADOS = (
+    "sqlalchemy.dialects.mysql", "sqlalchemy.dialects.postgresql",
+    "multiprocessing", "urllib.request",
+)
+CORRIDAS = 5
+
+SCRIPT = """
+import sys, time
+import flask, flask_cors, flask_sqlalchemy, sqlalchemy, jwt
+antes = set(sys.modules)
+inicio = time.process_time()
+from src.main import create_app
+create_app()
+ms = (time.process_time() - inicio) * 1000
+print(ms, *sorted(m for m in set(sys.modules) - antes if m.startswith(%r)))
+""" % (NO_IMPORTADOS,)
+
+
+def _arranque_ms(database_url):
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    salida = subprocess.run(
+        [sys.executable, "-c", SCRIPT], cwd=backend, check=True, capture_output=True, text=True,
+        env={**os.environ, "DATABASE_URL": database_url},
+    ).stdout
+    ms, *importados = salida.strip().splitlines()[-1].split()
+    return float(ms), importados
+
+
+def test_tiempo_de_arranque(tmp_path):
+    base = tmp_path / "app.db"
+    corridas = [_arranque_ms(f"sqlite:///{base}") for _ in range(CORRIDAS)]
+    tiempos = [ms for ms, _ in corridas]
+    print(f"\ncreate_app en un proceso nuevo: {min(tiempos):.0f} ms de CPU (mejor de {CORRIDAS})")
+    assert corridas[0][1] == []
+    assert min(tiempos) < STARTUP_BUDGET_MS
+    # La fábrica no abre la base: las tablas y los datos los crea init-db
+    assert not base.exists()
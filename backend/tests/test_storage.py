@@ -0,0 +1,51 @@
+from collections import Counter
+
+import pytest
+from src import storage
+from src.models.user import db, User
+from src.storage import write_queue
+
+USUARIOS_CONCURRENTES = 100
+BENCH_HILOS = 16
+BENCH_CANJES = 400
+
+
+def _canjear(client, headers):
+    respuesta = client.post("/api/codes/redeem", json={"codigo": "BONUS"}, headers=headers)
+    return respuesta.status_code
+
+
+def test_cola_de_escritura_con_100_usuarios(app, crear_usuarios, en_paralelo):
+    # Los handlers esperan a la cola sin retener conexiones del pool: ni 503
+    # por la cola ni TimeoutError del pool en require_auth
+    usuarios = crear_usuarios(USUARIOS_CONCURRENTES)
+    resultados, _ = en_paralelo(
+        _canjear, [headers for _, headers in usuarios], USUARIOS_CONCURRENTES
+    )
+    assert Counter(resultados) == {200: USUARIOS_CONCURRENTES}
+    with app.app_context():
+        assert db.session.query(db.func.sum(User.puntos_actuales)).scalar() == 75 * USUARIOS_CONCURRENTES
+
+
+@pytest.mark.parametrize("journal, cola", [
+    ("WAL", True),
+    ("WAL", False),
+    # Configuración previa: rollback journal y escritores compitiendo
+    ("DELETE", False),
+])
+def test_throughput_de_escritura(app, crear_usuarios, en_paralelo, monkeypatch, journal, cola):
+    usuarios = crear_usuarios(BENCH_CANJES)
+    with app.app_context():
+        db.engine.dispose()
+    monkeypatch.setattr(storage, "SQLITE_JOURNAL_MODE", journal)
+    if not cola:
+        monkeypatch.setattr(write_queue, "_app", None)
+
+    resultados, segundos = en_paralelo(_canjear, [headers for _, headers in usuarios], BENCH_HILOS)
+    estados = Counter(resultados)
+    modo = f"{journal}, {'cola de escritura' if cola else 'escrituras directas'}"
+    print(f"\n{modo}: {estados[200] / segundos:.0f} canjes/s, errores: {BENCH_CANJES - estados[200]}")
+    with app.app_context():
+        assert db.session.execute(db.text("PRAGMA journal_mode")).scalar().upper() == journal
+    if cola:
+        assert estados == {200: BENCH_CANJES}
@@ -42,6 +42,12 @@ const Home = () => {
     syncUserPoints()
   }, [setPoints, setUser])
 
+  // Actualizaciones de saldo en vivo
+  useEffect(() => {
+    const unsubscribe = pointsService.subscribeToPoints(setPoints)
+    return unsubscribe
+  }, [setPoints])
+
   const handleLogout = async () => {
     try {
       await authService.logout()
@@ -1,11 +1,11 @@
-import { useState } from 'react'
+import { useState, useEffect } from 'react'
 import { useNavigate } from 'react-router-dom';
 import { Button } from '@/components/ui/button'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card'
 import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle, DialogTrigger } from '@/components/ui/dialog'
 import { Input } from '@/components/ui/input'
 import { Label } from '@/components/ui/label'
-import { ArrowLeft, Truck, Percent, Coffee, Crown, CheckCircle, AlertCircle, Flame, MessageCircle } from 'lucide-react'
+import { ArrowLeft, Truck, Percent, Coffee, Crown, Gift, CheckCircle, AlertCircle, Flame, MessageCircle } from 'lucide-react'
 import GarrafaIcon from './GarrafaIcon';
 import { useAppContext } from '../App'
 import pointsService from '../services/points'
@@ -21,47 +21,34 @@ const RedeemPoints = () => {
   const [redeemResult, setRedeemResult] = useState(null);
   const [loading, setLoading] = useState(false);
 
-  const rewards = [
-    {
-      id: 'envio_gratis',
-      title: 'Envío Gratis',
-      description: 'Delivery gratuito de tu próxima garrafa',
-      points: 500,
-      icon: Truck,
-      color: 'from-green-500 to-green-600',
-      available: points >= 500,
-      requiresOrder: true
-    },
-    {
-      id: 'descuento_5000',
-      title: 'Descuento $5000',
-      description: 'Descuento en la compra de garrafa',
-      points: 2500,
-      icon: Percent,
-      color: 'from-orange-500 to-orange-600',
-      available: points >= 2500,
-      requiresOrder: true
-    },
-    {
-      id: 'taza_nortegas',
-      title: 'Taza NorteGAS',
-      description: 'Taza exclusiva con logo de NorteGAS',
-      points: 1500,
-      icon: Coffee,
-      color: 'from-blue-500 to-blue-600',
-      available: points >= 1500,
-      requiresOrder: false
-    },
-    {
-      id: 'gorra-nortegas',
-      title: 'Gorra NorteGAS',
-      description: 'Gorra oficial con bordado NorteGAS',
-      points: 1500,
-      icon: Crown,
-      color: 'from-purple-500 to-purple-600',
-      available: points >= 1500
-    }
-  ];
+  const [catalog, setCatalog] = useState([]);
+
+  // Catálogo desde el servidor (precio, stock y si requiere entrega)
+  useEffect(() => {
+    pointsService.getRewardsCatalog()
+      .then((response) => setCatalog(response.premios))
+      .catch((error) => console.error('Error al cargar premios:', error));
+  }, []);
+
+  // Ícono y color de cada premio; los nuevos usan el de regalo
+  const rewardStyles = {
+    envio_gratis: { icon: Truck, color: 'from-green-500 to-green-600' },
+    descuento_5000: { icon: Percent, color: 'from-orange-500 to-orange-600' },
+    taza_nortegas: { icon: Coffee, color: 'from-blue-500 to-blue-600' },
+    gorra_nortegas: { icon: Crown, color: 'from-purple-500 to-purple-600' }
+  };
+  const defaultStyle = { icon: Gift, color: 'from-blue-500 to-blue-600' };
+
+  const rewards = catalog.map((premio) => ({
+    id: premio.id,
+    title: premio.nombre,
+    description: premio.descripcion,
+    points: premio.puntos,
+    ...(rewardStyles[premio.id] || defaultStyle),
+    soldOut: premio.stock === 0,
+    available: points >= premio.puntos && premio.stock !== 0,
+    requiresOrder: premio.requiere_entrega
+  }));
 
   const handleRedeemClick = (reward) => {
     setSelectedReward(reward);
@@ -71,8 +58,8 @@ const RedeemPoints = () => {
     const confirmRedeem = async () => {
     if (!selectedReward) return;
 
-    // Si es envío gratis o descuento, mostrar modal de pedido
-    if (selectedReward.id === 'envio_gratis' || selectedReward.id === 'descuento_5000') {
+    // Si el premio requiere entrega, mostrar modal de pedido
+    if (selectedReward.requiresOrder) {
       setShowConfirmDialog(false);
       setShowOrderModal(true);
       return;
@@ -81,11 +68,7 @@ const RedeemPoints = () => {
     setLoading(true);
     try {
       const rewardData = {
-        premio_id: selectedReward.id,
-        premio_nombre: selectedReward.title,
-        puntos_requeridos: selectedReward.points,
-        nombre_entrega: orderData.name || '',
-        direccion_entrega: orderData.address || ''
+        premio_id: selectedReward.id
       };
 
       const response = await pointsService.redeemReward(rewardData);
@@ -122,8 +105,6 @@ const RedeemPoints = () => {
     try {
       const rewardData = {
         premio_id: selectedReward.id,
-        premio_nombre: selectedReward.title,
-        puntos_requeridos: selectedReward.points,
         nombre_entrega: orderData.name,
         direccion_entrega: orderData.address
       };
@@ -270,7 +251,7 @@ const RedeemPoints = () => {
                     disabled={!reward.available}
                     onClick={() => handleRedeemClick(reward)}
                   >
-                    {reward.available ? 'Canjear' : 'Puntos insuficientes'}
+                    {reward.available ? 'Canjear' : reward.soldOut ? 'Sin stock' : 'Puntos insuficientes'}
                   </Button>
                 </CardContent>
               </Card>
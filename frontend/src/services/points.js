@@ -1,5 +1,9 @@
 import apiService from './api.js';
 
+// El saldo en vivo lo sirve un proceso aparte (ver backend/README.md); sin
+// VITE_SSE_BASE_URL se usa la misma URL de la API.
+const SSE_BASE_URL = import.meta.env.VITE_SSE_BASE_URL || apiService.baseURL;
+
 class PointsService {
   // Obtener puntos actuales del usuario
   async getUserPoints() {
@@ -11,6 +15,24 @@ class PointsService {
     }
   }
 
+  // Suscribirse a los cambios de saldo (Server-Sent Events). Devuelve una
+  // función para cerrar la conexión; EventSource se reconecta solo, salvo
+  // que el servidor responda 204 (stream no disponible en ese despliegue).
+  subscribeToPoints(onPoints) {
+    const token = apiService.getToken();
+    if (!token || typeof EventSource === 'undefined') {
+      return () => {};
+    }
+
+    const url = `${SSE_BASE_URL}/user/points/stream?token=${encodeURIComponent(token)}`;
+    const source = new EventSource(url);
+    source.addEventListener('saldo', (event) => {
+      const data = JSON.parse(event.data);
+      onPoints(data.puntos_actuales);
+    });
+    return () => source.close();
+  }
+
   // Obtener historial de puntos
   async getPointsHistory() {
     try {
@@ -31,13 +53,20 @@ class PointsService {
     }
   }
 
-  // Canjear premio
-  async redeemReward(rewardType, additionalData = {}) {
+  // Obtener catálogo de premios (precio y stock los define el servidor)
+  async getRewardsCatalog() {
+    try {
+      const response = await apiService.get('/rewards');
+      return response;
+    } catch (error) {
+      throw new Error(error.message || 'Error al obtener premios');
+    }
+  }
+
+  // Canjear premio: { premio_id, nombre_entrega?, direccion_entrega? }
+  async redeemReward(rewardData) {
     try {
-      const response = await apiService.post('/rewards/redeem', {
-        tipo_premio: rewardType,
-        ...additionalData
-      });
+      const response = await apiService.post('/rewards/redeem', rewardData);
       return response;
     } catch (error) {
       throw new Error(error.message || 'Error al canjear premio');